@@ -0,0 +1,32 @@
+"""create ambulance_positions hypertable
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 10:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ambulance_positions',
+        sa.Column('ambulance_id', sa.String(), nullable=False),
+        sa.Column('ts', sa.DateTime(), nullable=False),
+        sa.Column('lat', sa.Float(), nullable=False),
+        sa.Column('lon', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('ambulance_id', 'ts', name='pk_ambulance_positions_id_ts')
+    )
+
+    # one-day chunks: a shift replay touches one or two chunks, old days can be compressed or dropped
+    op.execute("SELECT create_hypertable('ambulance_positions', 'ts', chunk_time_interval => INTERVAL '1 day', if_not_exists => TRUE);")
+
+
+def downgrade():
+    op.drop_table('ambulance_positions')
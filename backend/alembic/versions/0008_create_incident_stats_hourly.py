@@ -0,0 +1,49 @@
+"""create incident_stats_hourly continuous aggregate
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 12:00:00.000000
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # hourly counts by type/severity/status; /stats/daily and /stats/range read these
+    # instead of the raw rows. Created empty and filled below, because materializing
+    # data is not allowed inside the migration's transaction.
+    op.execute("""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS incident_stats_hourly
+        WITH (timescaledb.continuous) AS
+        SELECT time_bucket(INTERVAL '1 hour', received_at) AS bucket,
+               type,
+               severity,
+               status,
+               count(*) AS incidents
+        FROM incidents
+        GROUP BY bucket, type, severity, status
+        WITH NO DATA;
+    """)
+    # real-time aggregation: hours not materialized yet are computed from the hypertable on read
+    op.execute("ALTER MATERIALIZED VIEW incident_stats_hourly SET (timescaledb.materialized_only = false);")
+    # re-materialize the last week every 15 minutes. That window covers status changes on
+    # recent incidents; older edits are picked up by a manual refresh_continuous_aggregate.
+    op.execute("""
+        SELECT add_continuous_aggregate_policy('incident_stats_hourly',
+            start_offset => INTERVAL '7 days',
+            end_offset => INTERVAL '1 hour',
+            schedule_interval => INTERVAL '15 minutes',
+            if_not_exists => TRUE);
+    """)
+    with op.get_context().autocommit_block():
+        op.execute("CALL refresh_continuous_aggregate('incident_stats_hourly', NULL, NULL);")
+
+
+def downgrade():
+    op.execute("SELECT remove_continuous_aggregate_policy('incident_stats_hourly', if_exists => TRUE);")
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS incident_stats_hourly;")
@@ -0,0 +1,32 @@
+"""add (filter, received_at, id) indexes for keyset pagination of incidents
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 14:00:00.000000
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+# /incidents orders by (received_at, id) descending and seeks past a cursor; a B-tree
+# scanned backwards serves that, and a leading equality column serves each filter
+INDEXES = [
+    ('ix_incidents_received_at_id', ['received_at', 'id']),
+    ('ix_incidents_status_received_at_id', ['status', 'received_at', 'id']),
+    ('ix_incidents_type_received_at_id', ['type', 'received_at', 'id']),
+    ('ix_incidents_severity_received_at_id', ['severity', 'received_at', 'id']),
+]
+
+
+def upgrade():
+    for name, columns in INDEXES:
+        op.create_index(name, 'incidents', columns)
+
+
+def downgrade():
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='incidents')
@@ -0,0 +1,60 @@
+"""create incident_latest lookup table kept in sync by trigger
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 16:00:00.000000
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # plain (non-hypertable) table: one row per incident id with its newest received_at,
+    # so "latest version of incident X" becomes a PK lookup plus a single-chunk probe
+    op.create_table(
+        'incident_latest',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id', name='pk_incident_latest')
+    )
+    op.execute("""
+        CREATE OR REPLACE FUNCTION incident_latest_sync() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO incident_latest (id, received_at) VALUES (NEW.id, NEW.received_at)
+                ON CONFLICT (id) DO UPDATE SET received_at = EXCLUDED.received_at
+                WHERE incident_latest.received_at < EXCLUDED.received_at;
+            ELSE
+                -- deleting the newest version falls back to the next newest (rare: cleanup scripts)
+                DELETE FROM incident_latest WHERE id = OLD.id AND received_at = OLD.received_at;
+                INSERT INTO incident_latest (id, received_at)
+                SELECT id, max(received_at) FROM incidents WHERE id = OLD.id GROUP BY id
+                ON CONFLICT (id) DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    # row-level triggers: hypertables do not support statement triggers with transition tables
+    op.execute("""
+        CREATE TRIGGER incident_latest_sync
+        AFTER INSERT OR DELETE ON incidents
+        FOR EACH ROW EXECUTE FUNCTION incident_latest_sync();
+    """)
+    op.execute("""
+        INSERT INTO incident_latest (id, received_at)
+        SELECT id, max(received_at) FROM incidents GROUP BY id
+        ON CONFLICT (id) DO NOTHING;
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS incident_latest_sync ON incidents;")
+    op.execute("DROP FUNCTION IF EXISTS incident_latest_sync();")
+    op.drop_table('incident_latest')
@@ -0,0 +1,31 @@
+"""add (created_at, id) index on closures for keyset pagination
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 18:00:00.000000
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # closures is created by the app (metadata.create_all), so it may not exist yet;
+    # create_all adds the same index when it creates the table later
+    op.execute("""
+        DO $$
+        BEGIN
+            IF to_regclass('closures') IS NOT NULL THEN
+                CREATE INDEX IF NOT EXISTS ix_closures_created_at_id ON closures (created_at, id);
+            END IF;
+        END
+        $$;
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS ix_closures_created_at_id;")
@@ -1,28 +1,37 @@
-from math import radians, cos, sin, asin, sqrt
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from .geo import haversine_m, distances_from_m
+from .spatial import unit_index
 
 
 def haversine(lat1, lon1, lat2, lon2):
     # return distance in kilometers
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a))
-    km = 6367 * c
-    return km
+    return float(haversine_m(lat1, lon1, lat2, lon2)) / 1000.0
 
 
 def assign_nearest(incident: Dict, resources: List[Dict]) -> Tuple[Dict, float]:
     """Return the nearest resource dict and distance (km)"""
-    best = None
-    best_dist = float("inf")
-    for r in resources:
-        d = haversine(incident["lat"], incident["lon"], r["lat"], r["lon"]) 
-        if d < best_dist:
-            best_dist = d
-            best = r
-    return best, best_dist
+    if not resources:
+        return None, float("inf")
+    lats = np.fromiter((r["lat"] for r in resources), dtype=np.float64, count=len(resources))
+    lons = np.fromiter((r["lon"] for r in resources), dtype=np.float64, count=len(resources))
+    d = distances_from_m(incident["lat"], incident["lon"], lats, lons)
+    best = int(np.argmin(d))
+    return resources[best], float(d[best]) / 1000.0
+
+
+def assign_nearest_idle(incident: Dict, unit_type: Optional[str] = None, index=unit_index) -> Tuple[Optional[Dict], float]:
+    """Return the nearest idle unit from the live spatial index and its distance (km).
+
+    Same result shape as ``assign_nearest`` without scanning every unit.
+    """
+    hits = index.nearest(incident["lat"], incident["lon"], k=1, unit_type=unit_type, status='idle')
+    if not hits:
+        return None, float("inf")
+    unit, meters = hits[0]
+    return unit, meters / 1000.0
 
 
 if __name__ == "__main__":
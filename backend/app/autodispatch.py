@@ -0,0 +1,226 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+from sqlalchemy import and_, case, func, or_
+
+from .db import SessionLocal
+from .dispatch import unit_type_for, PENDING_STATUSES
+from .geo import meters_per_degree
+from .ingest import LatencyStats
+from .models import Incident as IncidentModel, Ambulance as AmbulanceModel
+from .spatial import unit_index
+
+AUTO_DISPATCH = os.getenv("AUTO_DISPATCH", "0").lower() in ("1", "true", "yes", "on")
+AUTO_DISPATCH_WORKERS = int(os.getenv("AUTO_DISPATCH_WORKERS", 4))
+# nearest idle units (from the spatial index) tried per incident before falling back to SQL
+AUTO_DISPATCH_CANDIDATES = int(os.getenv("AUTO_DISPATCH_CANDIDATES", 8))
+# incidents that found no free unit are retried after 2, 4, 8 ... seconds (capped), and
+# immediately when a unit of their type is released; they are dropped after the max wait
+AUTO_DISPATCH_RETRY_S = float(os.getenv("AUTO_DISPATCH_RETRY_S", 2.0))
+AUTO_DISPATCH_RETRY_MAX_S = float(os.getenv("AUTO_DISPATCH_RETRY_MAX_S", 60.0))
+AUTO_DISPATCH_MAX_WAIT_S = float(os.getenv("AUTO_DISPATCH_MAX_WAIT_S", 1800.0))
+
+
+def unit_type_filter(unit_type: str):
+    """SQL condition for units of ``unit_type``; seeded pool units have no unit_type and are named FIRE-xx / AMB-xx."""
+    named_fire = AmbulanceModel.unit_name.ilike('FIR%')
+    inferred = named_fire if unit_type == 'fire' else or_(AmbulanceModel.unit_name.is_(None), ~named_fire)
+    return or_(func.lower(AmbulanceModel.unit_type) == unit_type,
+               and_(AmbulanceModel.unit_type.is_(None), inferred))
+
+
+def reserve_unit(db, lat: float, lon: float, unit_type: str, candidates: List[str]) -> Optional[AmbulanceModel]:
+    """Lock and return the nearest idle unit with ``SELECT ... FOR UPDATE SKIP LOCKED``.
+
+    Units already locked by another dispatch transaction are skipped instead of waited
+    for, so concurrent dispatchers never block each other or take the same unit. The
+    index's nearest candidates are tried first in distance order. If all of them are
+    taken, the nearest idle unit of the type is selected straight from the table.
+    """
+    idle = db.query(AmbulanceModel).filter(AmbulanceModel.status == 'idle')
+    if candidates:
+        rank = case({uid: i for i, uid in enumerate(candidates)}, value=AmbulanceModel.id)
+        amb = (idle.filter(AmbulanceModel.id.in_(candidates)).order_by(rank)
+               .with_for_update(skip_locked=True).first())
+        if amb is not None:
+            return amb
+    m_lat, m_lon = meters_per_degree(lat)
+    dlat = (AmbulanceModel.lat - lat) * m_lat
+    dlon = (AmbulanceModel.lon - lon) * m_lon
+    return (idle.filter(unit_type_filter(unit_type)).order_by(dlat * dlat + dlon * dlon)
+            .with_for_update(skip_locked=True).first())
+
+
+class AutoDispatcher:
+    """Dispatches the nearest idle unit to every newly ingested incident.
+
+    The ingest fan-out calls ``submit`` after each incident batch commits. A small worker
+    pool then handles each incident in its own transaction:
+
+    - lock the incident row (SKIP LOCKED)
+    - reserve the nearest idle unit of the right type (``reserve_unit``)
+    - plan the route with ``dispatch_fn``
+    - commit, then call ``on_dispatched`` to broadcast and start the unit moving
+
+    If the incident is already locked or no longer pending, another dispatcher owns it.
+    If no unit is free (all busy, or locked by a concurrent dispatch), the incident waits
+    and is retried with exponential backoff. ``unit_released`` retries the waiting
+    incidents of that unit type right away.
+    ``dispatch_fn`` / ``on_dispatched`` are bound by main (same helpers as manual assignment).
+    """
+
+    def __init__(self, enabled: bool = AUTO_DISPATCH, workers: int = AUTO_DISPATCH_WORKERS,
+                 candidates: int = AUTO_DISPATCH_CANDIDATES):
+        self.enabled = enabled
+        self.workers = max(1, workers)
+        self.candidates = candidates
+        self.dispatch_fn: Optional[Callable] = None
+        self.on_dispatched: Optional[Callable] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stopped = False
+        self.counts = {'submitted': 0, 'dispatched': 0, 'no_unit': 0, 'skipped': 0, 'failed': 0,
+                       'retried': 0, 'gave_up': 0}
+        # incident id -> {'incident', 'attempt', 'first', 'timer'} for incidents waiting for a unit
+        self._waiting: Dict[str, Dict[str, Any]] = {}
+        # submit -> unit moving, and incident received_at -> unit moving
+        self.latency = LatencyStats()
+        self.end_to_end = LatencyStats()
+
+    def bind(self, dispatch_fn: Callable, on_dispatched: Callable):
+        self.dispatch_fn = dispatch_fn
+        self.on_dispatched = on_dispatched
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    def submit(self, incident: Dict[str, Any]) -> bool:
+        """Queue a freshly persisted incident for dispatch; cheap no-op when disabled."""
+        if not self.enabled or self.dispatch_fn is None:
+            return False
+        if (incident.get('status') or 'new') != 'new' or not incident.get('id') or not incident.get('received_at'):
+            return False
+        with self._lock:
+            self.counts['submitted'] += 1
+        return self._submit(incident, time.perf_counter())
+
+    def _submit(self, incident: Dict[str, Any], submitted_at: float) -> bool:
+        with self._lock:
+            if self._stopped:
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='autodispatch')
+            executor = self._executor
+        executor.submit(self.dispatch, incident, submitted_at)
+        return True
+
+    # -- waiting for a unit -----------------------------------------------------------
+    def _defer(self, incident: Dict[str, Any], submitted_at: float):
+        """Schedule another attempt for an incident that found no free unit."""
+        key = str(incident['id'])
+        with self._lock:
+            entry = self._waiting.pop(key, None) or {'incident': incident, 'attempt': 0, 'first': submitted_at}
+            if entry.get('timer') is not None:
+                entry['timer'].cancel()
+            if time.perf_counter() - entry['first'] > AUTO_DISPATCH_MAX_WAIT_S or self._stopped:
+                self.counts['gave_up'] += 1
+                return
+            delay = min(AUTO_DISPATCH_RETRY_S * 2 ** entry['attempt'], AUTO_DISPATCH_RETRY_MAX_S)
+            entry['attempt'] += 1
+            timer = threading.Timer(delay, self._retry, args=(key,))
+            timer.daemon = True
+            entry['timer'] = timer
+            self._waiting[key] = entry
+        timer.start()
+
+    def _retry(self, key: str):
+        with self._lock:
+            entry = self._waiting.pop(key, None)
+            if entry is None:
+                return
+            entry['timer'].cancel()
+            self.counts['retried'] += 1
+        # keep the original submit time so latency covers the wait
+        self._submit(entry['incident'], entry['first'])
+
+    def unit_released(self, unit_type: Optional[str] = None):
+        """A unit went back to the pool: retry the incidents waiting for that unit type now."""
+        with self._lock:
+            keys = [k for k, e in self._waiting.items()
+                    if unit_type is None or unit_type_for(e['incident']) == unit_type]
+            # most severe first, so they reach the freed unit before the rest
+            keys.sort(key=lambda k: -(self._waiting[k]['incident'].get('severity') or 0))
+        for key in keys:
+            self._retry(key)
+
+    def dispatch(self, incident: Dict[str, Any], submitted_at: Optional[float] = None):
+        """Dispatch one incident; returns the unit dict or None."""
+        t0 = submitted_at if submitted_at is not None else time.perf_counter()
+        unit_type = unit_type_for(incident)
+        lat, lon = float(incident['lat']), float(incident['lon'])
+        candidates = [u['ambulance_id'] for u, _ in
+                      unit_index.nearest(lat, lon, k=self.candidates, unit_type=unit_type, status='idle')]
+        db = SessionLocal()
+        try:
+            received_at = datetime.fromisoformat(incident['received_at'])
+            row = db.query(IncidentModel).filter(IncidentModel.id == incident['id'],
+                                                 IncidentModel.received_at == received_at)
+            inc = row.with_for_update(skip_locked=True).first()
+            if inc is None or (inc.status or 'new') not in PENDING_STATUSES:
+                # SKIP LOCKED returns nothing for a missing row too (e.g. one that failed to persist)
+                locked = inc is None and db.query(row.exists()).scalar()
+                db.rollback()
+                self._count('skipped')
+                if locked:
+                    # locked by a concurrent dispatch that may still drop it: look again later
+                    self._defer(incident, t0)
+                return None
+            amb = reserve_unit(db, lat, lon, unit_type, candidates)
+            if amb is None:
+                db.rollback()
+                self._count('no_unit')
+                self._defer(incident, t0)
+                return None
+            route = self.dispatch_fn(amb, inc)
+            db.commit()
+            self.on_dispatched(inc, amb, route)
+            self._count('dispatched')
+            self.latency.observe((time.perf_counter() - t0) * 1000.0)
+            self.end_to_end.observe(max(0.0, (datetime.utcnow() - received_at).total_seconds() * 1000.0))
+            return amb.to_dict()
+        except Exception as e:
+            db.rollback()
+            self._count('failed')
+            print('Auto-dispatch failed for incident', incident.get('id'), e)
+            return None
+        finally:
+            db.close()
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._stopped = True
+            for entry in self._waiting.values():
+                entry['timer'].cancel()
+            self._waiting.clear()
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'workers': self.workers,
+            'candidates': self.candidates,
+            'counts': dict(self.counts),
+            'waiting': len(self._waiting),
+            'latency': self.latency.snapshot(),
+            'end_to_end': self.end_to_end.snapshot(),
+        }
+
+
+auto_dispatcher = AutoDispatcher()
@@ -1,27 +1,477 @@
+import os
+import json
+import time
 import asyncio
-from typing import Dict, Any
+import threading
+import itertools
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional, Callable, Iterable, Tuple
+
+BROADCAST_QUEUE_SIZE = int(os.getenv("BROADCAST_QUEUE_SIZE", 256))
+BROADCAST_OVERFLOW = os.getenv("BROADCAST_OVERFLOW", "coalesce")
+OVERFLOW_POLICIES = ('drop_oldest', 'disconnect', 'coalesce')
+# number of recent events kept for Last-Event-ID resume
+BROADCAST_REPLAY_SIZE = int(os.getenv("BROADCAST_REPLAY_SIZE", 4096))
+# reconnecting clients beyond the replay window share one snapshot for this long
+BROADCAST_SNAPSHOT_TTL_S = float(os.getenv("BROADCAST_SNAPSHOT_TTL_S", 2.0))
+# batch frames only carry moving units; entries without a status are matched as this one
+BATCH_UNIT_STATUS = 'enroute'
+
+
+def coalesce_key(item: Dict[str, Any]):
+    """Key under which newer updates replace older pending ones (None = never coalesce)."""
+    if not isinstance(item, dict):
+        return None
+    resource = item.get('resource')
+    if resource == 'ambulance':
+        return ('ambulance', item.get('ambulance_id'))
+    if resource == 'ambulances':
+        # fleet movement batch: each tick carries every moving unit of that type
+        return ('ambulances', item.get('unit_type'))
+    # 'motion' frames only carry the units that changed, so a newer one cannot replace an older one
+    if resource is None and item.get('id') is not None:
+        return ('incident', item.get('id'))
+    return None
+
+
+def _as_set(values) -> Optional[frozenset]:
+    if values is None:
+        return None
+    if isinstance(values, str):
+        values = values.split(',')
+    out = frozenset(v.strip().lower() for v in values if v and v.strip())
+    return out or None
+
+
+def resource_kind(item: Dict[str, Any]) -> str:
+    kind = (item.get('resource') or 'incident') if isinstance(item, dict) else 'incident'
+    # fleet movement batches are ambulance updates as far as filters are concerned
+    return 'ambulance' if kind in ('ambulances', 'motion') else kind
+
+
+def _is_batch(item: Dict[str, Any]) -> bool:
+    return item.get('resource') in ('ambulances', 'motion')
+
+
+def _batch_field(item: Dict[str, Any]) -> str:
+    return 'units' if item.get('resource') == 'motion' else 'ambulances'
+
+
+def compile_filter(resource: Optional[Iterable[str]] = None,
+                   type: Optional[Iterable[str]] = None,
+                   status: Optional[Iterable[str]] = None,
+                   unit_type: Optional[Iterable[str]] = None,
+                   bbox: Optional[Tuple[float, float, float, float]] = None) -> Optional[Callable[[Dict[str, Any]], bool]]:
+    """Build a per-subscriber predicate from stream filters (None when nothing is filtered).
+
+    Multi-valued filters accept comma-separated strings. Each filter only applies to the
+    resources that carry the attribute: ``type`` to incidents, ``unit_type`` to
+    ambulances, ``status`` and ``bbox`` (min_lon, min_lat, max_lon, max_lat) to both.
+    Only the checks that were requested end up in the predicate.
+
+    Batch frames (``ambulances``/``motion``) carry many units, so ``status`` and ``bbox``
+    are checked per unit instead. ``predicate.narrow(item)`` returns the frame with only
+    the matching units, the same dict when all of them match, or None when none does.
+    ``narrow`` is None when no per-unit check was requested.
+    """
+    resources = _as_set(resource)
+    types = _as_set(type)
+    statuses = _as_set(status)
+    unit_types = _as_set(unit_type)
+    checks = []
+    # applied to each unit of a batch frame by narrow()
+    unit_checks = []
+
+    if resources is not None:
+        checks.append(lambda it, kind: kind in resources)
+    if types is not None:
+        checks.append(lambda it, kind: kind != 'incident' or (it.get('type') or '').lower() in types)
+    if unit_types is not None:
+        checks.append(lambda it, kind: kind != 'ambulance' or (it.get('unit_type') or '').lower() in unit_types)
+    if statuses is not None:
+        checks.append(lambda it, kind: kind not in ('incident', 'ambulance') or _is_batch(it)
+                      or (it.get('status') or '').lower() in statuses)
+        unit_checks.append(lambda u: (u.get('status') or BATCH_UNIT_STATUS).lower() in statuses)
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+
+        def located(d):
+            try:
+                lat = float(d.get('lat'))
+                lon = float(d.get('lon'))
+            except (TypeError, ValueError):
+                return False
+            return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+        checks.append(lambda it, kind: kind not in ('incident', 'ambulance') or _is_batch(it) or located(it))
+        unit_checks.append(located)
+
+    if not checks:
+        return None
+
+    def narrow(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        field = _batch_field(item)
+        units = item.get(field) or []
+        kept = [u for u in units if all(check(u) for check in unit_checks)]
+        if len(kept) == len(units):
+            return item
+        if not kept:
+            return None
+        return dict(item, **{field: kept})
+
+    def predicate(item: Dict[str, Any]) -> bool:
+        kind = resource_kind(item)
+        for check in checks:
+            if not check(item, kind):
+                return False
+        return True
+    predicate.narrow = narrow if unit_checks else None
+    return predicate
+
+
+def parse_bbox(value: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """Parse 'min_lon,min_lat,max_lon,max_lat'; raises ValueError on malformed input."""
+    if not value:
+        return None
+    parts = [float(p) for p in value.split(',')]
+    if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+        raise ValueError('bbox must be min_lon,min_lat,max_lon,max_lat')
+    return parts[0], parts[1], parts[2], parts[3]
+
+
+class Event:
+    """A published item serialized once into a ready-to-send SSE frame shared by all subscribers."""
+
+    __slots__ = ('item', 'body', 'frame', 'key', 'seq', 'id')
+
+    def __init__(self, item: Dict[str, Any]):
+        self.item = item
+        self.body = b"data: " + json.dumps(item, default=str).encode() + b"\n\n"
+        self.frame = self.body
+        self.key = coalesce_key(item)
+        self.seq = 0
+        self.id = None
+
+    def assign_id(self, event_id: str, seq: int = 0):
+        self.seq = seq
+        self.id = event_id
+        self.frame = b"id: " + event_id.encode() + b"\n" + self.body
+
+    def narrowed(self, narrow: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> Optional["Event"]:
+        """This event with ``narrow`` applied to its item, under the same id.
+
+        Returns self (and its shared frame) when nothing was removed, None when nothing is left.
+        """
+        item = narrow(self.item)
+        if item is None or item is self.item:
+            return None if item is None else self
+        event = Event(item)
+        if self.id is not None:
+            event.assign_id(self.id, self.seq)
+        return event
+
+
+class Subscription:
+    """Bounded pending-event buffer for one SSE client.
+
+    Overflow policies when ``maxsize`` events are pending:
+    - ``drop_oldest``: discard the oldest pending event
+    - ``disconnect``: close the subscription (the browser's EventSource reconnects)
+    - ``coalesce``: like drop_oldest, but an update for an ambulance/incident that is
+      already pending replaces it, so a slow client only sees the latest state. The
+      replacement moves to the back of the queue so frames still go out in id order
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, maxsize: int = BROADCAST_QUEUE_SIZE, overflow: str = BROADCAST_OVERFLOW,
+                 predicate: Optional[Callable[[Dict[str, Any]], bool]] = None):
+        if overflow not in OVERFLOW_POLICIES:
+            overflow = BROADCAST_OVERFLOW
+        self.id = next(self._ids)
+        self.predicate = predicate
+        self.narrow = getattr(predicate, 'narrow', None)
+        self.maxsize = max(1, int(maxsize))
+        self.overflow = overflow
+        self._pending: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self.closed = False
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.filtered = 0
+        self.created_at = time.time()
+
+    def accept(self, event: Event) -> Optional[Event]:
+        """``event`` as this subscriber sees it, or None when its filters reject it."""
+        if self.predicate is not None and not self.predicate(event.item):
+            self.filtered += 1
+            return None
+        if self.narrow is not None and _is_batch(event.item):
+            # only subscribers filtering on status/bbox pay for a frame of their own
+            event = event.narrowed(self.narrow)
+            if event is None:
+                self.filtered += 1
+        return event
+
+    def push(self, event: Event):
+        if self.closed:
+            return
+        event = self.accept(event)
+        if event is not None:
+            self.enqueue(event)
+
+    def enqueue(self, event: Event):
+        """Queue an already accepted event, applying the overflow policy."""
+        if self.closed:
+            return
+        now = time.monotonic()
+        key = event.key if self.overflow == 'coalesce' else None
+        if key is not None and key in self._pending:
+            # replace the payload and move it behind everything with a lower id, so a
+            # client resuming from its id misses nothing; the first enqueue time stays for lag
+            enq_ts, _ = self._pending[key]
+            self._pending[key] = (enq_ts, event)
+            self._pending.move_to_end(key)
+            self.coalesced += 1
+            self._wakeup.set()
+            return
+        if len(self._pending) >= self.maxsize:
+            if self.overflow == 'disconnect':
+                self.dropped += 1
+                self.close()
+                return
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        if key is None:
+            key = ('seq', next(self._seq))
+        self._pending[key] = (now, event)
+        self._wakeup.set()
+
+    def close(self):
+        self.closed = True
+        self._wakeup.set()
+
+    async def get(self) -> Optional[Event]:
+        """Wait for the next event; returns None once the subscription is closed."""
+        while not self._pending:
+            if self.closed:
+                return None
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        if self.closed and self.overflow == 'disconnect':
+            return None
+        _, (_, event) = self._pending.popitem(last=False)
+        self.delivered += 1
+        return event
+
+    def stats(self) -> Dict[str, Any]:
+        oldest = next(iter(self._pending.values()), None)
+        return {
+            'id': self.id,
+            'overflow': self.overflow,
+            'max_pending': self.maxsize,
+            'pending': len(self._pending),
+            'lag_ms': round((time.monotonic() - oldest[0]) * 1000.0, 1) if oldest else 0.0,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'filtered': self.filtered,
+            'closed': self.closed,
+        }
 
 
 class Broadcaster:
-    def __init__(self):
+    """Fan-out of published items to SSE subscriptions owned by one event loop.
+
+    ``publish`` may be called from any thread (MQTT network thread, ingest/DB threads,
+    sync request handlers). The item is serialized once in the caller's thread, which
+    also snapshots dicts that the caller may keep mutating, and the resulting frame is
+    handed to the owning loop with ``call_soon_threadsafe``. Subscriptions are only ever
+    touched from that loop, and every subscriber shares the same frame bytes.
+
+    Every event gets an SSE id ``<epoch>-<seq>`` (seq increases by one per event, epoch
+    changes on restart) and is kept in a bounded replay log. A client reconnecting with
+    ``Last-Event-ID`` is resumed with just the events it missed; if they have already
+    left the log (or the backend restarted) it gets a snapshot of current state instead.
+    """
+
+    def __init__(self, replay_size: int = BROADCAST_REPLAY_SIZE):
         self.subscribers = set()
+        self.disconnected = 0
+        self.published = 0
+        self.cross_thread = 0
+        self.replayed = 0
+        self.snapshots = 0
+        self.epoch = format(int(time.time()), 'x')
+        self._seq = 0
+        self._log = deque(maxlen=max(1, int(replay_size)))
+        self._snapshot_cache = None
+        self._snapshot_future = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
 
-    async def subscribe(self):
-        q = asyncio.Queue()
-        self.subscribers.add(q)
+    @property
+    def last_event_id(self) -> str:
+        return f"{self.epoch}-{self._seq}"
+
+    def _missed_since(self, last_event_id: str):
+        """Events after ``last_event_id``, or None when they are no longer all in the log."""
+        try:
+            epoch, seq = last_event_id.strip().rsplit('-', 1)
+            seq = int(seq)
+        except (AttributeError, ValueError):
+            return None
+        if epoch != self.epoch or seq > self._seq:
+            return None
+        if seq == self._seq:
+            return []
+        if not self._log or seq < self._log[0].seq - 1:
+            return None
+        return list(itertools.islice(self._log, seq - self._log[0].seq + 1, None))
+
+    def _covered_since(self, seq: int) -> bool:
+        # every event after ``seq`` is still in the replay log
+        return seq >= self._seq or (bool(self._log) and seq >= self._log[0].seq - 1)
+
+    async def _snapshot_events(self, provider: Callable[[], Iterable[Dict[str, Any]]]):
+        """Run ``provider`` in a thread, shared by concurrent callers and cached briefly.
+
+        Returns (events, seq): ``seq`` is the last event id published before the provider
+        started, so the snapshot reflects everything up to it. A cached snapshot is only
+        reused while the events after its ``seq`` are still in the replay log.
+        """
+        cached = self._snapshot_cache
+        if (cached is not None and time.monotonic() - cached[0] < BROADCAST_SNAPSHOT_TTL_S
+                and self._covered_since(cached[2])):
+            return cached[1], cached[2]
+        if self._snapshot_future is None:
+            seq = self._seq
+
+            def build():
+                return [Event(item) for item in provider()], seq
+
+            fut = asyncio.get_running_loop().run_in_executor(None, build)
+
+            def done(f):
+                self._snapshot_future = None
+                if not f.cancelled() and f.exception() is None:
+                    events, seq = f.result()
+                    self._snapshot_cache = (time.monotonic(), events, seq)
+            fut.add_done_callback(done)
+            self._snapshot_future = fut
+        return await asyncio.shield(self._snapshot_future)
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Set the event loop that owns the subscriptions (done on first subscribe too)."""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+
+    async def subscribe(self, maxsize: Optional[int] = None, overflow: Optional[str] = None,
+                        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                        last_event_id: Optional[str] = None,
+                        snapshot: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None):
+        """Yield pre-framed SSE ``bytes`` for every published item accepted by ``predicate``.
+
+        With ``last_event_id`` the stream first replays the missed events, or, when the
+        gap is larger than the replay log or than the subscriber's queue, the items returned
+        by ``snapshot``.
+        """
+        if self._loop is None:
+            self.bind(asyncio.get_running_loop())
+        sub = Subscription(maxsize or BROADCAST_QUEUE_SIZE, overflow or BROADCAST_OVERFLOW, predicate)
+        # register before replaying so nothing published meanwhile is lost
+        self.subscribers.add(sub)
+        registered_seq = self._seq
+        # queued events up to this seq are already covered by the snapshot
+        floor = 0
         try:
+            if last_event_id:
+                missed = self._missed_since(last_event_id)
+                if missed is not None:
+                    missed = [ev for ev in map(sub.accept, missed) if ev is not None]
+                    if len(missed) > sub.maxsize and snapshot is not None:
+                        # the queue would drop (or disconnect on) part of the replay
+                        missed = None
+                if missed is not None:
+                    self.replayed += len(missed)
+                    for event in missed:
+                        sub.enqueue(event)
+                elif snapshot is not None:
+                    self.snapshots += 1
+                    try:
+                        events, snapshot_seq = await self._snapshot_events(snapshot)
+                    except Exception as e:
+                        print('SSE snapshot failed', e)
+                        events, snapshot_seq = [], registered_seq
+                    events = [ev for ev in map(sub.accept, events) if ev is not None]
+                    resume_id = f"{self.epoch}-{snapshot_seq}"
+                    for i, event in enumerate(events):
+                        if i == len(events) - 1:
+                            # only the last snapshot frame carries an id to resume from
+                            yield b"id: " + resume_id.encode() + b"\n" + event.body
+                        else:
+                            yield event.body
+                    # events published after the snapshot was taken but before this
+                    # subscriber registered are in neither; send them from the log
+                    gap = [ev for ev in self._log if snapshot_seq < ev.seq <= registered_seq]
+                    for event in map(sub.accept, gap):
+                        if event is not None:
+                            yield event.frame
+                    floor = snapshot_seq
             while True:
-                item = await q.get()
-                yield item
+                event = await sub.get()
+                if event is None:
+                    self.disconnected += 1
+                    break
+                if event.seq <= floor:
+                    continue
+                yield event.frame
         finally:
-            self.subscribers.discard(q)
+            self.subscribers.discard(sub)
 
     def publish(self, item: Dict[str, Any]):
-        for q in list(self.subscribers):
+        if self._loop is None:
+            # no loop bound yet (before startup): nobody can be listening
+            return
+        event = Event(item)
+        self.published += 1
+        if threading.get_ident() == self._loop_thread:
+            self._fanout(event)
+            return
+        self.cross_thread += 1
+        try:
+            self._loop.call_soon_threadsafe(self._fanout, event)
+        except RuntimeError:
+            # owning loop closed (shutdown)
+            pass
+
+    def _fanout(self, event: Event):
+        self._seq += 1
+        event.assign_id(f"{self.epoch}-{self._seq}", self._seq)
+        self._log.append(event)
+        for sub in list(self.subscribers):
             try:
-                q.put_nowait(item)
+                sub.push(event)
             except Exception:
                 pass
 
+    def stats(self) -> Dict[str, Any]:
+        subs = [s.stats() for s in list(self.subscribers)]
+        return {
+            'subscribers': len(subs),
+            'published': self.published,
+            'cross_thread_published': self.cross_thread,
+            'last_event_id': self.last_event_id,
+            'replay_log': len(self._log),
+            'replay_log_max': self._log.maxlen,
+            'replayed': self.replayed,
+            'snapshots': self.snapshots,
+            'disconnected_for_overflow': self.disconnected,
+            'default_max_pending': BROADCAST_QUEUE_SIZE,
+            'default_overflow': BROADCAST_OVERFLOW,
+            'subscriptions': subs,
+        }
+
 
 broadcaster = Broadcaster()
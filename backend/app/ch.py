@@ -0,0 +1,274 @@
+import os
+import json
+import mmap
+import heapq
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .roadgraph import NodeGrid, PathFinder
+
+ROAD_CH_PATH = os.getenv("ROAD_CH_PATH", "data/cluj_roads.ch")
+
+# file layout: magic | uint32 header length | JSON header | arrays, each 64-byte aligned
+CH_MAGIC = b'DERNCH01'
+CH_ALIGN = 64
+# arrays a hierarchy file must contain (name -> dtype)
+CH_ARRAYS = {
+    'lat': 'float64', 'lon': 'float64', 'rank': 'int32',
+    'up_indptr': 'int64', 'up_indices': 'int32', 'up_weight': 'float32', 'up_middle': 'int32',
+    'down_indptr': 'int64', 'down_indices': 'int32', 'down_weight': 'float32', 'down_middle': 'int32',
+    'grid_keys': 'int64', 'grid_ptr': 'int64', 'grid_nodes': 'int32',
+}
+# memoryview format codes for the arrays walked by the search loop
+_MV_FORMAT = {'int32': 'i', 'int64': 'q', 'float32': 'f', 'float64': 'd'}
+INF = float('inf')
+
+
+def _data_start(header_len: int) -> int:
+    # arrays start at the first aligned position after the header
+    return -(-(len(CH_MAGIC) + 4 + header_len) // CH_ALIGN) * CH_ALIGN
+
+
+def write_ch(path: str, arrays: Dict[str, np.ndarray], meta: Optional[Dict[str, Any]] = None):
+    """Serialize hierarchy arrays into the memory-mappable CH file format."""
+    header = {'meta': meta or {}, 'arrays': {}}
+    blobs = []
+    offset = 0
+    for name, dtype in CH_ARRAYS.items():
+        arr = np.ascontiguousarray(arrays[name], dtype=dtype)
+        header['arrays'][name] = {'dtype': dtype, 'offset': offset, 'count': int(arr.size)}
+        blobs.append((offset, arr))
+        offset += -(-arr.nbytes // CH_ALIGN) * CH_ALIGN
+    header_bytes = json.dumps(header).encode()
+    base = _data_start(len(header_bytes))
+    with open(path, 'wb') as f:
+        f.write(CH_MAGIC)
+        f.write(len(header_bytes).to_bytes(4, 'little'))
+        f.write(header_bytes)
+        for off, arr in blobs:
+            f.seek(base + off)
+            f.write(arr.tobytes())
+
+
+class ContractionHierarchy(PathFinder):
+    """Contraction hierarchy over the road graph, mapped read-only from disk.
+
+    Built offline by ``scripts/build_contraction_hierarchy.py``. Every node has a rank;
+    the "up" graph holds the edges (original and shortcuts) from each node to
+    higher-ranked nodes, the "down" graph the edges into each node from higher-ranked
+    nodes. A query runs Dijkstra upward from both ends and meets at the top, so it only
+    settles a few hundred nodes. Shortcuts record the node they bypass, which is how a
+    path is unpacked back to road nodes.
+
+    The file is mapped with ``mmap`` and wrapped without copying: NumPy views for the
+    vectorized parts (snapping, geometry) and typed ``memoryview`` casts, which index to
+    plain Python numbers, for the search loop. Every worker process mapping the same
+    file shares its pages.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(CH_MAGIC)] != CH_MAGIC:
+            raise ValueError(f"{path} is not a contraction hierarchy file")
+        hlen = int.from_bytes(self._mm[len(CH_MAGIC):len(CH_MAGIC) + 4], 'little')
+        header = json.loads(self._mm[len(CH_MAGIC) + 4:len(CH_MAGIC) + 4 + hlen])
+        self.meta = header.get('meta', {})
+        base = _data_start(hlen)
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._views: Dict[str, memoryview] = {}
+        for name, spec in header['arrays'].items():
+            start = base + spec['offset']
+            arr = np.frombuffer(self._mm, dtype=spec['dtype'], count=spec['count'], offset=start)
+            self._arrays[name] = arr
+            nbytes = arr.nbytes
+            self._views[name] = memoryview(self._mm)[start:start + nbytes].cast(_MV_FORMAT[spec['dtype']])
+        a, v = self._arrays, self._views
+        self.lat = a['lat']
+        self.lon = a['lon']
+        self.rank = a['rank']
+        self.grid = NodeGrid(a['grid_keys'], a['grid_ptr'], a['grid_nodes'], self.lat, self.lon)
+        self._up = (v['up_indptr'], v['up_indices'], v['up_weight'], v['up_middle'])
+        self._down = (v['down_indptr'], v['down_indices'], v['down_weight'], v['down_middle'])
+        self._rank = v['rank']
+
+    @classmethod
+    def load(cls, path: str) -> 'ContractionHierarchy':
+        return cls(path)
+
+    @property
+    def node_count(self) -> int:
+        return int(self.lat.size)
+
+    @property
+    def edge_count(self) -> int:
+        return int(self._arrays['up_indices'].size + self._arrays['down_indices'].size)
+
+    # -- queries ------------------------------------------------------------------
+    def _bidirectional(self, src: int, dst: int):
+        """Bidirectional upward search with stall-on-demand.
+
+        Returns (travel seconds, meeting node, forward parents, backward parents), with
+        seconds ``inf`` when ``dst`` is unreachable.
+        """
+        fptr, fidx, fw, _ = self._up
+        bptr, bidx, bw, _ = self._down
+        df = {src: 0.0}
+        db = {dst: 0.0}
+        pf = {src: -1}
+        pb = {dst: -1}
+        hf = [(0.0, src)]
+        hb = [(0.0, dst)]
+        push, pop = heapq.heappush, heapq.heappop
+        best, meet = INF, -1
+        while True:
+            f_open = bool(hf) and hf[0][0] < best
+            b_open = bool(hb) and hb[0][0] < best
+            if not f_open and not b_open:
+                break
+            if f_open:
+                d, u = pop(hf)
+                if d <= df[u] and not self._stalled(u, d, df, self._down):
+                    other = db.get(u)
+                    if other is not None and d + other < best:
+                        best, meet = d + other, u
+                    for e in range(fptr[u], fptr[u + 1]):
+                        v = fidx[e]
+                        nd = d + fw[e]
+                        if nd < df.get(v, INF):
+                            df[v] = nd
+                            pf[v] = u
+                            push(hf, (nd, v))
+            if b_open:
+                d, u = pop(hb)
+                if d <= db[u] and not self._stalled(u, d, db, self._up):
+                    other = df.get(u)
+                    if other is not None and d + other < best:
+                        best, meet = d + other, u
+                    for e in range(bptr[u], bptr[u + 1]):
+                        v = bidx[e]
+                        nd = d + bw[e]
+                        if nd < db.get(v, INF):
+                            db[v] = nd
+                            pb[v] = u
+                            push(hb, (nd, v))
+        return best, meet, pf, pb
+
+    @staticmethod
+    def _stalled(u: int, d: float, dist: Dict[int, float], graph) -> bool:
+        # u cannot be on a shortest up-path if a higher node already reached reaches it faster
+        ptr, idx, w, _ = graph
+        for e in range(ptr[u], ptr[u + 1]):
+            dv = dist.get(idx[e])
+            if dv is not None and dv + w[e] < d:
+                return True
+        return False
+
+    def travel_time(self, src: int, dst: int) -> Optional[float]:
+        """Travel seconds from ``src`` to ``dst`` without unpacking the path, or None."""
+        if src == dst:
+            return 0.0
+        best = self._bidirectional(src, dst)[0]
+        return best if best < INF else None
+
+    def shortest_path(self, src: int, dst: int) -> Optional[Tuple[List[int], float]]:
+        """Bidirectional upward search; returns (road node path, travel seconds) or None."""
+        if src == dst:
+            return [src], 0.0
+        best, meet, pf, pb = self._bidirectional(src, dst)
+        if meet < 0:
+            return None
+        # CH path: src .. meet (upward edges) then meet .. dst (downward edges)
+        up_nodes = [meet]
+        while pf[up_nodes[-1]] != -1:
+            up_nodes.append(pf[up_nodes[-1]])
+        up_nodes.reverse()
+        down_nodes = [meet]
+        while pb[down_nodes[-1]] != -1:
+            down_nodes.append(pb[down_nodes[-1]])
+        ch_path = up_nodes + down_nodes[1:]
+        path = [src]
+        for a, b in zip(ch_path[:-1], ch_path[1:]):
+            self._unpack(a, b, path)
+        return path, best
+
+    def _edge_middle(self, a: int, b: int) -> int:
+        # an edge a -> b is stored in a's up list if b ranks higher, otherwise in b's down list
+        if self._rank[b] > self._rank[a]:
+            ptr, idx, _, mid = self._up
+            lo, hi, target = ptr[a], ptr[a + 1], b
+        else:
+            ptr, idx, _, mid = self._down
+            lo, hi, target = ptr[b], ptr[b + 1], a
+        for e in range(lo, hi):
+            if idx[e] == target:
+                return mid[e]
+        return -1
+
+    def _unpack(self, a: int, b: int, out: List[int]):
+        """Append the road nodes after ``a`` up to and including ``b`` to ``out``."""
+        stack = [(a, b)]
+        while stack:
+            u, v = stack.pop()
+            m = self._edge_middle(u, v)
+            if m < 0:
+                out.append(v)
+            else:
+                # process u -> m before m -> v
+                stack.append((m, v))
+                stack.append((u, m))
+
+    def _search_space(self, node: int, graph, reverse) -> Dict[int, float]:
+        """Full upward Dijkstra from ``node``; returns settled (unstalled) node -> distance."""
+        ptr, idx, w, _ = graph
+        dist = {node: 0.0}
+        settled = {}
+        heap = [(0.0, node)]
+        push, pop = heapq.heappush, heapq.heappop
+        while heap:
+            d, u = pop(heap)
+            if u in settled:
+                continue
+            if self._stalled(u, d, settled, reverse):
+                continue
+            settled[u] = d
+            for e in range(ptr[u], ptr[u + 1]):
+                v = idx[e]
+                nd = d + w[e]
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    push(heap, (nd, v))
+        return settled
+
+    def table(self, sources: Sequence[int], targets: Sequence[int]) -> List[List[float]]:
+        """Travel seconds from every source to every target (``inf`` where unreachable).
+
+        Bucket-based many-to-many: one backward upward search per target fills per-node
+        buckets, then one forward upward search per source scans them.
+        """
+        buckets: Dict[int, List[Tuple[int, float]]] = {}
+        for j, t in enumerate(targets):
+            for v, d in self._search_space(t, self._down, self._up).items():
+                buckets.setdefault(v, []).append((j, d))
+        out = []
+        for s in sources:
+            row = [INF] * len(targets)
+            for v, d in self._search_space(s, self._up, self._down).items():
+                for j, dt in buckets.get(v, ()):
+                    if d + dt < row[j]:
+                        row[j] = d + dt
+            out.append(row)
+        return out
+
+    def one_to_many(self, source: int, targets: Sequence[int]) -> List[float]:
+        return self.table([source], targets)[0]
+
+    def many_to_one(self, sources: Sequence[int], target: int) -> List[float]:
+        return [row[0] for row in self.table(sources, [target])]
+
+    def stats(self) -> Dict[str, Any]:
+        return {'nodes': self.node_count, 'edges': self.edge_count, 'grid_cells': len(self.grid),
+                'shortcuts': self.meta.get('shortcuts'), 'file': self.path,
+                'file_mb': round(len(self._mm) / 1e6, 1)}
@@ -6,19 +6,30 @@ from paho.mqtt import client as mqtt_client
 from datetime import datetime
 
 from confluent_kafka import Producer
+from sqlalchemy import insert
 from .db import SessionLocal
 from .models import Incident as IncidentModel
 from .broadcast import broadcaster
 from .utils import enrich_incident
+from .ingest import IncidentBatcher, AsyncIngestPipeline
+from .hotstore import IncidentHotStore
+from .autodispatch import auto_dispatcher
+from .incident_lookup import incident_lookup
 
-# simple in-memory store for incidents (kept for backward compatibility)
-incidents_store: List[dict] = []
+# bounded in-memory hot store of recent incidents (fallback when the DB is unavailable)
+incidents_store = IncidentHotStore()
 
 MQTT_BROKER = os.getenv("MQTT_BROKER", "mosquitto")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 MQTT_TOPIC = os.getenv("MQTT_TOPIC", "dern/incidents")
+# when set, replicas join an MQTT shared subscription ($share/<group>/<topic>) so the
+# broker delivers each incident to exactly one backend in the group
+MQTT_SHARED_GROUP = os.getenv("MQTT_SHARED_GROUP", "")
 KAFKA_BROKER = os.getenv("KAFKA_BROKER", "kafka:9092")
 KAFKA_TOPIC = os.getenv("KAFKA_TOPIC", "dern_incidents")
+# "thread": paho loop_forever in an executor thread feeding the IncidentBatcher
+# "asyncio": paho driven by the event loop feeding a bounded queue + worker pool
+MQTT_INGEST_MODE = os.getenv("MQTT_INGEST_MODE", "thread").lower()
 
 # create a module-level Kafka producer to reuse and allow flushing on shutdown
 _producer = None
@@ -28,9 +39,15 @@ except Exception as e:
     print("Warning: could not create Kafka producer at import time", e)
 
 
+def subscription_topic() -> str:
+    if MQTT_SHARED_GROUP:
+        return f"$share/{MQTT_SHARED_GROUP}/{MQTT_TOPIC}"
+    return MQTT_TOPIC
+
+
 def on_connect(client, userdata, flags, rc):
     print("MQTT connected with result code", rc)
-    client.subscribe(MQTT_TOPIC)
+    client.subscribe(subscription_topic())
 
 
 def produce_to_kafka(payload_str: str):
@@ -65,68 +82,217 @@ def flush_kafka(timeout: float = 5.0):
         print("Error flushing Kafka producer", e)
 
 
+def incident_row(data: dict) -> dict:
+    """Map an enriched incident payload onto `incidents` column values."""
+    return {
+        'id': data.get("id"),
+        'type': data.get("type"),
+        'lat': float(data.get("lat") or 0),
+        'lon': float(data.get("lon") or 0),
+        'severity': int(data.get("severity") or 1),
+        'status': data.get("status", "new"),
+        'notes': data.get("notes"),
+        'patient_name': data.get("patient_name"),
+        'patient_age': data.get("patient_age"),
+        'patient_contact': data.get("patient_contact"),
+        'address': data.get("address"),
+        'contact': data.get("contact"),
+        'sensor_id': data.get("sensor_id"),
+        'sensor_type': data.get("sensor_type"),
+        'received_at': datetime.fromisoformat(data.get("received_at")),
+        'updated_at': datetime.utcnow(),
+    }
+
+
+def persist_incidents(items: List[dict]) -> List[dict]:
+    """Write a batch of incidents in one multi-row INSERT and return their persisted dicts.
+
+    If the batch is rejected (e.g. one duplicate (id, received_at) key) we retry the rows
+    one by one so a single bad message does not cost the whole batch. Rows that still fail
+    are passed through unpersisted, matching the old per-message behaviour.
+    """
+    rows = []
+    out = []
+    for data in items:
+        try:
+            rows.append(incident_row(data))
+        except Exception as e:
+            print("Invalid incident payload", e)
+            out.append(data)
+    if not rows:
+        return out
+
+    db = SessionLocal()
+    try:
+        db.execute(insert(IncidentModel), rows)
+        db.commit()
+        for row in rows:
+            incident_lookup.note(row['id'], row['received_at'])
+        return out + [IncidentModel(**row).to_dict() for row in rows]
+    except Exception as e:
+        db.rollback()
+        print("Batch insert failed, retrying row by row", e)
+        for row in rows:
+            try:
+                db.execute(insert(IncidentModel), [row])
+                db.commit()
+                incident_lookup.note(row['id'], row['received_at'])
+            except Exception as row_err:
+                db.rollback()
+                print("DB write failed", row_err)
+            out.append(IncidentModel(**row).to_dict())
+        return out
+    finally:
+        db.close()
+
+
+def after_persist(data: dict):
+    """Per-incident fan-out, run once the incident's batch has been committed."""
+    # append to in-memory store
+    incidents_store.add(data)
+
+    # produce to kafka for downstream processing
+    try:
+        produce_to_kafka(json.dumps(data))
+    except Exception as e:
+        print("Kafka produce failed", e)
+
+    # broadcast to SSE subscribers
+    try:
+        broadcaster.publish(data)
+    except Exception as e:
+        print("Broadcast failed", e)
+
+    # hand new incidents to the auto-dispatcher (no-op unless AUTO_DISPATCH is on)
+    auto_dispatcher.submit(data)
+
+
+batcher = IncidentBatcher(persist_incidents, after_persist)
+
+
 def on_message(client, userdata, msg):
     try:
         payload = msg.payload.decode()
         data = json.loads(payload)
         # enrich incoming incident so UI has required fields
         data = enrich_incident(data)
-        print("Received incident", data)
-
-        # persist to DB
-        try:
-            db = SessionLocal()
-            inc = IncidentModel(
-                id=data.get("id"),
-                type=data.get("type"),
-                lat=float(data.get("lat") or 0),
-                lon=float(data.get("lon") or 0),
-                severity=int(data.get("severity") or 1),
-                status=data.get("status", "new"),
-                notes=data.get("notes"),
-                patient_name=data.get("patient_name"),
-                patient_age=data.get("patient_age"),
-                patient_contact=data.get("patient_contact"),
-                address=data.get("address"),
-                contact=data.get("contact"),
-                sensor_id=data.get("sensor_id"),
-                sensor_type=data.get("sensor_type"),
-                received_at=datetime.fromisoformat(data.get("received_at")),
-                updated_at=datetime.utcnow()
-            )
-            db.add(inc)
-            db.commit()
-            # Get the persisted incident with all fields
-            data = inc.to_dict()
-            db.close()
-        except Exception as e:
-            print("DB write failed", e)
+        # persistence and fan-out happen on the batcher thread
+        if not batcher.submit(data):
+            print("Ingest buffer full, dropped incident", data.get("id"))
+    except Exception as e:
+        print("Failed to handle message", e)
 
-        # append to in-memory store
-        incidents_store.insert(0, data)
 
-        # produce to kafka for downstream processing
-        try:
-            produce_to_kafka(json.dumps(data))
-        except Exception as e:
-            print("Kafka produce failed", e)
+pipeline = AsyncIngestPipeline(enrich_incident, persist_incidents, after_persist)
 
-        # broadcast to SSE subscribers
-        try:
-            broadcaster.publish(data)
-        except Exception as e:
-            print("Broadcast failed", e)
 
+def on_message_async(client, userdata, msg):
+    # runs on the event loop: decode just enough to route by incident id, workers do the rest
+    try:
+        data = json.loads(msg.payload.decode())
     except Exception as e:
-        print("Failed to handle message", e)
+        print("Failed to decode message", e)
+        return
+    if not pipeline.offer(data):
+        print("Ingest queue full, dropped incident", data.get("id") if isinstance(data, dict) else None)
+
+
+class AsyncioMqttHelper:
+    """Drive a paho client from the asyncio event loop instead of a network thread.
+
+    paho notifies us when its socket opens/closes and when it has data to write; we
+    register the socket with the loop and call loop_read/loop_write when it is ready.
+    loop_misc (keepalive pings, reconnect) runs in a small periodic task. Reading can
+    be paused while the ingest queue is full, which pushes back on the broker via TCP.
+    ``should_read`` is asked on every (re)connect, so a reconnect during backpressure
+    stays paused until the pipeline resumes it.
+    """
+
+    def __init__(self, loop, client, should_read=None):
+        self.loop = loop
+        self.client = client
+        self.should_read = should_read
+        self.sock = None
+        self.reading = False
+        self.misc = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock):
+        self.sock = sock
+        if self.should_read is None or self.should_read():
+            self.resume_reading()
+        if self.misc is None or self.misc.done():
+            self.misc = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        self.pause_reading()
+        self.sock = None
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    def pause_reading(self):
+        if self.sock is not None and self.reading:
+            self.loop.remove_reader(self.sock)
+            self.reading = False
+
+    def resume_reading(self):
+        if self.sock is not None and not self.reading:
+            self.loop.add_reader(self.sock, self.client.loop_read)
+            self.reading = True
+
+    async def misc_loop(self):
+        while True:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                break
+            if self.client.loop_misc() != mqtt_client.MQTT_ERR_SUCCESS:
+                try:
+                    print("MQTT connection lost, reconnecting")
+                    self.client.reconnect()
+                except Exception as e:
+                    print("MQTT reconnect failed", e)
+
+
+def ingest_stats() -> dict:
+    base = {"mode": MQTT_INGEST_MODE, "topic": subscription_topic(), "hot_store": incidents_store.stats(),
+            "incident_lookup": incident_lookup.stats()}
+    if MQTT_INGEST_MODE == "asyncio":
+        return {**base, **pipeline.stats()}
+    return {**base, **batcher.stats()}
+
+
+async def stop_ingest():
+    """Drain buffered incidents before shutdown."""
+    if MQTT_INGEST_MODE == "asyncio":
+        await pipeline.stop()
+    else:
+        batcher.stop()
 
 
 async def start_mqtt_listener():
     loop = asyncio.get_event_loop()
     client = mqtt_client.Client()
     client.on_connect = on_connect
-    client.on_message = on_message
 
+    if MQTT_INGEST_MODE == "asyncio":
+        client.on_message = on_message_async
+        pipeline.start(loop)
+        helper = AsyncioMqttHelper(loop, client, should_read=lambda: not pipeline.paused)
+        pipeline.on_pause = helper.pause_reading
+        pipeline.on_resume = helper.resume_reading
+        client.connect(MQTT_BROKER, MQTT_PORT)
+        return
+
+    client.on_message = on_message
+    batcher.start()
     client.connect(MQTT_BROKER, MQTT_PORT)
 
     # run network loop in executor to not block asyncio
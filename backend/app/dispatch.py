@@ -0,0 +1,170 @@
+import os
+import time
+from typing import Dict, Any, List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from ortools.graph.python import linear_sum_assignment
+except Exception:  # solver wheel missing: fall back to the NumPy Hungarian below
+    linear_sum_assignment = None
+
+# travel time is multiplied by 1 + DISPATCH_SEVERITY_WEIGHT * (severity - 1)
+DISPATCH_SEVERITY_WEIGHT = float(os.getenv("DISPATCH_SEVERITY_WEIGHT", 0.5))
+# unit/incident pairs further apart than this are never matched
+DISPATCH_MAX_TRAVEL_S = float(os.getenv("DISPATCH_MAX_TRAVEL_S", 1800))
+# OR-Tools needs integer costs: weighted seconds are scaled to this resolution
+DISPATCH_COST_SCALE = 10
+PENDING_STATUSES = ('new', 'accepted')
+
+
+def unit_type_for(incident: Dict[str, Any]) -> str:
+    """Which unit pool serves an incident: fire units for fires, ambulances for everything else."""
+    return 'fire' if (incident.get('type') or '').lower() == 'fire' else 'ambulance'
+
+
+def severity_weights(severities: Sequence[int]) -> np.ndarray:
+    s = np.clip(np.asarray([v or 1 for v in severities], dtype=np.float64), 1.0, 5.0)
+    return 1.0 + DISPATCH_SEVERITY_WEIGHT * (s - 1.0)
+
+
+def _hungarian(cost: np.ndarray) -> np.ndarray:
+    """Min-cost assignment for an (n, m) matrix with n <= m; returns the column of each row.
+
+    Shortest augmenting path form of the Hungarian algorithm with the inner loop over
+    columns vectorized, O(n^2 m) worst case. Row potentials start at the row minima and
+    rows are first matched greedily on zero reduced cost edges, so only the remaining
+    rows need an augmenting path search.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)  # p[j]: row (1-based) matched to column j, 0 = free
+    way = np.zeros(m + 1, dtype=np.int64)
+    u[1:] = cost.min(axis=1)
+    unmatched = []
+    for i in range(1, n + 1):
+        tight = np.nonzero((cost[i - 1] <= u[i]) & (p[1:] == 0))[0]
+        if len(tight):
+            p[tight[0] + 1] = i
+        else:
+            unmatched.append(i)
+    for i in unmatched:
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            masked = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+            cols = np.nonzero(used)[0]
+            u[p[cols]] += delta
+            v[cols] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols_of = np.full(n, -1, dtype=np.int64)
+    for j in range(1, m + 1):
+        if p[j]:
+            cols_of[p[j] - 1] = j - 1
+    return cols_of
+
+
+def _solve_ortools(cost: np.ndarray) -> np.ndarray:
+    """Same contract as ``_hungarian`` on OR-Tools' SimpleLinearSumAssignment.
+
+    The solver wants a perfect matching with non-negative integer costs, so the matrix is
+    padded square with zero rows and shifted by its minimum. Both leave the optimum unchanged.
+    """
+    n, m = cost.shape
+    square = np.zeros((m, m))
+    square[:n] = cost
+    square -= square.min()
+    rows, cols = np.divmod(np.arange(m * m, dtype=np.int64), m)
+    lsa = linear_sum_assignment.SimpleLinearSumAssignment()
+    lsa.add_arcs_with_cost(rows, cols, np.rint(square.ravel() * DISPATCH_COST_SCALE).astype(np.int64))
+    status = lsa.solve()
+    if status != lsa.OPTIMAL:
+        raise RuntimeError(f'linear sum assignment failed with status {status}')
+    return np.asarray([lsa.right_mate(i) for i in range(n)], dtype=np.int64)
+
+
+def solve_dispatch(seconds: np.ndarray, severities: Sequence[int],
+                   max_travel_s: float = DISPATCH_MAX_TRAVEL_S) -> Dict[str, Any]:
+    """Severity-weighted min-cost matching of units to incidents.
+
+    ``seconds`` is the (units x incidents) travel-time matrix from ``TravelTimeMatrix``.
+    The objective is the sum of weight * travel time over served incidents, plus
+    weight * (max_travel_s + 1) for every incident left without a unit. Serving an
+    incident in range is therefore always better than leaving it, and when units are
+    scarce the most severe incidents are served first. Out-of-range pairs cost the
+    same as not matching at all, so no dummy rows or columns are needed. Returns {'pairs': [(incident_idx,
+    unit_idx)], 'solver', 'solve_ms', 'objective'}.
+    """
+    t0 = time.perf_counter()
+    n_units, n_inc = seconds.shape
+    if n_units == 0 or n_inc == 0:
+        return {'pairs': [], 'solver': None, 'solve_ms': 0.0, 'objective': 0.0}
+    w = severity_weights(severities)
+    in_range = np.isfinite(seconds) & (seconds <= max_travel_s)
+    capped = np.where(in_range, seconds, max_travel_s + 1.0)
+    # the solvers want rows <= columns
+    transpose = n_units >= n_inc
+    if transpose:
+        # every incident row gets a column, so shifting row i by w_i * (max_travel_s + 1)
+        # turns "minus benefit" into plain weighted travel time, which converges much faster
+        cost = w[:, None] * capped.T
+    else:
+        # units are scarce: minus the benefit of sending unit j to incident i (0 if not allowed)
+        cost = -(w[None, :] * (max_travel_s + 1.0 - capped))
+
+    solver = 'hungarian'
+    cols = None
+    if linear_sum_assignment is not None:
+        try:
+            cols = _solve_ortools(cost)
+            solver = 'ortools'
+        except Exception as e:
+            print('OR-Tools assignment failed, using NumPy fallback', e)
+    if cols is None:
+        cols = _hungarian(cost)
+
+    pairs = []
+    for r, c in enumerate(cols):
+        unit, inc = (int(c), r) if transpose else (r, int(c))
+        if 0 <= c < cost.shape[1] and in_range[unit, inc]:
+            pairs.append((inc, unit))
+    pairs.sort()
+    served = np.zeros(n_inc, dtype=bool)
+    objective = 0.0
+    for inc, unit in pairs:
+        served[inc] = True
+        objective += w[inc] * seconds[unit, inc]
+    objective += float((w[~served] * (max_travel_s + 1.0)).sum())
+    return {'pairs': pairs, 'solver': solver, 'solve_ms': round((time.perf_counter() - t0) * 1000.0, 3),
+            'objective': round(objective, 1)}
+
+
+def split_by_unit_type(incidents: List[Dict[str, Any]], units: List[Dict[str, Any]]) -> List[Tuple[str, list, list]]:
+    """Group (incident, unit) candidates into independent per-unit-type problems."""
+    groups: Dict[str, Tuple[list, list]] = {}
+    for inc in incidents:
+        groups.setdefault(unit_type_for(inc), ([], []))[0].append(inc)
+    for unit in units:
+        key = (unit.get('unit_type') or 'ambulance').lower()
+        if key in groups:
+            groups[key][1].append(unit)
+    return [(k, incs, us) for k, (incs, us) in groups.items()]
@@ -0,0 +1,387 @@
+import os
+import time
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional
+
+import numpy as np
+
+from .geo import bearing_deg, destination_point, haversine_m
+from .ingest import LatencyStats
+from .routes import Route, positions_along
+
+FLEET_TICK_S = float(os.getenv("FLEET_TICK_S", 1.0))
+# how long an arrived unit stays 'arrived' before it is released back to the pool
+FLEET_ARRIVAL_HOLD_S = float(os.getenv("FLEET_ARRIVAL_HOLD_S", 2.0))
+# resource name of the batched movement frame published once per tick
+FLEET_BATCH_RESOURCE = 'ambulances'
+DEFAULT_SPEED_KMH = 80.0
+# motion: dead-reckoning updates only when a client's extrapolation would drift
+# positions: the full unit payload of every moving unit on every tick
+FLEET_STREAM = os.getenv("FLEET_STREAM", "motion").lower()
+MOTION_RESOURCE = 'motion'
+# send a unit's motion again when the client's extrapolated position is off by this much
+MOTION_ERROR_M = float(os.getenv("MOTION_ERROR_M", 15.0))
+# ... or it moved onto a route segment whose heading differs by more than this
+MOTION_HEADING_DEG = float(os.getenv("MOTION_HEADING_DEG", 20.0))
+# ... or this long passed since its last update (late joiners and lost frames recover)
+MOTION_KEEPALIVE_S = float(os.getenv("MOTION_KEEPALIVE_S", 5.0))
+# clients stop extrapolating this long after the last update
+MOTION_HORIZON_S = 2.0 * MOTION_KEEPALIVE_S
+# columns of the per-unit "last sent motion" array
+_M_LAT, _M_LON, _M_HEADING, _M_SPEED, _M_TIME, _M_SEG = range(6)
+
+
+class _Unit:
+    __slots__ = ('id', 'info', 'route')
+
+    def __init__(self, unit_id: str, info: Dict[str, Any], route: Route):
+        self.id = unit_id
+        self.info = info
+        self.route = route
+
+
+class FleetEngine:
+    """Moves every en-route unit from a single asyncio task.
+
+    Every active unit follows a ``Route`` built once when it is added. The routes'
+    vertices and cumulative distances are concatenated into one buffer (each route
+    shifted by a base offset so the distances stay sorted), and a unit's state is just
+    its distance ``s`` along its route. A tick adds ``speed * dt`` to ``s`` for the whole
+    fleet, finds every position with one ``searchsorted`` over the buffer, and gets the
+    remaining distance as ``length - s``. That replaces one thread and two DB
+    round-trips per unit. Per tick the engine hands every position to ``positions`` (a
+    write-behind ``PositionStore``) when given, else to ``persist`` as one bulk write (run
+    in a worker thread, skipped while the previous one is in flight).
+
+    With ``FLEET_STREAM=motion`` (default) clients dead-reckon: a unit's position,
+    heading and speed are published only when the extrapolation from its last update
+    would drift (see ``motion_mask``), in one ``motion`` frame per unit type. The route
+    geometry itself goes out once, with the assignment. ``FLEET_STREAM=positions``
+    publishes every moving unit's full payload each tick instead.
+
+    Units arriving at their target are removed from the arrays and reported through
+    ``on_arrival``; ``on_release`` runs ``FLEET_ARRIVAL_HOLD_S`` later to free them.
+    Both callbacks do DB work and run in a worker thread. ``add_unit`` and
+    ``remove_unit`` are safe to call from any thread.
+    """
+
+    def __init__(self,
+                 persist: Callable[[List[Dict[str, Any]]], None],
+                 publish: Callable[[Dict[str, Any]], None],
+                 on_arrival: Callable[[Dict[str, Any]], None],
+                 on_release: Callable[[Dict[str, Any]], None],
+                 tick_s: float = FLEET_TICK_S,
+                 arrival_hold_s: float = FLEET_ARRIVAL_HOLD_S,
+                 index=None,
+                 positions=None):
+        self.persist = persist
+        # optional spatial index (app.spatial.UnitIndex) kept current with every tick
+        self.index = index
+        # optional write-behind store (app.positions.PositionStore); replaces per-tick ``persist``
+        self.positions = positions
+        self.publish = publish
+        self.on_arrival = on_arrival
+        self.on_release = on_release
+        self.tick_s = tick_s
+        self.arrival_hold_s = arrival_hold_s
+
+        self._lock = threading.Lock()
+        self._pending_add: Dict[str, Dict[str, Any]] = {}
+        self._pending_remove = set()
+        self._units: List[_Unit] = []
+        self._index: Dict[str, int] = {}
+        self._loop = None
+        self._task = None
+        self._persist_future = None
+        self._last_tick = None
+
+        self.lat = np.zeros(0)
+        self.lon = np.zeros(0)
+        self.seg = np.zeros(0, dtype=np.int64)
+        self._set_units([], [], [])
+
+        self.ticks = 0
+        self.arrivals = 0
+        self.skipped_persists = 0
+        self.motion_updates = 0
+        self.motion_candidates = 0
+        self.tick_latency = LatencyStats()
+        self.persist_latency = LatencyStats()
+
+    # -- membership ---------------------------------------------------------------
+    def add_unit(self, unit: Dict[str, Any], route: Optional[Route] = None):
+        """Start (or restart) moving a unit; ``unit`` is an Ambulance.to_dict() payload.
+
+        Pass the ``Route`` built at assignment to reuse it. Without one the route is
+        parsed from ``unit['route']`` and the unit resumes from the vertex nearest to its
+        current position (or drives straight to its target when there is no geometry).
+        """
+        with self._lock:
+            self._pending_remove.discard(unit['ambulance_id'])
+            self._pending_add[unit['ambulance_id']] = (dict(unit), route)
+
+    def remove_unit(self, unit_id: str):
+        with self._lock:
+            self._pending_add.pop(unit_id, None)
+            self._pending_remove.add(unit_id)
+
+    def __len__(self):
+        return len(self._units)
+
+    def _build_unit(self, info: Dict[str, Any], route: Optional[Route]):
+        """Return (unit, start distance along its route) or None."""
+        progress = 0.0
+        if route is None:
+            route = Route.from_geojson(info.get('route'))
+            if route is not None:
+                progress = route.project(float(info['lat']), float(info['lon']))
+        if route is None:
+            if info.get('target_lat') is None or info.get('target_lon') is None:
+                return None
+            route = Route.straight(float(info['lat']), float(info['lon']),
+                                   float(info['target_lat']), float(info['target_lon']))
+        return _Unit(info['ambulance_id'], info, route), progress
+
+    def _apply_pending(self):
+        with self._lock:
+            adds = self._pending_add
+            removes = self._pending_remove
+            self._pending_add = {}
+            self._pending_remove = set()
+        if not adds and not removes:
+            return
+        keep = [i for i, u in enumerate(self._units) if u.id not in removes and u.id not in adds]
+        units = [self._units[i] for i in keep]
+        dist = list(self.s[keep])
+        speed = list(self.speed[keep])
+        motion = self._motion[keep]
+        for info, route in adds.values():
+            try:
+                built = self._build_unit(info, route)
+            except Exception as e:
+                print('fleet: could not add unit', info.get('ambulance_id'), e)
+                built = None
+            if built is None:
+                continue
+            unit, progress = built
+            units.append(unit)
+            dist.append(progress)
+            speed.append(float(info.get('speed_kmh') or DEFAULT_SPEED_KMH) * 1000.0 / 3600.0)
+        self._set_units(units, dist, speed, motion)
+
+    def _set_units(self, units, dist, speed, motion=None):
+        self._units = units
+        self._index = {u.id: i for i, u in enumerate(units)}
+        self.s = np.asarray(dist, dtype=np.float64)
+        self.speed = np.asarray(speed, dtype=np.float64)
+        # last motion sent per unit; new units start with nothing sent
+        fresh = np.tile([np.nan, np.nan, np.nan, np.nan, -np.inf, -1.0], (len(units), 1))
+        if motion is not None and len(motion):
+            fresh[:len(motion)] = motion
+        self._motion = fresh
+        if not units:
+            self.total = np.zeros(0)
+            self.base = np.zeros(0)
+            self.first = np.zeros(0, dtype=np.int64)
+            self.last = np.zeros(0, dtype=np.int64)
+            self._vlat = self._vlon = self._cum = self._vheading = np.zeros(0)
+            return
+        self.total = np.asarray([u.route.length_m for u in units], dtype=np.float64)
+        self.base = np.concatenate([[0.0], np.cumsum(self.total)[:-1]])
+        counts = np.asarray([len(u.route) for u in units], dtype=np.int64)
+        self.first = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+        self.last = self.first + counts - 1
+        self._vlat = np.concatenate([u.route.lat for u in units])
+        self._vlon = np.concatenate([u.route.lon for u in units])
+        self._cum = np.concatenate([u.route.cum_m + b for u, b in zip(units, self.base)])
+        # heading of the segment starting at each vertex (the last vertex of a route is never a segment start)
+        self._vheading = np.append(bearing_deg(self._vlat[:-1], self._vlon[:-1], self._vlat[1:], self._vlon[1:]), 0.0)
+
+    # -- movement -----------------------------------------------------------------
+    def advance(self, dt: float):
+        """Move every unit ``speed * dt`` meters along its route.
+
+        Returns (remaining_m, arrived_mask) as arrays aligned with the unit order.
+        """
+        if not self._units:
+            return np.zeros(0), np.zeros(0, dtype=bool)
+        self.s = np.minimum(self.s + self.speed * dt, self.total)
+        self.lat, self.lon, self.seg = positions_along(self._cum, self._vlat, self._vlon,
+                                                       self.base + self.s, self.first, self.last,
+                                                       return_index=True)
+        remaining = self.total - self.s
+        return remaining, remaining <= 0.0
+
+    def motion_mask(self, now: float, moving: np.ndarray) -> np.ndarray:
+        """Which units need a new motion update at monotonic time ``now``.
+
+        A client extrapolates each unit from its last update along a straight line at
+        constant speed. The engine runs the same extrapolation and resends a unit
+        when the prediction is off by more than ``MOTION_ERROR_M``, when its speed
+        changed, when it entered a segment turning more than ``MOTION_HEADING_DEG``,
+        or when ``MOTION_KEEPALIVE_S`` passed. Units never sent before (NaN state) always go.
+        """
+        m = self._motion
+        heading = self._vheading[self.seg]
+        elapsed = now - m[:, _M_TIME]
+        with np.errstate(invalid='ignore'):
+            plat, plon = destination_point(m[:, _M_LAT], m[:, _M_LON], m[:, _M_HEADING],
+                                           m[:, _M_SPEED] * np.minimum(elapsed, MOTION_HORIZON_S))
+            error = haversine_m(plat, plon, self.lat, self.lon)
+            turn = np.abs((heading - m[:, _M_HEADING] + 180.0) % 360.0 - 180.0)
+            send = (np.isnan(error) | (error > MOTION_ERROR_M)
+                    | (self.speed != m[:, _M_SPEED])
+                    | (elapsed >= MOTION_KEEPALIVE_S)
+                    | ((self.seg != m[:, _M_SEG]) & (turn > MOTION_HEADING_DEG)))
+        send &= moving
+        m[send, _M_LAT] = self.lat[send]
+        m[send, _M_LON] = self.lon[send]
+        m[send, _M_HEADING] = heading[send]
+        m[send, _M_SPEED] = self.speed[send]
+        m[send, _M_TIME] = now
+        m[send, _M_SEG] = self.seg[send]
+        return send
+
+    def _motion_frames(self, now: float, moving: np.ndarray, eta_s: np.ndarray) -> Dict[str, List[Dict[str, Any]]]:
+        send = self.motion_mask(now, moving)
+        self.motion_candidates += int(moving.sum())
+        frames: Dict[str, List[Dict[str, Any]]] = {}
+        for i in np.nonzero(send)[0].tolist():
+            unit = self._units[i]
+            m = self._motion[i]
+            frames.setdefault(unit.info.get('unit_type') or 'ambulance', []).append({
+                'ambulance_id': unit.id,
+                'lat': round(float(m[_M_LAT]), 6),
+                'lon': round(float(m[_M_LON]), 6),
+                'heading': round(float(m[_M_HEADING]), 1),
+                'speed': round(float(m[_M_SPEED]), 2),
+                'seg': int(m[_M_SEG] - self.first[i]),
+                'eta_s': round(float(eta_s[i]), 1),
+            })
+        self.motion_updates += int(send.sum())
+        return frames
+
+    async def tick(self, dt: float):
+        self._apply_pending()
+        if not self._units:
+            return
+        t0 = time.perf_counter()
+        remaining, arrived = self.advance(dt)
+        now = datetime.utcnow()
+        eta_s = remaining / np.maximum(self.speed, 0.1)
+        motion = None
+        if FLEET_STREAM == 'motion':
+            motion = self._motion_frames(time.monotonic(), ~arrived, eta_s)
+
+        rows = []
+        batches: Dict[str, List[Dict[str, Any]]] = {}
+        arrivals = []
+        lat = self.lat.tolist()
+        lon = self.lon.tolist()
+        eta_list = eta_s.tolist()
+        arrived_list = arrived.tolist()
+        for i, unit in enumerate(self._units):
+            info = unit.info
+            if arrived_list[i]:
+                end_lat, end_lon = unit.route.end
+                info.update(lat=end_lat, lon=end_lon, status='arrived', eta=None)
+                arrivals.append(info)
+                continue
+            eta = (now + timedelta(seconds=eta_list[i])).isoformat()
+            info.update(lat=lat[i], lon=lon[i], eta=eta)
+            rows.append({'id': unit.id, 'lat': lat[i], 'lon': lon[i], 'eta': now + timedelta(seconds=eta_list[i])})
+            if motion is None:
+                batches.setdefault(info.get('unit_type') or 'ambulance', []).append(info)
+        self.tick_latency.observe((time.perf_counter() - t0) * 1000.0)
+        self.ticks += 1
+
+        if rows:
+            if self.index is not None:
+                self.index.move_many([r['id'] for r in rows], [r['lat'] for r in rows], [r['lon'] for r in rows])
+            if self.positions is not None:
+                self.positions.record(rows, now)
+            else:
+                self._persist_async(rows)
+        frames = [{'resource': FLEET_BATCH_RESOURCE, 'unit_type': unit_type, 'ambulances': units}
+                  for unit_type, units in batches.items()]
+        if motion:
+            ts_ms = int(time.time() * 1000)
+            frames += [{'resource': MOTION_RESOURCE, 'unit_type': unit_type, 'ts': ts_ms,
+                        'horizon_s': MOTION_HORIZON_S, 'units': units}
+                       for unit_type, units in motion.items()]
+        for frame in frames:
+            try:
+                self.publish(frame)
+            except Exception as e:
+                print('fleet: publish failed', e)
+
+        if arrivals:
+            for info in arrivals:
+                self.remove_unit(info['ambulance_id'])
+                if self.positions is not None:
+                    self.positions.arrived(info['ambulance_id'], info['lat'], info['lon'], now)
+            self._apply_pending()
+            for info in arrivals:
+                self.arrivals += 1
+                self._loop.create_task(self._arrive(info))
+
+    def _persist_async(self, rows):
+        if self._persist_future is not None and not self._persist_future.done():
+            # the DB is slower than the tick rate: skip rather than queue stale positions
+            self.skipped_persists += 1
+            return
+
+        def run():
+            t0 = time.perf_counter()
+            try:
+                self.persist(rows)
+            except Exception as e:
+                print('fleet: position persist failed', e)
+            self.persist_latency.observe((time.perf_counter() - t0) * 1000.0)
+
+        self._persist_future = self._loop.run_in_executor(None, run)
+
+    async def _arrive(self, info: Dict[str, Any]):
+        try:
+            await self._loop.run_in_executor(None, self.on_arrival, info)
+            await asyncio.sleep(self.arrival_hold_s)
+            await self._loop.run_in_executor(None, self.on_release, info)
+        except Exception as e:
+            print('fleet: arrival handling failed', e)
+
+    # -- lifecycle ------------------------------------------------------------------
+    def start(self, loop):
+        if self._task is not None:
+            return
+        self._loop = loop
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        self._last_tick = time.monotonic()
+        while True:
+            started = time.monotonic()
+            dt = started - self._last_tick
+            self._last_tick = started
+            try:
+                await self.tick(dt)
+            except Exception as e:
+                print('fleet tick error', e)
+            await asyncio.sleep(max(0.0, self.tick_s - (time.monotonic() - started)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'active_units': len(self._units),
+            'route_vertices': int(self._vlat.size),
+            'tick_s': self.tick_s,
+            'ticks': self.ticks,
+            'arrivals': self.arrivals,
+            'skipped_persists': self.skipped_persists,
+            'stream': FLEET_STREAM,
+            'motion_updates': self.motion_updates,
+            # share of moving-unit ticks that needed an update (1.0 = the per-tick position stream)
+            'motion_update_ratio': round(self.motion_updates / self.motion_candidates, 4) if self.motion_candidates else None,
+            'tick_latency': self.tick_latency.snapshot(),
+            'persist_latency': self.persist_latency.snapshot(),
+        }
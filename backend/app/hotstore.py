@@ -0,0 +1,131 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+INCIDENT_STORE_CAPACITY = int(os.getenv("INCIDENT_STORE_CAPACITY", 5000))
+
+
+class IncidentHotStore:
+    """Bounded in-memory store of the most recent incidents.
+
+    ``_records`` is an id -> record ordered dict kept in arrival order (oldest first), so it
+    doubles as the time-ordered ring buffer: adding an incident past ``capacity`` evicts
+    the oldest one. Secondary indexes by status and type are ordered id sets, so lookups
+    by id are O(1) and filtered listings are O(k) in the number of matching records.
+
+    Records handed out are the stored dicts; change them through ``update`` so the
+    indexes stay in sync. All methods are safe to call from the MQTT, simulator and
+    request threads.
+    """
+
+    def __init__(self, capacity: int = INCIDENT_STORE_CAPACITY):
+        self.capacity = max(1, int(capacity))
+        self._lock = threading.RLock()
+        self._records: "OrderedDict[str, dict]" = OrderedDict()
+        self._by_status: Dict[str, "OrderedDict[str, None]"] = {}
+        self._by_type: Dict[str, "OrderedDict[str, None]"] = {}
+        self.evicted = 0
+
+    @staticmethod
+    def _key(value) -> str:
+        return (value or '').lower() if isinstance(value, str) else str(value or '')
+
+    def _index(self, index, key, inc_id):
+        bucket = index.get(key)
+        if bucket is None:
+            bucket = index[key] = OrderedDict()
+        bucket[inc_id] = None
+        bucket.move_to_end(inc_id)
+
+    def _unindex(self, index, key, inc_id):
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.pop(inc_id, None)
+            if not bucket:
+                del index[key]
+
+    def add(self, record: dict) -> dict:
+        """Insert or replace an incident and mark it as the newest entry."""
+        inc_id = record.get('id')
+        if inc_id is None:
+            return record
+        with self._lock:
+            old = self._records.pop(inc_id, None)
+            if old is not None:
+                self._unindex(self._by_status, self._key(old.get('status')), inc_id)
+                self._unindex(self._by_type, self._key(old.get('type')), inc_id)
+            self._records[inc_id] = record
+            self._index(self._by_status, self._key(record.get('status')), inc_id)
+            self._index(self._by_type, self._key(record.get('type')), inc_id)
+            while len(self._records) > self.capacity:
+                old_id, old_rec = self._records.popitem(last=False)
+                self._unindex(self._by_status, self._key(old_rec.get('status')), old_id)
+                self._unindex(self._by_type, self._key(old_rec.get('type')), old_id)
+                self.evicted += 1
+        return record
+
+    def get(self, inc_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._records.get(inc_id)
+
+    def update(self, inc_id: str, **fields) -> Optional[dict]:
+        """Apply field changes to a stored incident, keeping indexes current. Returns the record."""
+        with self._lock:
+            rec = self._records.get(inc_id)
+            if rec is None:
+                return None
+            if 'status' in fields and self._key(fields['status']) != self._key(rec.get('status')):
+                self._unindex(self._by_status, self._key(rec.get('status')), inc_id)
+                self._index(self._by_status, self._key(fields['status']), inc_id)
+            if 'type' in fields and self._key(fields['type']) != self._key(rec.get('type')):
+                self._unindex(self._by_type, self._key(rec.get('type')), inc_id)
+                self._index(self._by_type, self._key(fields['type']), inc_id)
+            rec.update(fields)
+            return rec
+
+    def list(self, status: Optional[str] = None, type: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """Return incidents newest first, optionally filtered by status and/or type."""
+        with self._lock:
+            if status is None and type is None:
+                ids = reversed(self._records)
+                check = None
+            else:
+                s_idx = self._by_status.get(self._key(status), {}) if status is not None else None
+                t_idx = self._by_type.get(self._key(type), {}) if type is not None else None
+                # walk the smaller index and check membership in the other one
+                if s_idx is not None and (t_idx is None or len(s_idx) <= len(t_idx)):
+                    ids, check = reversed(s_idx), t_idx
+                else:
+                    ids, check = reversed(t_idx), s_idx
+            out = []
+            for inc_id in ids:
+                if check is not None and inc_id not in check:
+                    continue
+                out.append(self._records[inc_id])
+                if limit is not None and len(out) >= limit:
+                    break
+            return out
+
+    def count(self, status: Optional[str] = None, type: Optional[str] = None) -> int:
+        with self._lock:
+            if status is None and type is None:
+                return len(self._records)
+            if type is None:
+                return len(self._by_status.get(self._key(status), ()))
+            if status is None:
+                return len(self._by_type.get(self._key(type), ()))
+        return len(self.list(status=status, type=type))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': len(self._records),
+                'capacity': self.capacity,
+                'evicted': self.evicted,
+                'by_status': {k: len(v) for k, v in self._by_status.items()},
+                'by_type': {k: len(v) for k, v in self._by_type.items()},
+            }
@@ -0,0 +1,181 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import DBAPIError
+
+from .models import Incident as IncidentModel
+
+# id -> latest received_at entries kept in process
+INCIDENT_LOOKUP_CACHE_SIZE = int(os.getenv("INCIDENT_LOOKUP_CACHE_SIZE", 20000))
+# another replica may insert a newer version; cached entries are re-read after this long
+INCIDENT_LOOKUP_TTL_S = float(os.getenv("INCIDENT_LOOKUP_TTL_S", 30.0))
+
+
+_LATEST = text("SELECT received_at FROM incident_latest WHERE id = :id")
+# SQLSTATE undefined_table: the DB has no migration 0010
+UNDEFINED_TABLE = '42P01'
+
+
+def _scan(incident_id: str):
+    # the pre-0010 query: probes every chunk
+    return (select(IncidentModel.received_at).where(IncidentModel.id == incident_id)
+            .order_by(IncidentModel.received_at.desc()).limit(1))
+
+
+def _by_key(incident_id: str, received_at: datetime, for_update: bool):
+    stmt = select(IncidentModel).where(IncidentModel.id == incident_id, IncidentModel.received_at == received_at)
+    return stmt.with_for_update() if for_update else stmt
+
+
+class IncidentLookup:
+    """Finds the newest row of an incident id without probing every chunk.
+
+    ``incidents`` is keyed on (id, received_at), so ``WHERE id = x ORDER BY received_at
+    DESC`` has to look into every chunk of the hypertable. The lookup instead resolves
+    the id to its newest ``received_at`` and then loads the row by its full primary key.
+    Chunk exclusion then leaves exactly one chunk to probe.
+
+    ``received_at`` is resolved from:
+      1. an in-process LRU, fed by this process' writes (``note``) and earlier lookups
+      2. the ``incident_latest`` table, maintained by a trigger on incidents (migration 0010)
+      3. the old ordered scan, for ids missing from the table (e.g. a DB without 0010)
+    """
+
+    def __init__(self, max_size: int = INCIDENT_LOOKUP_CACHE_SIZE, ttl_s: float = INCIDENT_LOOKUP_TTL_S):
+        self.max_size = max(1, max_size)
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._table_ok = True
+        self.counts = {'cache_hits': 0, 'table_hits': 0, 'scans': 0, 'stale': 0, 'misses': 0}
+
+    # -- cache ----------------------------------------------------------------------
+    def _cached(self, incident_id: str) -> Optional[datetime]:
+        with self._lock:
+            entry = self._cache.get(incident_id)
+            if entry is None:
+                return None
+            received_at, stored = entry
+            if time.monotonic() - stored > self.ttl_s:
+                del self._cache[incident_id]
+                return None
+            self._cache.move_to_end(incident_id)
+            return received_at
+
+    def _remember(self, incident_id: str, received_at: datetime):
+        with self._lock:
+            self._cache[incident_id] = (received_at, time.monotonic())
+            self._cache.move_to_end(incident_id)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def note(self, incident_id: str, received_at: datetime):
+        """Record a version written by this process; older versions never replace a newer one."""
+        if not incident_id or received_at is None:
+            return
+        with self._lock:
+            entry = self._cache.get(incident_id)
+            if entry is not None and entry[0] > received_at:
+                return
+        self._remember(incident_id, received_at)
+
+    def forget(self, incident_id: str):
+        with self._lock:
+            self._cache.pop(incident_id, None)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counts[key] += 1
+
+    # -- lookups --------------------------------------------------------------------
+    def _resolved(self, incident_id: str, received_at: Optional[datetime], source: str) -> Optional[datetime]:
+        self._count(source)
+        if received_at is None:
+            self._count('misses')
+            return None
+        self._remember(incident_id, received_at)
+        return received_at
+
+    def _table_failed(self, e):
+        code = getattr(e.orig, 'pgcode', None) or getattr(e.orig, 'sqlstate', None)
+        if code == UNDEFINED_TABLE:
+            # table not migrated yet: stop asking and use the scan
+            print('incident_latest missing, using ordered scans', e.orig)
+            self._table_ok = False
+        else:
+            # anything else (timeout, lock, ...) only sends this one lookup to the scan
+            print('incident_latest lookup failed, scanning once', e.orig)
+
+    def latest_received_at(self, db, incident_id: str) -> Optional[datetime]:
+        """Newest ``received_at`` stored for ``incident_id`` (None when unknown)."""
+        received_at = self._cached(incident_id)
+        if received_at is not None:
+            self._count('cache_hits')
+            return received_at
+        if self._table_ok:
+            try:
+                received_at = db.execute(_LATEST, {'id': incident_id}).scalar()
+            except DBAPIError as e:
+                db.rollback()
+                self._table_failed(e)
+        if received_at is not None:
+            return self._resolved(incident_id, received_at, 'table_hits')
+        return self._resolved(incident_id, db.execute(_scan(incident_id)).scalar(), 'scans')
+
+    def latest(self, db, incident_id: str, for_update: bool = False) -> Optional[IncidentModel]:
+        """Newest ``IncidentModel`` row for ``incident_id``, loaded by its primary key."""
+        for _ in range(2):
+            received_at = self.latest_received_at(db, incident_id)
+            if received_at is None:
+                return None
+            inc = db.execute(_by_key(incident_id, received_at, for_update)).scalars().first()
+            if inc is not None:
+                return inc
+            # cached version was deleted meanwhile: drop it and resolve once more
+            self._count('stale')
+            self.forget(incident_id)
+        return None
+
+    async def latest_received_at_async(self, db, incident_id: str) -> Optional[datetime]:
+        """``latest_received_at`` on an ``AsyncSession``."""
+        received_at = self._cached(incident_id)
+        if received_at is not None:
+            self._count('cache_hits')
+            return received_at
+        if self._table_ok:
+            try:
+                received_at = (await db.execute(_LATEST, {'id': incident_id})).scalar()
+            except DBAPIError as e:
+                await db.rollback()
+                self._table_failed(e)
+        if received_at is not None:
+            return self._resolved(incident_id, received_at, 'table_hits')
+        return self._resolved(incident_id, (await db.execute(_scan(incident_id))).scalar(), 'scans')
+
+    async def latest_async(self, db, incident_id: str, for_update: bool = False) -> Optional[IncidentModel]:
+        """``latest`` on an ``AsyncSession``."""
+        for _ in range(2):
+            received_at = await self.latest_received_at_async(db, incident_id)
+            if received_at is None:
+                return None
+            inc = (await db.execute(_by_key(incident_id, received_at, for_update))).scalars().first()
+            if inc is not None:
+                return inc
+            self._count('stale')
+            self.forget(incident_id)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._cache)
+            counts = dict(self.counts)
+        return {'cache_size': size, 'max_size': self.max_size, 'ttl_s': self.ttl_s,
+                'table': self._table_ok, 'counts': counts}
+
+
+incident_lookup = IncidentLookup()
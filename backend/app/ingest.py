@@ -0,0 +1,382 @@
+import os
+import time
+import zlib
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 200))
+INGEST_FLUSH_INTERVAL_MS = float(os.getenv("INGEST_FLUSH_INTERVAL_MS", 50))
+INGEST_BUFFER_SIZE = int(os.getenv("INGEST_BUFFER_SIZE", 10000))
+# how long a producer may block waiting for buffer space before the message is dropped
+INGEST_SUBMIT_TIMEOUT_S = float(os.getenv("INGEST_SUBMIT_TIMEOUT_S", 1.0))
+
+
+class LatencyStats:
+    """Small thread-safe latency accumulator (milliseconds) with a recent-sample window."""
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    def observe(self, ms: float):
+        with self._lock:
+            self.count += 1
+            self.total_ms += ms
+            self.last_ms = ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+            self._recent.append(ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent)
+            count = self.count
+            total = self.total_ms
+            last = self.last_ms
+            mx = self.max_ms
+
+        def pct(p):
+            if not recent:
+                return 0.0
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 3)
+
+        return {
+            'count': count,
+            'avg_ms': round(total / count, 3) if count else 0.0,
+            'last_ms': round(last, 3),
+            'max_ms': round(mx, 3),
+            'p50_ms': pct(0.50),
+            'p99_ms': pct(0.99),
+        }
+
+
+class IncidentBatcher:
+    """Bounded write-behind buffer that flushes incidents to the DB in batches.
+
+    Producers (the MQTT network thread) call ``submit`` which only appends to the
+    in-memory buffer. A single flush thread drains the buffer whenever it reaches
+    ``batch_size`` items or the oldest buffered item is ``flush_interval_ms`` old,
+    hands the batch to ``write_batch`` (one multi-row INSERT) and then calls
+    ``on_committed`` for every persisted incident so fan-out happens only after
+    the batch is durable.
+    """
+
+    def __init__(self,
+                 write_batch: Callable[[List[dict]], List[dict]],
+                 on_committed: Callable[[dict], None],
+                 batch_size: int = INGEST_BATCH_SIZE,
+                 flush_interval_ms: float = INGEST_FLUSH_INTERVAL_MS,
+                 max_buffer: int = INGEST_BUFFER_SIZE,
+                 submit_timeout_s: float = INGEST_SUBMIT_TIMEOUT_S):
+        self.write_batch = write_batch
+        self.on_committed = on_committed
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval_s = max(0.0, float(flush_interval_ms) / 1000.0)
+        self.max_buffer = max(self.batch_size, int(max_buffer))
+        self.submit_timeout_s = submit_timeout_s
+
+        self._buf = deque()
+        self._cond = threading.Condition()
+        self._oldest_ts: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.submitted = 0
+        self.persisted = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.batches = 0
+        self.rows_flushed = 0
+        self.batch_latency = LatencyStats()
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name='incident-batcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the flush thread after draining whatever is still buffered."""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def submit(self, item: dict) -> bool:
+        """Buffer one parsed incident. Blocks briefly when the buffer is full, then drops."""
+        with self._cond:
+            if len(self._buf) >= self.max_buffer:
+                deadline = time.monotonic() + self.submit_timeout_s
+                while len(self._buf) >= self.max_buffer:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.dropped += 1
+                        return False
+                    self._cond.wait(remaining)
+            if not self._buf:
+                self._oldest_ts = time.monotonic()
+            self._buf.append(item)
+            self.submitted += 1
+            if len(self._buf) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def _take_batch(self) -> List[dict]:
+        with self._cond:
+            while self._running:
+                if self._buf:
+                    if len(self._buf) >= self.batch_size:
+                        break
+                    remaining = (self._oldest_ts or 0.0) + self.flush_interval_s - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                else:
+                    self._cond.wait(0.5)
+            n = min(len(self._buf), self.batch_size)
+            batch = [self._buf.popleft() for _ in range(n)]
+            self._oldest_ts = time.monotonic() if self._buf else None
+            # wake producers waiting for buffer space
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                self.flush(batch)
+            with self._cond:
+                if not self._running and not self._buf:
+                    return
+
+    def flush(self, batch: List[dict]):
+        t0 = time.perf_counter()
+        try:
+            persisted = self.write_batch(batch)
+            self.persisted += len(persisted)
+        except Exception as e:
+            # keep the previous behaviour: a failed DB write still reaches the UIs
+            print("Incident batch write failed", e)
+            self.failed_batches += 1
+            persisted = batch
+        self.batches += 1
+        self.rows_flushed += len(batch)
+        self.batch_latency.observe((time.perf_counter() - t0) * 1000.0)
+
+        for data in persisted:
+            try:
+                self.on_committed(data)
+            except Exception as e:
+                print("Post-commit handling failed", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            depth = len(self._buf)
+        return {
+            'batch_size': self.batch_size,
+            'flush_interval_ms': self.flush_interval_s * 1000.0,
+            'max_buffer': self.max_buffer,
+            'buffered': depth,
+            'submitted': self.submitted,
+            'persisted': self.persisted,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'failed_batches': self.failed_batches,
+            'avg_batch_rows': round(self.rows_flushed / self.batches, 2) if self.batches else 0.0,
+            'batch_latency': self.batch_latency.snapshot(),
+        }
+
+
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 1000))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+
+
+def partition_for(key: Optional[str], partitions: int) -> int:
+    """Stable partition for an incident id (same result in every process, unlike hash())."""
+    if partitions <= 1 or key is None:
+        return 0
+    return zlib.crc32(str(key).encode()) % partitions
+
+
+class AsyncIngestPipeline:
+    """Partitioned, bounded asyncio queues drained by a pool of ingest workers.
+
+    The MQTT network loop only calls ``offer`` with the decoded payload. Each worker owns
+    one bounded queue and incidents are routed to a queue by ``crc32(id)``, so all
+    messages for the same incident are handled by the same worker in arrival order. A
+    worker takes whatever is queued (up to ``batch_size``), runs ``prepare`` (enrich),
+    writes the batch with ``write_batch`` on a dedicated thread pool and then runs
+    ``on_committed`` per incident on the event loop.
+
+    When any queue fills up the pipeline calls ``on_pause`` so the caller can stop
+    reading from the broker socket; ``on_resume`` fires once every queue has drained
+    below half. Messages that still arrive for a full queue are dropped and counted.
+    """
+
+    def __init__(self,
+                 prepare: Callable[[dict], dict],
+                 write_batch: Callable[[List[dict]], List[dict]],
+                 on_committed: Callable[[dict], None],
+                 workers: int = INGEST_WORKERS,
+                 maxsize: int = INGEST_QUEUE_SIZE,
+                 batch_size: int = INGEST_BATCH_SIZE):
+        self.prepare = prepare
+        self.write_batch = write_batch
+        self.on_committed = on_committed
+        self.workers = max(1, int(workers))
+        self.maxsize = max(1, int(maxsize))
+        self.queue_maxsize = max(1, self.maxsize // self.workers)
+        self.batch_size = max(1, int(batch_size))
+        self.on_pause: Optional[Callable[[], None]] = None
+        self.on_resume: Optional[Callable[[], None]] = None
+
+        self.queues: List[asyncio.Queue] = []
+        self._loop = None
+        self._tasks = []
+        self._executor = None
+        self._rr = 0
+        self.paused = False
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.processed = 0
+        self.failed = 0
+        self.pauses = 0
+        self.stage_latency = {
+            'queue_wait': LatencyStats(),
+            'enrich': LatencyStats(),
+            'persist': LatencyStats(),
+            'fanout': LatencyStats(),
+        }
+
+    def start(self, loop):
+        if self._tasks:
+            return
+        self._loop = loop
+        self.queues = [asyncio.Queue(maxsize=self.queue_maxsize) for _ in range(self.workers)]
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ingest-db')
+        self._tasks = [loop.create_task(self._worker(q)) for q in self.queues]
+
+    async def stop(self, timeout: float = 5.0):
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self.queues)), timeout)
+        except Exception:
+            pass
+        for t in self._tasks:
+            t.cancel()
+        self._tasks = []
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def offer(self, item: dict) -> bool:
+        """Route a decoded payload to its partition without blocking. Call on the event loop."""
+        key = item.get('id') if isinstance(item, dict) else None
+        if key is None:
+            # no ordering to preserve: spread id-less messages round-robin
+            self._rr = (self._rr + 1) % self.workers
+            q = self.queues[self._rr]
+        else:
+            q = self.queues[partition_for(key, self.workers)]
+        try:
+            q.put_nowait((time.monotonic(), item))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        if q.full() and not self.paused:
+            self.paused = True
+            self.pauses += 1
+            if self.on_pause:
+                self.on_pause()
+        return True
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self.queues)
+
+    def _maybe_resume(self):
+        if self.paused and all(q.qsize() <= self.queue_maxsize // 2 for q in self.queues):
+            self.paused = False
+            if self.on_resume:
+                self.on_resume()
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            first = await queue.get()
+            raw = [first]
+            while len(raw) < self.batch_size:
+                try:
+                    raw.append(queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            self._maybe_resume()
+            try:
+                await self._process(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += len(raw)
+                print("Ingest worker failed", e)
+            finally:
+                for _ in raw:
+                    queue.task_done()
+
+    async def _process(self, raw):
+        now = time.monotonic()
+        for enq_ts, _ in raw:
+            self.stage_latency['queue_wait'].observe((now - enq_ts) * 1000.0)
+
+        t0 = time.perf_counter()
+        items = []
+        for _, data in raw:
+            try:
+                items.append(self.prepare(data))
+            except Exception as e:
+                self.failed += 1
+                print("Failed to handle message", e)
+        self.stage_latency['enrich'].observe((time.perf_counter() - t0) * 1000.0)
+        if not items:
+            return
+
+        t0 = time.perf_counter()
+        try:
+            persisted = await self._loop.run_in_executor(self._executor, self.write_batch, items)
+        except Exception as e:
+            print("Incident batch write failed", e)
+            persisted = items
+        self.stage_latency['persist'].observe((time.perf_counter() - t0) * 1000.0)
+
+        t0 = time.perf_counter()
+        for data in persisted:
+            try:
+                self.on_committed(data)
+            except Exception as e:
+                print("Post-commit handling failed", e)
+        self.processed += len(persisted)
+        self.stage_latency['fanout'].observe((time.perf_counter() - t0) * 1000.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'queue_max': self.maxsize,
+            'queue_depth': self.depth(),
+            'partition_depths': [q.qsize() for q in self.queues],
+            'paused': self.paused,
+            'pauses': self.pauses,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+            'processed': self.processed,
+            'failed': self.failed,
+            'stage_latency': {k: v.snapshot() for k, v in self.stage_latency.items()},
+        }
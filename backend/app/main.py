@@ -1,26 +1,45 @@
 import os
 import asyncio
-import threading
 import json
-import math
+import time
 import uuid
 from datetime import datetime, timedelta
-from fastapi import FastAPI, Request, Query
+from fastapi import FastAPI, Request, Query, Depends
 from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional
 
-from .consumer import start_mqtt_listener, incidents_store, flush_kafka
-from .db import SessionLocal
+from .consumer import start_mqtt_listener, incidents_store, flush_kafka, ingest_stats, stop_ingest
+from .db import SessionLocal, get_async_db, async_engine, DB_UNAVAILABLE
 from .models import Incident as IncidentModel, Ambulance as AmbulanceModel
 from .models import Closure as ClosureModel
-from .broadcast import broadcaster
+from .models import AmbulancePosition as AmbulancePositionModel
+from .models import IncidentLatest as IncidentLatestModel
+from .broadcast import broadcaster, compile_filter, parse_bbox
 from .db import engine
 from .models import Base as ModelsBase
 from fastapi import Body
 import random
 import traceback
 from .utils import enrich_incident
+from .fleet import FleetEngine
+from .autodispatch import auto_dispatcher
+from .dispatch import solve_dispatch, split_by_unit_type, DISPATCH_MAX_TRAVEL_S, PENDING_STATUSES
+from .geo import meters_per_degree
+from .positions import PositionStore, downsample_track, TRACK_MAX_POINTS
+from .routes import Route
+from .routing import router
+from .matrix import matrix, MATRIX_MAX_CELLS
+from .spatial import unit_index
+from .incident_lookup import incident_lookup
+from .pagination import (CLOSURE_REPORTS_FETCH_SIZE, CLOSURE_REPORTS_MAX_PAGE_SIZE, INCIDENT_FIELDS,
+                         INCIDENTS_MAX_PAGE_SIZE, INCIDENTS_PAGE_SIZE, KEY_FIELDS,
+                         decode_cursor, encode_cursor, parse_fields, parse_time, row_to_dict)
+from .stats import incident_counts, bucket_start, STATS_BUCKETS, STATS_MAX_BUCKETS
+from sqlalchemy import bindparam, update, or_, text, tuple_, select, func, literal, true
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 
 app = FastAPI(title="DERN - Backend")
@@ -42,197 +61,129 @@ class AssignRequest(BaseModel):
     unit_type: Optional[str] = 'ambulance'
 
 
-def haversine_meters(lat1, lon1, lat2, lon2):
-    # approximate radius of earth in meters
-    R = 6371000.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi/2.0)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2.0)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    return R * c
+class DispatchBatchRequest(BaseModel):
+    unit_type: Optional[str] = None
+    dry_run: bool = False
+    max_travel_s: Optional[float] = None
 
 
-async def simulate_ambulance(amb_id: str):
-    """Background coroutine to move ambulance towards its target and broadcast updates."""
+class MatrixPoint(BaseModel):
+    lat: float
+    lon: float
+    id: Optional[str] = None
+
+
+class MatrixRequest(BaseModel):
+    origins: List[MatrixPoint]
+    destinations: List[MatrixPoint]
+
+
+# only units still en route take a tick position: an arrival committed while a flush was
+# in flight must not get the last tick's lat/lon/eta written back over it
+_UPDATE_POSITIONS = (update(AmbulanceModel.__table__)
+                     .where(AmbulanceModel.__table__.c.id == bindparam('b_id'),
+                            AmbulanceModel.__table__.c.status == 'enroute')
+                     .values(lat=bindparam('b_lat'), lon=bindparam('b_lon'), eta=bindparam('b_eta')))
+
+
+def persist_fleet_positions(rows):
+    """Write one fleet tick of unit positions/ETAs with a single executemany UPDATE."""
     db = SessionLocal()
     try:
-        amb: AmbulanceModel = db.query(AmbulanceModel).filter(AmbulanceModel.id == amb_id).first()
+        db.execute(_UPDATE_POSITIONS, [{'b_id': r['id'], 'b_lat': r['lat'], 'b_lon': r['lon'], 'b_eta': r.get('eta')}
+                                       for r in rows])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def append_position_history(samples):
+    """Append buffered position samples to the ambulance_positions hypertable in one INSERT."""
+    db = SessionLocal()
+    try:
+        db.execute(pg_insert(AmbulancePositionModel).on_conflict_do_nothing(), samples)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def handle_unit_arrival(unit: dict):
+    """Fleet callback: mark the unit arrived and resolve its incident (Doctor Closure workflow)."""
+    incident_id = None
+    db = SessionLocal()
+    try:
+        amb = db.query(AmbulanceModel).filter(AmbulanceModel.id == unit['ambulance_id']).first()
         if not amb:
-            db.close()
             return
-
-        # loop until arrival; if route geojson is present follow its coordinates sequentially
-        # Use shorter ticks for snappier updates
-        tick_s = 1.0
+        amb.lat = amb.target_lat if amb.target_lat is not None else unit['lat']
+        amb.lon = amb.target_lon if amb.target_lon is not None else unit['lon']
+        amb.status = 'arrived'
+        amb.eta = None
+        db.commit()
+        incident_id = amb.incident_id
+        unit_index.upsert(amb.to_dict())
         try:
-            route_points = None
-            if amb.route:
-                try:
-                    route_obj = json.loads(amb.route)
-                    # Mapbox geojson coordinates are [lon, lat]
-                    coords = None
-                    if isinstance(route_obj, dict):
-                        # common GeoJSON shapes: either a LineString with 'coordinates'
-                        # or a FeatureCollection/Feature with geometry.coordinates
-                        if 'coordinates' in route_obj:
-                            coords = route_obj.get('coordinates')
-                        else:
-                            # try to handle Feature / FeatureCollection
-                            features = route_obj.get('features')
-                            if features and isinstance(features, list):
-                                geom = features[0].get('geometry') if isinstance(features[0], dict) else None
-                                if geom and 'coordinates' in geom:
-                                    coords = geom.get('coordinates')
-                    # convert to [(lat, lon), ...] if coords is a list of [lon, lat]
-                    if coords:
-                        route_points = [(c[1], c[0]) for c in coords]
-                    else:
-                        route_points = None
-                except Exception:
-                    route_points = None
-
-            # If we have route points, we follow them; otherwise fallback to linear interpolation
-            if route_points:
-                idx = 0
-                while amb and amb.status == 'enroute' and idx < len(route_points):
-                    next_lat, next_lon = route_points[idx]
-                    dist_m = haversine_meters(amb.lat, amb.lon, next_lat, next_lon)
-                    if dist_m <= 3.0:
-                        # move to next point
-                        amb.lat = next_lat
-                        amb.lon = next_lon
-                        idx += 1
-                    else:
-                        speed_m_s = (amb.speed_kmh or 80.0) * 1000.0 / 3600.0
-                        move_m = speed_m_s * tick_s
-                        frac = min(1.0, move_m / max(1.0, dist_m))
-                        amb.lat = amb.lat + (next_lat - amb.lat) * frac
-                        amb.lon = amb.lon + (next_lon - amb.lon) * frac
-
-                    # recompute ETA using remaining route points distance
-                    remaining = 0.0
-                    curr_lat, curr_lon = amb.lat, amb.lon
-                    for j in range(idx, len(route_points)):
-                        p_lat, p_lon = route_points[j]
-                        remaining += haversine_meters(curr_lat, curr_lon, p_lat, p_lon)
-                        curr_lat, curr_lon = p_lat, p_lon
-
-                    speed_m_s = (amb.speed_kmh or 80.0) * 1000.0 / 3600.0
-                    eta_seconds = remaining / max(0.1, speed_m_s)
-                    amb.eta = datetime.utcnow() + timedelta(seconds=eta_seconds)
-                    db.commit()
-                    try:
-                        broadcaster.publish(amb.to_dict())
-                    except Exception:
-                        pass
-                    amb = db.query(AmbulanceModel).filter(AmbulanceModel.id == amb_id).first()
-                    await asyncio.sleep(tick_s)
-
-                # arrival: set final position and mark arrived, then free the unit
-                amb = db.query(AmbulanceModel).filter(AmbulanceModel.id == amb_id).first()
-                if amb:
-                    amb.lat = amb.target_lat
-                    amb.lon = amb.target_lon
-                    amb.status = 'arrived'
-                    amb.eta = None
-                    db.commit()
-                    broadcaster.publish(amb.to_dict())
-                    try:
-                        # When ambulance arrives, mark the incident as resolved so it
-                        # moves into the Doctor Closure workflow. Use the helper to
-                        # ensure closures are created and broadcasts happen.
-                        if amb.incident_id:
-                            update_incident_status(amb.incident_id, 'resolved')
-                            # Wait briefly to allow UIs to receive the 'arrived' event
-                            # and react before we free the unit. This reduces races
-                            # where the frontend never sees 'arrived' and cannot
-                            # auto-resolve or show the arrived state.
-                            try:
-                                await asyncio.sleep(2)
-                            except Exception:
-                                pass
-                            # After a short delay, free the ambulance so it returns
-                            # to the available pool. Clear assignment-related fields
-                            # and broadcast the updated ambulance state.
-                            amb_ref = db.query(AmbulanceModel).filter(AmbulanceModel.id == amb_id).first()
-                            if amb_ref:
-                                amb_ref.status = 'idle'
-                                amb_ref.incident_id = None
-                                amb_ref.target_lat = None
-                                amb_ref.target_lon = None
-                                amb_ref.route = None
-                                amb_ref.eta = None
-                                # keep started_at for history or clear if you prefer
-                                db.commit()
-                                try:
-                                    broadcaster.publish(amb_ref.to_dict())
-                                except Exception:
-                                    pass
-                    except Exception as e:
-                        print('Failed to mark incident resolved on arrival', e)
-
-            else:
-                # fallback linear movement
-                while amb and amb.status == 'enroute':
-                    dist_m = haversine_meters(amb.lat, amb.lon, amb.target_lat, amb.target_lon)
-                    if dist_m <= 5.0:
-                        amb.lat = amb.target_lat
-                        amb.lon = amb.target_lon
-                        amb.status = 'arrived'
-                        db.commit()
-                        payload = amb.to_dict()
-                        broadcaster.publish(payload)
+            broadcaster.publish(amb.to_dict())
+        except Exception:
+            pass
+    except Exception as e:
+        db.rollback()
+        print('Failed to mark unit arrived', e)
+    finally:
+        db.close()
 
-                        try:
-                            # When close enough, resolve the incident and free the unit
-                            if amb.incident_id:
-                                update_incident_status(amb.incident_id, 'resolved')
-                                # free ambulance
-                                amb_ref = db.query(AmbulanceModel).filter(AmbulanceModel.id == amb_id).first()
-                                if amb_ref:
-                                    amb_ref.status = 'idle'
-                                    amb_ref.incident_id = None
-                                    amb_ref.target_lat = None
-                                    amb_ref.target_lon = None
-                                    amb_ref.route = None
-                                    amb_ref.eta = None
-                                    db.commit()
-                                    try:
-                                        broadcaster.publish(amb_ref.to_dict())
-                                    except Exception:
-                                        pass
-                        except Exception:
-                            db.rollback()
-
-                        break
-
-                    speed_m_s = (amb.speed_kmh or 80.0) * 1000.0 / 3600.0
-                    move_m = speed_m_s * tick_s
-                    frac = min(1.0, move_m / max(1.0, dist_m))
-                    new_lat = amb.lat + (amb.target_lat - amb.lat) * frac
-                    new_lon = amb.lon + (amb.target_lon - amb.lon) * frac
-                    amb.lat = new_lat
-                    amb.lon = new_lon
-                    remaining_m = haversine_meters(amb.lat, amb.lon, amb.target_lat, amb.target_lon)
-                    eta_seconds = remaining_m / max(0.1, speed_m_s)
-                    amb.eta = datetime.utcnow() + timedelta(seconds=eta_seconds)
-                    db.commit()
-                    try:
-                        broadcaster.publish(amb.to_dict())
-                    except Exception:
-                        pass
-                    amb = db.query(AmbulanceModel).filter(AmbulanceModel.id == amb_id).first()
-                    await asyncio.sleep(tick_s)
+    if incident_id:
+        try:
+            update_incident_status(incident_id, 'resolved')
         except Exception as e:
-            print('simulate_ambulance loop error', e)
+            print('Failed to mark incident resolved on arrival', e)
+
+
+def release_unit(unit: dict):
+    """Fleet callback run shortly after arrival: free the unit so it returns to the pool.
+
+    The delay lets UIs see the 'arrived' state before the unit goes idle again.
+    """
+    db = SessionLocal()
+    try:
+        amb_ref = db.query(AmbulanceModel).filter(AmbulanceModel.id == unit['ambulance_id']).first()
+        if amb_ref and amb_ref.status == 'arrived' and amb_ref.incident_id:
+            amb_ref.status = 'idle'
+            amb_ref.incident_id = None
+            amb_ref.target_lat = None
+            amb_ref.target_lon = None
+            amb_ref.route = None
+            amb_ref.eta = None
+            # keep started_at for history or clear if you prefer
+            db.commit()
+            unit_index.upsert(amb_ref.to_dict())
+            try:
+                broadcaster.publish(amb_ref.to_dict())
+            except Exception:
+                pass
+            # incidents that found no free unit get the first chance at this one
+            auto_dispatcher.unit_released(amb_ref.to_dict()['unit_type'])
     except Exception as e:
-        print('simulate_ambulance error', e)
+        db.rollback()
+        print('Failed to release unit', e)
     finally:
         db.close()
 
 
+# live unit positions; the ambulances table and the position history are written behind on an interval
+position_store = PositionStore(persist_fleet_positions, append_position_history)
+
+# single task that moves every en-route unit (replaces one simulator thread per assignment)
+fleet = FleetEngine(persist_fleet_positions, broadcaster.publish, handle_unit_arrival, release_unit,
+                    index=unit_index, positions=position_store)
+
+
 @app.on_event("startup")
 async def startup_event():
     # ensure DB tables exist as a fallback
@@ -245,17 +196,36 @@ async def startup_event():
     try:
         db = SessionLocal()
         db_incidents = db.query(IncidentModel).order_by(IncidentModel.received_at.desc()).limit(500).all()
-        for inc in db_incidents:
-            incidents_store.append(inc.to_dict())
+        # oldest first so the hot store keeps the newest incidents at the head
+        for inc in reversed(db_incidents):
+            incidents_store.add(inc.to_dict())
         db.close()
         print(f"Loaded {len(db_incidents)} incidents from database")
     except Exception as e:
         print("Failed to load incidents from DB", e)
 
-    # start background mqtt listener
+    # SSE subscriptions live on this loop; publishes from other threads are marshalled onto it
     loop = asyncio.get_event_loop()
+    broadcaster.bind(loop)
+
+    # start background mqtt listener
     loop.create_task(start_mqtt_listener())
 
+    # load the road graph off the event loop so the first assignment does not pay for it
+    if router.mode in ('auto', 'local'):
+        loop.run_in_executor(None, lambda: router.graph)
+
+    # start the fleet movement engine and resume units that were en route before a restart
+    position_store.start()
+    fleet.start(loop)
+    try:
+        db = SessionLocal()
+        for amb in db.query(AmbulanceModel).filter(AmbulanceModel.status == 'enroute').all():
+            fleet.add_unit(amb.to_dict())
+        db.close()
+    except Exception as e:
+        print('Failed to resume en-route units', e)
+
     # ensure a pool of default units (50 ambulances + 50 fire units)
     try:
         db = SessionLocal()
@@ -293,52 +263,183 @@ async def startup_event():
         print('failed to seed default units', e)
         traceback.print_exc()
 
+    # index every unit's live position for nearest-unit queries
+    try:
+        db = SessionLocal()
+        for amb in db.query(AmbulanceModel).all():
+            unit_index.upsert(amb.to_dict())
+        db.close()
+        print(f"Indexed {len(unit_index)} units")
+    except Exception as e:
+        print('Failed to build unit index', e)
+
 
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
+    # drain buffered incidents to the DB before flushing their Kafka messages
+    try:
+        await stop_ingest()
+    except Exception as e:
+        print("Error draining ingest buffer on shutdown", e)
+
     # flush any outstanding Kafka messages
     try:
         flush_kafka()
     except Exception as e:
         print("Error flushing kafka on shutdown", e)
 
+    auto_dispatcher.stop()
+    position_store.stop()
+    matrix.shutdown()
+    if router.cache is not None:
+        router.cache.save()
+    try:
+        await async_engine.dispose()
+    except Exception as e:
+        print("Error closing async DB pool", e)
+
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get('/fleet/stats')
+def get_fleet_stats():
+    """Return fleet engine size, per-tick compute latency, bulk persist latency and unit index size."""
+    stats = fleet.stats()
+    stats['unit_index'] = unit_index.stats()
+    stats['positions'] = position_store.stats()
+    return stats
+
+
+@app.get('/dispatch/stats')
+def get_dispatch_stats():
+    """Return auto-dispatch counters and submit-to-moving / received-to-moving latency."""
+    return auto_dispatcher.stats()
+
+
+@app.get('/routing/stats')
+def get_routing_stats():
+    """Return the active router, road graph size and per-source route counts and latency."""
+    stats = router.stats()
+    stats['matrix'] = matrix.stats()
+    return stats
+
+
+@app.post('/routing/matrix')
+def routing_matrix(payload: MatrixRequest):
+    """Drive-time matrix in seconds from every origin (e.g. unit) to every destination (e.g. incident).
+
+    Returns durations[i][j] plus an `estimated` flag matrix for cells that fell back to a
+    straight-line estimate, and per destination the origin indexes ordered fastest first.
+    """
+    m, n = len(payload.origins), len(payload.destinations)
+    if m == 0 or n == 0:
+        return JSONResponse({'ok': False, 'detail': 'origins and destinations are required'}, status_code=400)
+    if m * n > MATRIX_MAX_CELLS:
+        return JSONResponse({'ok': False, 'detail': f'matrix too large (max {MATRIX_MAX_CELLS} cells)'}, status_code=400)
+    seconds, estimated = matrix.compute([(p.lat, p.lon) for p in payload.origins],
+                                        [(p.lat, p.lon) for p in payload.destinations])
+    return {
+        'origins': [p.id for p in payload.origins],
+        'destinations': [p.id for p in payload.destinations],
+        'durations': seconds.round(1).tolist(),
+        'estimated': estimated.tolist(),
+        'ranking': seconds.argsort(axis=0, kind='stable').T.tolist(),
+    }
+
+
+@app.get('/ingest/stats')
+def get_ingest_stats():
+    """Return MQTT ingest counters: buffer/queue depth, drops and per-stage latency."""
+    return ingest_stats()
+
+
 @app.get("/incidents")
-def get_incidents(status: Optional[str] = Query(None, description="Filter by status (new, accepted, declined, resolved)")):
-    """Return all incidents from database, optionally filtered by status."""
+async def get_incidents(status: Optional[str] = Query(None, description="Filter by status (new, accepted, declined, resolved)"),
+                        type: Optional[str] = Query(None, description="Filter by incident type (medical, fire, ...)"),
+                        severity: Optional[int] = Query(None, description="Filter by severity"),
+                        since: Optional[str] = Query(None, description="ISO time (UTC); only incidents received at or after it"),
+                        until: Optional[str] = Query(None, description="ISO time (UTC); only incidents received before it"),
+                        limit: int = Query(INCIDENTS_PAGE_SIZE, ge=1, le=INCIDENTS_MAX_PAGE_SIZE),
+                        cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+                        fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. id,type,status,received_at"),
+                        db: AsyncSession = Depends(get_async_db)):
+    """Return incidents newest first, one page at a time.
+
+    Pages are keyed on (received_at, id): the next page starts strictly after the last
+    row of this one, so page N costs the same index seek as page 1. When there is one,
+    the cursor for the next page is in the ``X-Next-Cursor`` response header. The body
+    stays a plain list for existing callers. ``fields`` selects only the listed columns.
+    Every filter has a (filter, received_at, id) index (migration 0009).
+    """
     try:
-        db = SessionLocal()
-        query = db.query(IncidentModel).order_by(IncidentModel.received_at.desc())
+        names = parse_fields(fields)
+        after = decode_cursor(cursor) if cursor else None
+        if after is not None and after[0] is None:
+            raise ValueError('invalid cursor')
+        since_dt = parse_time(since) if since else None
+        until_dt = parse_time(until) if until else None
+    except ValueError as e:
+        return JSONResponse({'ok': False, 'detail': str(e)}, status_code=400)
+    if names is not None:
+        names = list(dict.fromkeys(list(KEY_FIELDS) + names))
+    try:
+        if names is None:
+            stmt = select(IncidentModel)
+        else:
+            stmt = select(*[INCIDENT_FIELDS[n] for n in names])
         if status:
-            query = query.filter(IncidentModel.status == status)
-        db_incidents = query.limit(500).all()
-        result = [inc.to_dict() for inc in db_incidents]
-        db.close()
-        return result
-    except Exception as e:
+            stmt = stmt.where(IncidentModel.status == status)
+        if type:
+            stmt = stmt.where(IncidentModel.type == type)
+        if severity is not None:
+            stmt = stmt.where(IncidentModel.severity == severity)
+        if since_dt is not None:
+            stmt = stmt.where(IncidentModel.received_at >= since_dt)
+        if until_dt is not None:
+            stmt = stmt.where(IncidentModel.received_at < until_dt)
+        if after is not None:
+            stmt = stmt.where(tuple_(IncidentModel.received_at, IncidentModel.id) < tuple_(*after))
+        stmt = stmt.order_by(IncidentModel.received_at.desc(), IncidentModel.id.desc()).limit(limit + 1)
+        result = await db.execute(stmt)
+        rows = result.scalars().all() if names is None else result.all()
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers['X-Next-Cursor'] = encode_cursor(rows[-1].received_at, rows[-1].id)
+        if names is None:
+            result = [inc.to_dict() for inc in rows]
+        else:
+            result = [row_to_dict(r, names) for r in rows]
+        return JSONResponse(result, headers=headers)
+    except DB_UNAVAILABLE as e:
+        # query errors are bugs and surface as such; only an unreachable DB uses the store
         print("Failed to fetch incidents from DB, falling back to in-memory", e)
-        # fallback to in-memory store
-        if status:
-            return [inc for inc in incidents_store if inc.get('status') == status]
-        return incidents_store
+        # fallback to the in-memory store: same filters and page size, no further pages
+        items = incidents_store.list(status=status, type=type)
+        if severity is not None:
+            items = [i for i in items if i.get('severity') == severity]
+        if since_dt is not None or until_dt is not None:
+            lo = since_dt.isoformat() if since_dt else ''
+            hi = until_dt.isoformat() if until_dt else '\uffff'
+            items = [i for i in items if lo <= (i.get('received_at') or '') < hi]
+        items = items[:limit]
+        if names is not None:
+            items = [{n: i.get(n) for n in names} for i in items]
+        return items
 
 
 @app.get('/incidents/count')
-def get_incidents_count():
+async def get_incidents_count(db: AsyncSession = Depends(get_async_db)):
     """Return total number of incidents in the database (best-effort).
 
     Useful for dashboards that want to show overall counts instead of the
-    limited result set returned by /incidents (which is capped at 500).
+    single page returned by /incidents (500 rows by default).
     """
     try:
-        db = SessionLocal()
-        count = db.query(IncidentModel).count()
-        db.close()
+        count = (await db.execute(select(func.count()).select_from(IncidentModel))).scalar()
         return {'total': int(count)}
     except Exception as e:
         print('Failed to count incidents', e)
@@ -349,38 +450,140 @@ def get_incidents_count():
 
 
 @app.get('/ambulances')
-def get_ambulances(status: Optional[str] = Query(None, description="Filter ambulances by status (idle,enroute,arrived)") ):
+async def get_ambulances(status: Optional[str] = Query(None, description="Filter ambulances by status (idle,enroute,arrived)"),
+                         db: AsyncSession = Depends(get_async_db)):
     try:
-        db = SessionLocal()
-        query = db.query(AmbulanceModel).order_by(AmbulanceModel.unit_name.asc())
+        stmt = select(AmbulanceModel).order_by(AmbulanceModel.unit_name.asc())
         if status:
-            query = query.filter(AmbulanceModel.status == status)
-        rows = query.all()
-        result = [r.to_dict() for r in rows]
-        db.close()
-        return result
+            stmt = stmt.where(AmbulanceModel.status == status)
+        rows = (await db.execute(stmt)).scalars().all()
+        # positions come from the live store; the table lags by up to one flush interval
+        return [position_store.overlay(r.to_dict()) for r in rows]
     except Exception as e:
         print('Failed to fetch ambulances', e)
         traceback.print_exc()
         # fallback to scanning in-memory store for ambulance-like items
-        return [it for it in incidents_store if it.get('resource') == 'ambulance']
+        return [it for it in incidents_store.list() if it.get('resource') == 'ambulance']
+
+
+@app.get('/ambulances/{ambulance_id}/track')
+def get_ambulance_track(ambulance_id: str,
+                        start: Optional[str] = Query(None, description="ISO start time (UTC), default 8 hours ago"),
+                        end: Optional[str] = Query(None, description="ISO end time (UTC), default now"),
+                        max_points: int = Query(TRACK_MAX_POINTS, ge=3, le=5000, description="Points returned after downsampling"),
+                        bucket_s: Optional[float] = Query(None, gt=0, description="time_bucket width in seconds (default: span / (4 * max_points))")):
+    """Return a unit's trajectory between start and end, downsampled for replay.
+
+    Samples are averaged per time bucket in the database (time_bucket), so at most a few
+    times ``max_points`` rows leave Postgres. LTTB then reduces them to ``max_points``
+    while keeping turns and stops. Samples not yet flushed are appended from memory.
+    """
+    try:
+        end_dt = parse_time(end) if end else datetime.utcnow()
+        start_dt = parse_time(start) if start else end_dt - timedelta(hours=8)
+    except ValueError as e:
+        return JSONResponse({'ok': False, 'detail': str(e)}, status_code=400)
+    try:
+        span_s = max(1.0, (end_dt - start_dt).total_seconds())
+        bucket = bucket_s or max(1.0, span_s / (4 * max_points))
+        db = SessionLocal()
+        try:
+            rows = db.execute(text(
+                "SELECT time_bucket(:bucket, ts) AS bucket, avg(lat) AS lat, avg(lon) AS lon, count(*) AS n "
+                "FROM ambulance_positions WHERE ambulance_id = :id AND ts >= :start AND ts < :end "
+                "GROUP BY bucket ORDER BY bucket"),
+                {'bucket': timedelta(seconds=bucket), 'id': ambulance_id, 'start': start_dt, 'end': end_dt}).all()
+        finally:
+            db.close()
+        points = [{'ts': r.bucket, 'lat': float(r.lat), 'lon': float(r.lon), 'n': int(r.n)} for r in rows]
+        last_ts = points[-1]['ts'] if points else start_dt
+        points += [{'ts': s['ts'], 'lat': s['lat'], 'lon': s['lon'], 'n': 1}
+                   for s in position_store.pending_samples(ambulance_id, start_dt, end_dt) if s['ts'] > last_ts]
+        samples = sum(p['n'] for p in points)
+        points = downsample_track(points, max_points)
+        return {
+            'ambulance_id': ambulance_id,
+            'start': start_dt.isoformat(),
+            'end': end_dt.isoformat(),
+            'bucket_s': bucket,
+            'samples': samples,
+            'points': [{**p, 'ts': p['ts'].isoformat()} for p in points],
+            'geometry': {'type': 'LineString', 'coordinates': [[p['lon'], p['lat']] for p in points]},
+        }
+    except Exception as e:
+        print('Failed to fetch ambulance track', e)
+        traceback.print_exc()
+        return JSONResponse({'ok': False, 'error': str(e)}, status_code=500)
+
+
+@app.get('/units/nearest')
+def get_nearest_units(lat: float = Query(..., description="Latitude of the point of interest"),
+                      lon: float = Query(..., description="Longitude of the point of interest"),
+                      k: int = Query(5, ge=1, le=500, description="Maximum number of units to return"),
+                      unit_type: Optional[str] = Query(None, description="ambulance or fire"),
+                      status: Optional[str] = Query('idle', description="Unit status to match (empty for any)"),
+                      radius_m: Optional[float] = Query(None, description="Only units within this distance")):
+    """Closest units to a point from the in-memory spatial index, nearest first."""
+    hits = unit_index.nearest(lat, lon, k=k, unit_type=unit_type, status=status or None, max_m=radius_m)
+    return [dict(unit, distance_m=round(d, 1)) for unit, d in hits]
+
+
+def stream_snapshot():
+    """Current state for SSE clients that reconnect after the replay log moved past them."""
+    items = []
+    try:
+        db = SessionLocal()
+        items.extend(r.to_dict() for r in db.query(AmbulanceModel).all())
+        db.close()
+    except Exception as e:
+        print('Failed to load ambulances for SSE snapshot', e)
+    # oldest first so clients that prepend end up with the newest incident on top
+    items.extend(reversed(incidents_store.list(limit=500)))
+    return items
 
 
 @app.get('/stream/incidents')
-async def stream_incidents(request: Request):
-    """Server-Sent Events endpoint streaming incidents as JSON lines."""
+async def stream_incidents(request: Request,
+                           overflow: Optional[str] = Query(None, description="Slow-client policy: drop_oldest, disconnect or coalesce"),
+                           max_pending: Optional[int] = Query(None, ge=1, le=10000, description="Max events buffered for this client"),
+                           resource: Optional[str] = Query(None, description="Comma-separated resource kinds: incident, ambulance, closure"),
+                           type: Optional[str] = Query(None, description="Comma-separated incident types, e.g. fire,medical"),
+                           status: Optional[str] = Query(None, description="Comma-separated incident/unit statuses"),
+                           unit_type: Optional[str] = Query(None, description="Comma-separated unit types, e.g. ambulance,fire"),
+                           bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+                           last_event_id: Optional[str] = Query(None, description="Resume after this event id (same as the Last-Event-ID header)")):
+    """Server-Sent Events endpoint streaming incidents as JSON lines.
+
+    Optional filters are compiled into a predicate evaluated by the broadcaster, so
+    events a dashboard does not need are never queued or sent to it. Every frame
+    carries an id; a reconnecting EventSource sends it back as Last-Event-ID and gets
+    only the events it missed (or a state snapshot when the gap is too large).
+    """
+    resume_from = request.headers.get('last-event-id') or last_event_id
+    try:
+        predicate = compile_filter(resource=resource, type=type, status=status,
+                                   unit_type=unit_type, bbox=parse_bbox(bbox))
+    except ValueError as e:
+        return JSONResponse({'ok': False, 'detail': str(e)}, status_code=400)
 
     async def event_generator():
-        async for item in broadcaster.subscribe():
+        async for frame in broadcaster.subscribe(maxsize=max_pending, overflow=overflow, predicate=predicate,
+                                                 last_event_id=resume_from, snapshot=stream_snapshot):
             # if client disconnects, stop
             if await request.is_disconnected():
                 break
-            # yield the item as an SSE 'data' frame
-            yield f"data: {json.dumps(item)}\n\n"
+            # frames are serialized once by the broadcaster and shared by all clients
+            yield frame
 
     return StreamingResponse(event_generator(), media_type='text/event-stream')
 
 
+@app.get('/stream/stats')
+def get_stream_stats():
+    """Return per-subscriber pending events, lag and drop/coalesce counters."""
+    return broadcaster.stats()
+
+
 @app.post('/debug/publish')
 def debug_publish(payload: dict = Body(...)):
     """Publish a new incident to SSE subscribers and persist to database."""
@@ -416,6 +619,7 @@ def debug_publish(payload: dict = Body(...)):
             )
             db.add(inc)
             db.commit()
+            incident_lookup.note(inc.id, inc.received_at)
             # Return the persisted item with all fields
             item = inc.to_dict()
             db.close()
@@ -425,20 +629,35 @@ def debug_publish(payload: dict = Body(...)):
             print("DB write failed for debug publish", e)
 
         # Add to in-memory store for backward compatibility
-        incidents_store.insert(0, item)
+        incidents_store.add(item)
 
         broadcaster.publish(item)
+        auto_dispatcher.submit(item)
         return {"published": True, "payload": item}
     except Exception as e:
         return {"published": False, "error": str(e)}
 
 
+def auto_resolve_closure(incident_id: str) -> ClosureModel:
+    """Lightweight closure entry so the Doctor Closure UI lists incidents resolved on arrival."""
+    return ClosureModel(id=str(uuid.uuid4()), incident_id=incident_id, closed_by='system', summary='Auto-resolved on ambulance arrival', treatment_log=json.dumps([{'time': datetime.utcnow().isoformat(), 'action': 'auto-resolve', 'details': 'Ambulance reported arrival and incident auto-resolved.'}]))
+
+
+def status_fallback(incident_id: str, new_status: str):
+    """Apply a status change to the in-memory store only (incident not in DB, or DB down)."""
+    inc = incidents_store.update(incident_id, status=new_status, updated_at=datetime.utcnow().isoformat())
+    if inc:
+        broadcaster.publish(inc)
+        return {'ok': True, 'incident': inc}
+    return None
+
+
 def update_incident_status(incident_id: str, new_status: str):
     """Helper to update incident status in DB and in-memory store, then broadcast."""
     db = SessionLocal()
     try:
-        # Find incident in DB (may have multiple rows with same id due to composite key)
-        db_inc = db.query(IncidentModel).filter(IncidentModel.id == incident_id).order_by(IncidentModel.received_at.desc()).first()
+        # Find the latest version in DB (several rows may share an id due to the composite key)
+        db_inc = incident_lookup.latest(db, incident_id)
         if db_inc:
             db_inc.status = new_status
             db_inc.updated_at = datetime.utcnow()
@@ -447,23 +666,17 @@ def update_incident_status(incident_id: str, new_status: str):
             db.close()
             
             # Update in-memory store
-            for inc in incidents_store:
-                if inc.get('id') == incident_id:
-                    inc['status'] = new_status
-                    inc['updated_at'] = result['updated_at']
-                    break
-            
+            incidents_store.update(incident_id, status=new_status, updated_at=result['updated_at'])
+
             broadcaster.publish(result)
             # If the incident was resolved, create a Closure record so Doctor Closure UI
-            # will show it in the closures list. We create a lightweight closure entry
-            # with an auto-generated id and a short treatment_log indicating auto-resolve.
+            # will show it in the closures list.
             try:
                 if new_status == 'resolved':
                     db2 = SessionLocal()
                     existing = db2.query(ClosureModel).filter(ClosureModel.incident_id == incident_id).first()
                     if not existing:
-                        closure_id = str(uuid.uuid4())
-                        closure = ClosureModel(id=closure_id, incident_id=incident_id, closed_by='system', summary='Auto-resolved on ambulance arrival', treatment_log=json.dumps([{'time': datetime.utcnow().isoformat(), 'action': 'auto-resolve', 'details': 'Ambulance reported arrival and incident auto-resolved.'}]))
+                        closure = auto_resolve_closure(incident_id)
                         db2.add(closure)
                         db2.commit()
                         try:
@@ -479,28 +692,103 @@ def update_incident_status(incident_id: str, new_status: str):
         else:
             db.close()
             # Try in-memory store only
-            for inc in incidents_store:
-                if inc.get('id') == incident_id:
-                    inc['status'] = new_status
-                    inc['updated_at'] = datetime.utcnow().isoformat()
-                    broadcaster.publish(inc)
-                    return {'ok': True, 'incident': inc}
-            return None
+            return status_fallback(incident_id, new_status)
     except Exception as e:
         db.rollback()
         db.close()
         print(f"Failed to update incident status: {e}")
         # Try in-memory fallback
-        for inc in incidents_store:
-            if inc.get('id') == incident_id:
-                inc['status'] = new_status
-                inc['updated_at'] = datetime.utcnow().isoformat()
-                broadcaster.publish(inc)
-                return {'ok': True, 'incident': inc}
-        return None
+        return status_fallback(incident_id, new_status)
+
+
+async def update_incident_status_async(db: AsyncSession, incident_id: str, new_status: str):
+    """``update_incident_status`` on the request's AsyncSession, for the async endpoints."""
+    try:
+        db_inc = await incident_lookup.latest_async(db, incident_id)
+        if db_inc is None:
+            return status_fallback(incident_id, new_status)
+        db_inc.status = new_status
+        db_inc.updated_at = datetime.utcnow()
+        await db.commit()
+        result = db_inc.to_dict()
+    except Exception as e:
+        await db.rollback()
+        print(f"Failed to update incident status: {e}")
+        return status_fallback(incident_id, new_status)
+
+    incidents_store.update(incident_id, status=new_status, updated_at=result['updated_at'])
+    broadcaster.publish(result)
+    if new_status == 'resolved':
+        try:
+            existing = (await db.execute(select(ClosureModel.id).where(ClosureModel.incident_id == incident_id).limit(1))).first()
+            if existing is None:
+                closure = auto_resolve_closure(incident_id)
+                db.add(closure)
+                await db.commit()
+                broadcaster.publish({'resource': 'closure', 'closure': closure.to_dict()})
+        except Exception as e:
+            await db.rollback()
+            print('Failed to create closure record after resolve', e)
+    return {'ok': True, 'incident': result}
 
 
 
+def dispatch_unit(amb: AmbulanceModel, inc: IncidentModel) -> Route:
+    """Send ``amb`` to ``inc``: plan the route and set both rows' dispatch fields (caller commits)."""
+    speed_kmh = amb.speed_kmh or 80.0
+    # plan the route locally (road graph), falling back to Mapbox and then a straight line
+    planned = router.route(amb.lat, amb.lon, inc.lat, inc.lon)
+
+    # route geometry is prepared once here and reused by the fleet engine
+    route = Route.from_coords(planned['geometry']['coordinates'], start=(amb.lat, amb.lon))
+
+    eta_seconds = planned.get('duration')
+    if eta_seconds is None:
+        eta_seconds = route.eta_seconds(0.0, speed_kmh * 1000.0 / 3600.0)
+
+    amb.status = 'enroute'
+    amb.target_lat = float(inc.lat)
+    amb.target_lon = float(inc.lon)
+    amb.speed_kmh = float(speed_kmh)
+    amb.eta = datetime.utcnow() + timedelta(seconds=float(eta_seconds))
+    amb.route = json.dumps(planned['geometry']) if planned['source'] != 'straight' else None
+    amb.incident_id = str(inc.id)
+    amb.started_at = datetime.utcnow()
+
+    # mark incident as assigned
+    inc.status = 'assigned'
+    inc.assigned_to = amb.unit_name
+    inc.updated_at = datetime.utcnow()
+    return route
+
+
+def announce_dispatch(inc: IncidentModel, amb: AmbulanceModel, route: Route):
+    """After the dispatch commit: refresh in-memory state, broadcast, and start the unit moving."""
+    unit_index.upsert(amb.to_dict())
+
+    # update in-memory store
+    incidents_store.update(str(inc.id), status='assigned', assigned_to=amb.unit_name,
+                           updated_at=inc.updated_at.isoformat() if inc.updated_at else None)
+
+    # Broadcast both incident update and ambulance record
+    try:
+        broadcaster.publish(inc.to_dict())
+        broadcaster.publish(amb.to_dict())
+    except Exception:
+        pass
+
+    # hand the unit to the fleet engine (follows the route geometry if present)
+    try:
+        fleet.add_unit(amb.to_dict(), route=route)
+    except Exception as e:
+        print('failed to start unit movement', e)
+        traceback.print_exc()
+
+
+# automatic dispatch on ingest uses the same helpers as manual assignment
+auto_dispatcher.bind(dispatch_unit, announce_dispatch)
+
+
 @app.post('/incidents/{incident_id}/assign')
 def assign_incident(incident_id: str, payload: AssignRequest):
     """Assign an ambulance to an incident and start simulated movement toward the patient.
@@ -509,7 +797,7 @@ def assign_incident(incident_id: str, payload: AssignRequest):
     """
     try:
         db = SessionLocal()
-        inc = db.query(IncidentModel).filter(IncidentModel.id == incident_id).order_by(IncidentModel.received_at.desc()).first()
+        inc = incident_lookup.latest(db, incident_id)
         if not inc:
             db.close()
             return JSONResponse({'ok': False, 'detail': 'incident not found'}, status_code=404)
@@ -523,83 +811,18 @@ def assign_incident(incident_id: str, payload: AssignRequest):
         speed_kmh = payload.speed_kmh or 80.0
         unit_name = payload.unit_name or f"Unit {amb_id[:6]}"
 
-        # Try to compute route and ETA using Mapbox Directions API if token is present
-        mapbox_token = os.getenv('MAPBOX_TOKEN') or os.getenv('REACT_APP_MAPBOX_TOKEN')
-        route_json = None
-        eta = None
-        try:
-            if mapbox_token:
-                # Mapbox expects lon,lat pairs
-                coords = f"{start_lon},{start_lat};{inc.lon},{inc.lat}"
-                url = f"https://api.mapbox.com/directions/v5/mapbox/driving/{coords}?geometries=geojson&overview=full&access_token={mapbox_token}"
-                import requests
-                resp = requests.get(url, timeout=6)
-                if resp.status_code == 200:
-                    j = resp.json()
-                    if j.get('routes'):
-                        r = j['routes'][0]
-                        duration = r.get('duration')  # seconds
-                        if duration:
-                            eta = datetime.utcnow() + timedelta(seconds=float(duration))
-                        geom = r.get('geometry')
-                        if geom:
-                            # store geojson geometry as string
-                            route_json = json.dumps(geom)
-        except Exception as e:
-            print('Mapbox directions failed', e)
-
-        # fallback ETA if not computed
-        if eta is None:
-            dist_m = haversine_meters(start_lat, start_lon, inc.lat, inc.lon)
-            eta_seconds = dist_m / max(0.1, (speed_kmh * 1000.0 / 3600.0))
-            eta = datetime.utcnow() + timedelta(seconds=eta_seconds)
-
         amb = AmbulanceModel(
             id=amb_id,
             unit_name=unit_name,
-            status='enroute',
             lat=float(start_lat),
             lon=float(start_lon),
-            target_lat=float(inc.lat),
-            target_lon=float(inc.lon),
             speed_kmh=float(speed_kmh),
-            eta=eta,
-            route=route_json,
-            incident_id=str(inc.id),
-            started_at=datetime.utcnow()
         )
         db.add(amb)
-
-        # mark incident as assigned
-        inc.status = 'assigned'
-        inc.assigned_to = unit_name
-        inc.updated_at = datetime.utcnow()
+        route = dispatch_unit(amb, inc)
         db.commit()
 
-        # update in-memory store
-        for item in incidents_store:
-            if item.get('id') == incident_id:
-                item['status'] = 'assigned'
-                item['assigned_to'] = unit_name
-                item['updated_at'] = inc.updated_at.isoformat() if inc.updated_at else None
-                break
-
-        # Broadcast both incident update and ambulance record
-        try:
-            broadcaster.publish(inc.to_dict())
-            broadcaster.publish(amb.to_dict())
-        except Exception:
-            pass
-
-        # start background simulation (simulate following route if present)
-        try:
-            # run the coroutine in a separate thread to avoid event loop issues in sync path
-            t = threading.Thread(target=lambda: asyncio.run(simulate_ambulance(amb_id)), daemon=True)
-            t.start()
-        except Exception as e:
-            print('failed to start ambulance simulator thread', e)
-            traceback.print_exc()
-
+        announce_dispatch(inc, amb, route)
         db.close()
         return JSONResponse({'ok': True, 'incident': inc.to_dict(), 'ambulance': amb.to_dict()})
 
@@ -609,40 +832,130 @@ def assign_incident(incident_id: str, payload: AssignRequest):
         return JSONResponse({'ok': False, 'error': str(e)}, status_code=500)
 
 
+@app.post('/dispatch/batch')
+def dispatch_batch(payload: Optional[DispatchBatchRequest] = Body(None)):
+    """Dispatch idle pool units to every pending (new/accepted) incident in one optimal batch.
+
+    Incidents are matched to idle units of the matching unit type (fire units for fire
+    incidents, ambulances otherwise). The matching minimizes severity-weighted road
+    travel time (see app.dispatch.solve_dispatch). All assignments are committed in a
+    single transaction. With ``dry_run`` the plan is returned without dispatching.
+    ``assignments`` lists only committed dispatches. Units are read without locks and only
+    the planned units and incidents are locked (SKIP LOCKED) before committing. A planned
+    pair whose incident or unit was taken by another dispatcher meanwhile is dropped and
+    its incident listed in ``skipped``.
+    """
+    payload = payload or DispatchBatchRequest()
+    db = SessionLocal()
+    try:
+        pending = or_(IncidentModel.status.in_(PENDING_STATUSES), IncidentModel.status.is_(None))
+        pending_ids = db.query(IncidentModel.id).filter(pending).distinct()
+        # latest row per incident id (the hypertable may hold several)
+        latest = (db.query(IncidentModel).filter(IncidentModel.id.in_(pending_ids))
+                  .distinct(IncidentModel.id).order_by(IncidentModel.id, IncidentModel.received_at.desc()).all())
+        incidents = [inc for inc in latest if (inc.status or 'new') in PENDING_STATUSES]
+        # read the idle pool without locks: matrix, solve and routing take a while, and
+        # locking every idle unit for that long would starve auto-dispatch of units
+        units = db.query(AmbulanceModel).filter(AmbulanceModel.status == 'idle').all()
+
+        inc_rows = {str(inc.id): inc for inc in incidents}
+        unit_rows = {amb.id: amb for amb in units}
+        max_travel_s = payload.max_travel_s or DISPATCH_MAX_TRAVEL_S
+        plan = []
+        groups = []
+        for unit_type, incs, pool in split_by_unit_type([i.to_dict() for i in incidents], [u.to_dict() for u in units]):
+            if payload.unit_type and unit_type != payload.unit_type.lower():
+                continue
+            t0 = time.perf_counter()
+            seconds, estimated = matrix.compute([(u['lat'], u['lon']) for u in pool], [(i['lat'], i['lon']) for i in incs])
+            matrix_ms = (time.perf_counter() - t0) * 1000.0
+            result = solve_dispatch(seconds, [i['severity'] for i in incs], max_travel_s=max_travel_s)
+            for i, j in result['pairs']:
+                plan.append((incs[i], pool[j], float(seconds[j, i]), bool(estimated[j, i])))
+            groups.append({'unit_type': unit_type, 'incidents': len(incs), 'idle_units': len(pool),
+                           'assigned': len(result['pairs']), 'solver': result['solver'],
+                           'matrix_ms': round(matrix_ms, 1), 'solve_ms': result['solve_ms'],
+                           'objective': result['objective']})
+
+        def assignment(inc, unit, travel_s, est):
+            return {'incident_id': inc['id'], 'ambulance_id': unit['ambulance_id'], 'unit_name': unit['unit_name'],
+                    'unit_type': unit['unit_type'], 'severity': inc['severity'],
+                    'travel_s': round(travel_s, 1), 'estimated': est}
+
+        if payload.dry_run or not plan:
+            assigned_ids = {inc['id'] for inc, _, _, _ in plan}
+            return {'ok': True, 'dry_run': bool(payload.dry_run), 'groups': groups,
+                    'assignments': [assignment(*p) for p in plan],
+                    'unassigned_incidents': [i for i in inc_rows if i not in assigned_ids], 'skipped': []}
+
+        # lock only the planned incidents and units; any taken meanwhile (e.g. by
+        # auto-dispatch) are skipped, and populate_existing refreshes their status
+        locked = {(str(r.id), r.received_at) for r in db.query(IncidentModel)
+                  .filter(IncidentModel.id.in_([inc['id'] for inc, _, _, _ in plan]))
+                  .with_for_update(skip_locked=True).populate_existing().all()}
+        free_units = {a.id for a in db.query(AmbulanceModel)
+                      .filter(AmbulanceModel.id.in_([unit['ambulance_id'] for _, unit, _, _ in plan]))
+                      .with_for_update(skip_locked=True).populate_existing().all()
+                      if a.status == 'idle'}
+        dispatched = []
+        skipped = []
+        for inc, unit, travel_s, est in plan:
+            inc_row, amb_row = inc_rows[inc['id']], unit_rows[unit['ambulance_id']]
+            if ((str(inc_row.id), inc_row.received_at) not in locked or (inc_row.status or 'new') not in PENDING_STATUSES
+                    or amb_row.id not in free_units):
+                skipped.append(inc['id'])
+                continue
+            dispatched.append((inc_row, amb_row, dispatch_unit(amb_row, inc_row), assignment(inc, unit, travel_s, est)))
+        db.commit()
+        for inc_row, amb_row, route, _ in dispatched:
+            announce_dispatch(inc_row, amb_row, route)
+        # report what was committed, not what was planned
+        assigned_ids = {a['incident_id'] for _, _, _, a in dispatched}
+        return {'ok': True, 'dry_run': False, 'groups': groups,
+                'assignments': [a for _, _, _, a in dispatched],
+                'unassigned_incidents': [i for i in inc_rows if i not in assigned_ids and i not in skipped],
+                'skipped': skipped}
+    except Exception as e:
+        db.rollback()
+        print('batch dispatch error', e)
+        traceback.print_exc()
+        return JSONResponse({'ok': False, 'error': str(e)}, status_code=500)
+    finally:
+        db.close()
+
+
 @app.post('/incidents/{incident_id}/accept')
-def accept_incident(incident_id: str):
-    result = update_incident_status(incident_id, 'accepted')
+async def accept_incident(incident_id: str, db: AsyncSession = Depends(get_async_db)):
+    result = await update_incident_status_async(db, incident_id, 'accepted')
     if result:
         return JSONResponse(result)
     return JSONResponse({'ok': False, 'detail': 'incident not found'}, status_code=404)
 
 
 @app.post('/incidents/{incident_id}/decline')
-def decline_incident(incident_id: str):
-    result = update_incident_status(incident_id, 'declined')
+async def decline_incident(incident_id: str, db: AsyncSession = Depends(get_async_db)):
+    result = await update_incident_status_async(db, incident_id, 'declined')
     if result:
         return JSONResponse(result)
     return JSONResponse({'ok': False, 'detail': 'incident not found'}, status_code=404)
 
 
 @app.post('/incidents/{incident_id}/resolve')
-def resolve_incident(incident_id: str):
-    result = update_incident_status(incident_id, 'resolved')
+async def resolve_incident(incident_id: str, db: AsyncSession = Depends(get_async_db)):
+    result = await update_incident_status_async(db, incident_id, 'resolved')
     if result:
         return JSONResponse(result)
     return JSONResponse({'ok': False, 'detail': 'incident not found'}, status_code=404)
 
 
 @app.get('/cases/closures')
-def get_closed_cases():
+async def get_closed_cases(db: AsyncSession = Depends(get_async_db)):
     """Return incidents that are considered closed/terminated for doctor reporting."""
     try:
-        db = SessionLocal()
         # treat resolved/closed/confirmed as closed cases
-        rows = db.query(IncidentModel).filter(IncidentModel.status.in_(['resolved', 'closed', 'confirmed'])).order_by(IncidentModel.updated_at.desc()).all()
-        result = [r.to_dict() for r in rows]
-        db.close()
-        return result
+        stmt = (select(IncidentModel).where(IncidentModel.status.in_(['resolved', 'closed', 'confirmed']))
+                .order_by(IncidentModel.updated_at.desc()))
+        return [r.to_dict() for r in (await db.execute(stmt)).scalars().all()]
     except Exception as e:
         print('Failed to fetch closed cases', e)
         traceback.print_exc()
@@ -669,7 +982,7 @@ def export_case_report(case_id: str):
     and fills in a few placeholders with incident data. It's a lightweight demo export (SVG)."""
     try:
         db = SessionLocal()
-        inc = db.query(IncidentModel).filter(IncidentModel.id == case_id).order_by(IncidentModel.received_at.desc()).first()
+        inc = incident_lookup.latest(db, case_id)
         db.close()
         if not inc:
             return JSONResponse({'ok': False, 'detail': 'case not found'}, status_code=404)
@@ -720,7 +1033,7 @@ def export_incident_report(incident_id: str):
     """Generate a filled SVG report for an incident and return it as a downloadable file."""
     try:
         db = SessionLocal()
-        inc = db.query(IncidentModel).filter(IncidentModel.id == incident_id).order_by(IncidentModel.received_at.desc()).first()
+        inc = incident_lookup.latest(db, incident_id)
         db.close()
         if not inc:
             return JSONResponse({'ok': False, 'detail': 'incident not found'}, status_code=404)
@@ -764,12 +1077,10 @@ def export_incident_report(incident_id: str):
 
 
 @app.get('/cases/{case_id}')
-def get_case(case_id: str):
+async def get_case(case_id: str, db: AsyncSession = Depends(get_async_db)):
     """Return a single case/incident by id."""
     try:
-        db = SessionLocal()
-        inc = db.query(IncidentModel).filter(IncidentModel.id == case_id).order_by(IncidentModel.received_at.desc()).first()
-        db.close()
+        inc = await incident_lookup.latest_async(db, case_id)
         if not inc:
             return JSONResponse({'ok': False, 'detail': 'case not found'}, status_code=404)
         return inc.to_dict()
@@ -780,24 +1091,86 @@ def get_case(case_id: str):
 
 
 @app.get('/closure_reports')
-def get_closure_reports():
-    """Return all closure reports joined with their incident data."""
+def get_closure_reports(limit: Optional[int] = Query(None, ge=1, le=CLOSURE_REPORTS_MAX_PAGE_SIZE, description="Page size; omit to stream every report"),
+                        cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+                        format: str = Query('json', description="json (array) or ndjson (one report per line)")):
+    """Return closure reports joined with their incident data, newest first.
+
+    One query does the whole join. Each closure meets its latest incident version
+    through a LATERAL subquery, bounded below by ``incident_latest`` so only the chunk
+    holding that version is probed. Rows are serialized as they come off a server-side
+    cursor, so the archive is never held in memory. With ``limit`` the result is one
+    keyset page on (created_at, id). The next page's cursor is in ``X-Next-Cursor``.
+    """
+    if format not in ('json', 'ndjson'):
+        return JSONResponse({'ok': False, 'detail': 'format must be json or ndjson'}, status_code=400)
     try:
-        db = SessionLocal()
-        closures = db.query(ClosureModel).order_by(ClosureModel.created_at.desc()).all()
-        out = []
-        for c in closures:
-            # find the corresponding incident (latest by received_at)
-            inc = db.query(IncidentModel).filter(IncidentModel.id == c.incident_id).order_by(IncidentModel.received_at.desc()).first()
-            row = {'closure': c.to_dict(), 'incident': inc.to_dict() if inc else None}
-            out.append(row)
-        db.close()
-        return out
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return JSONResponse({'ok': False, 'detail': str(e)}, status_code=400)
+
+    latest = (select(IncidentModel)
+              .where(IncidentModel.id == ClosureModel.incident_id,
+                     IncidentModel.received_at >= func.coalesce(IncidentLatestModel.received_at,
+                                                                literal(datetime.min)))
+              .order_by(IncidentModel.received_at.desc())
+              .limit(1)
+              .lateral('latest_incident'))
+    incident = aliased(IncidentModel, latest)
+    stmt = (select(ClosureModel, incident)
+            .outerjoin(IncidentLatestModel, IncidentLatestModel.id == ClosureModel.incident_id)
+            .outerjoin(incident, true())
+            # DESC puts closures without created_at first, as before
+            .order_by(ClosureModel.created_at.desc(), ClosureModel.id.desc()))
+    if after is not None:
+        ts, closure_id = after
+        if ts is None:
+            stmt = stmt.where(or_(ClosureModel.created_at.isnot(None), ClosureModel.id < closure_id))
+        else:
+            stmt = stmt.where(tuple_(ClosureModel.created_at, ClosureModel.id) < tuple_(ts, closure_id))
+
+    db = SessionLocal()
+    headers = {}
+    try:
+        if limit is not None:
+            rows = db.execute(stmt.limit(limit + 1)).all()
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1][0]
+                headers['X-Next-Cursor'] = encode_cursor(last.created_at, last.id)
+        else:
+            rows = db.execute(stmt.execution_options(yield_per=CLOSURE_REPORTS_FETCH_SIZE))
     except Exception as e:
+        db.close()
         print('Failed to fetch closure reports', e)
         traceback.print_exc()
         return []
 
+    def generate():
+        ndjson = format == 'ndjson'
+        first = True
+        if not ndjson:
+            yield b'['
+        try:
+            for c, inc in rows:
+                body = json.dumps({'closure': c.to_dict(), 'incident': inc.to_dict() if inc else None}).encode()
+                if ndjson:
+                    yield body + b'\n'
+                else:
+                    yield body if first else b',' + body
+                first = False
+        except Exception as e:
+            # headers are gone already; end the document cleanly and log
+            print('Closure report stream failed', e)
+            traceback.print_exc()
+        finally:
+            db.close()
+        if not ndjson:
+            yield b']'
+
+    media_type = 'application/x-ndjson' if format == 'ndjson' else 'application/json'
+    return StreamingResponse(generate(), media_type=media_type, headers=headers)
+
 
 @app.get('/ml/risk')
 def get_ml_risk(grid_km: float = Query(3.0, description="half-extent of grid around city center in km"), cell_m: int = Query(500, description="grid cell size in meters"), hours_window: int = Query(168, description="hours window to weigh recent history (default 7 days)")):
@@ -828,8 +1201,7 @@ def get_ml_risk(grid_km: float = Query(3.0, description="half-extent of grid aro
         ]
 
         # compute meters->degrees approximations at center latitude
-        meters_per_deg_lat = 111111.0
-        meters_per_deg_lon = 111111.0 * math.cos(math.radians(center_lat))
+        meters_per_deg_lat, meters_per_deg_lon = meters_per_degree(center_lat)
 
         # grid side in meters (full width = 2 * grid_km km)
         half_side_m = grid_km * 1000.0
@@ -918,10 +1290,12 @@ def get_ml_risk(grid_km: float = Query(3.0, description="half-extent of grid aro
 
 
 @app.get('/stats/daily')
-def get_daily_stats(date: Optional[str] = Query(None, description="YYYY-MM-DD date in UTC, defaults to today")):
+async def get_daily_stats(date: Optional[str] = Query(None, description="YYYY-MM-DD date in UTC, defaults to today"),
+                          db: AsyncSession = Depends(get_async_db)):
     """Return simple daily statistics for incidents: total, counts by type, and hourly series (UTC).
 
-    Useful for rendering a small summary and chart on the Dashboard.
+    Useful for rendering a small summary and chart on the Dashboard. Served from the
+    hourly continuous aggregate (at most 24 buckets), not from the incident rows.
     """
     try:
         if date:
@@ -935,20 +1309,15 @@ def get_daily_stats(date: Optional[str] = Query(None, description="YYYY-MM-DD da
         start_dt = datetime.combine(day, datetime.min.time())
         end_dt = start_dt + timedelta(days=1)
 
-        db = SessionLocal()
-        rows = db.query(IncidentModel).filter(IncidentModel.received_at >= start_dt, IncidentModel.received_at < end_dt).all()
-        total = len(rows)
+        series = await incident_counts(db, start_dt, end_dt, STATS_BUCKETS['hour'])
+        total = 0
         by_type = {}
         hourly = [0] * 24
-        for r in rows:
-            t = (r.type or 'unknown').lower()
-            by_type[t] = by_type.get(t, 0) + 1
-            if r.received_at:
-                h = r.received_at.hour
-            else:
-                h = 0
-            hourly[h] += 1
-        db.close()
+        for b in series:
+            total += b['total']
+            hourly[b['bucket'].hour] += b['total']
+            for t, n in b['by_type'].items():
+                by_type[t] = by_type.get(t, 0) + n
         return {
             'date': day.isoformat(),
             'total': total,
@@ -961,6 +1330,60 @@ def get_daily_stats(date: Optional[str] = Query(None, description="YYYY-MM-DD da
         return {'date': None, 'total': 0, 'by_type': {}, 'hourly': [0]*24}
 
 
+@app.get('/stats/range')
+async def get_stats_range(start: Optional[str] = Query(None, alias='from', description="ISO start time (UTC), default 7 days before 'to'"),
+                          end: Optional[str] = Query(None, alias='to', description="ISO end time (UTC), default now"),
+                          bucket: str = Query('day', description="Bucket width: " + ', '.join(STATS_BUCKETS)),
+                          db: AsyncSession = Depends(get_async_db)):
+    """Incident counts per bucket between from and to, split by type, severity and status.
+
+    Reads the hourly continuous aggregate, so a month of day buckets is ~720 aggregate
+    rows whatever the incident volume. ``from`` is widened down and ``to`` up to whole
+    buckets, so every bucket reported is complete (the current one up to now); the
+    response echoes the widened edges. Empty buckets are included with zero counts so
+    the series can be charted directly.
+    """
+    if bucket not in STATS_BUCKETS:
+        return JSONResponse({'ok': False, 'detail': f"bucket must be one of {', '.join(STATS_BUCKETS)}"}, status_code=400)
+    try:
+        end_dt = parse_time(end) if end else datetime.utcnow()
+        start_dt = parse_time(start) if start else end_dt - timedelta(days=7)
+    except ValueError as e:
+        return JSONResponse({'ok': False, 'detail': str(e)}, status_code=400)
+    width = STATS_BUCKETS[bucket]
+    if end_dt <= start_dt:
+        return JSONResponse({'ok': False, 'detail': "'to' must be after 'from'"}, status_code=400)
+    # widen to whole buckets (naive UTC like received_at) so edge buckets are not partial
+    start_dt = bucket_start(start_dt, width)
+    aligned_end = bucket_start(end_dt, width)
+    end_dt = aligned_end + width if aligned_end < end_dt else aligned_end
+    if (end_dt - start_dt) / width > STATS_MAX_BUCKETS:
+        return JSONResponse({'ok': False, 'detail': f'range too large (max {STATS_MAX_BUCKETS} buckets)'}, status_code=400)
+    try:
+        t0 = time.perf_counter()
+        series = await incident_counts(db, start_dt, end_dt, width)
+        query_ms = (time.perf_counter() - t0) * 1000.0
+        by_bucket = {b['bucket']: b for b in series}
+        buckets = []
+        b = start_dt
+        while b < end_dt:
+            row = by_bucket.get(b) or {'bucket': b, 'total': 0, 'by_type': {}, 'by_severity': {}, 'by_status': {}}
+            buckets.append({**row, 'bucket': b.isoformat()})
+            b += width
+        return {
+            'from': start_dt.isoformat(),
+            'to': end_dt.isoformat(),
+            'bucket': bucket,
+            'total': sum(r['total'] for r in series),
+            'query_ms': round(query_ms, 2),
+            'buckets': buckets,
+        }
+    except Exception as e:
+        print('Failed to compute stats range', e)
+        traceback.print_exc()
+        return JSONResponse({'ok': False, 'error': str(e)}, status_code=500)
+
+
 @app.get('/ml/risk/centroids')
 def get_ml_risk_centroids(grid_km: float = Query(3.0, description="half-extent of grid around city center in km"), cell_m: int = Query(500, description="grid cell size in meters"), hours_window: int = Query(168, description="hours window to weigh recent history (default 7 days)")):
     """Return a lightweight GeoJSON FeatureCollection of POINT centroids for grid cells that have non-zero risk.
@@ -984,8 +1407,7 @@ def get_ml_risk_centroids(grid_km: float = Query(3.0, description="half-extent o
             {'lat': center_lat + 0.001, 'lon': center_lon - 0.002, 'ts': now - timedelta(hours=100)},
         ]
 
-        meters_per_deg_lat = 111111.0
-        meters_per_deg_lon = 111111.0 * math.cos(math.radians(center_lat))
+        meters_per_deg_lat, meters_per_deg_lon = meters_per_degree(center_lat)
         half_side_m = grid_km * 1000.0
         full_side_m = half_side_m * 2.0
         cells_per_side = max(1, int(full_side_m / float(cell_m)))
@@ -1071,8 +1493,7 @@ def get_ml_risk_clusters(grid_km: float = Query(3.0, description="half-extent of
             {'lat': center_lat + 0.001, 'lon': center_lon - 0.002, 'ts': now - timedelta(hours=100)},
         ]
 
-        meters_per_deg_lat = 111111.0
-        meters_per_deg_lon = 111111.0 * math.cos(math.radians(center_lat))
+        meters_per_deg_lat, meters_per_deg_lon = meters_per_degree(center_lat)
         half_side_m = grid_km * 1000.0
         full_side_m = half_side_m * 2.0
         cells_per_side = max(1, int(full_side_m / float(cell_m)))
@@ -0,0 +1,183 @@
+import os
+import threading
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .ch import ContractionHierarchy
+from .ingest import LatencyStats
+from .roadgraph import RoadGraph, ACCESS_SPEED_MPS
+from .geo import haversine_m, distance_matrix_m
+from .routing import router
+
+MATRIX_WORKERS = int(os.getenv("MATRIX_WORKERS", max(1, min(4, (os.cpu_count() or 2) - 1))))
+# below this many uncached origins the searches run in-process (pool IPC would dominate)
+MATRIX_PARALLEL_MIN_SOURCES = int(os.getenv("MATRIX_PARALLEL_MIN_SOURCES", 16))
+MATRIX_CACHE_SIZE = int(os.getenv("MATRIX_CACHE_SIZE", 200000))
+# straight-line estimate used when a point cannot be routed on the graph
+MATRIX_FALLBACK_SPEED_KMH = float(os.getenv("MATRIX_FALLBACK_SPEED_KMH", 40))
+MATRIX_MAX_CELLS = int(os.getenv("MATRIX_MAX_CELLS", 250000))
+
+# routing engine of a pool worker process, mapped/loaded once by _init_worker
+_worker_engine = None
+
+
+def _load_engine(ch_path: str, graph_path: str):
+    if ch_path and os.path.exists(ch_path):
+        return ContractionHierarchy.load(ch_path)
+    return RoadGraph.load(graph_path)
+
+
+def _init_worker(ch_path: str, graph_path: str):
+    global _worker_engine
+    _worker_engine = _load_engine(ch_path, graph_path)
+
+
+def _worker_table(sources: List[int], targets: List[int]) -> List[List[float]]:
+    return _worker_engine.table(sources, targets)
+
+
+class TravelTimeMatrix:
+    """M origins x N destinations drive-time matrix on the local routing engine.
+
+    Points are snapped to graph nodes and every (source node, target node) travel time
+    is kept in a bounded LRU, so repeated dispatch queries from the same stations or
+    parked units only search for pairs they have not seen. Missing rows are computed
+    with one-to-many searches (CH buckets or a Dijkstra per origin). Large batches are
+    split across a process pool whose workers map the same hierarchy file. Cells that
+    cannot be routed on the graph fall back to a straight-line estimate and are flagged.
+    """
+
+    def __init__(self, workers: int = MATRIX_WORKERS, cache_size: int = MATRIX_CACHE_SIZE):
+        self.workers = workers
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[int, int], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.hits = 0
+        self.misses = 0
+        self.fallback_cells = 0
+        self.latency = LatencyStats()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # created inside the running server: forking it could copy locks held by other
+                # threads (fleet, ingest, DB pool), so workers start clean and map the file themselves
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(router.ch_path, router.graph_path),
+                                                 mp_context=multiprocessing.get_context('forkserver'))
+            return self._pool
+
+    def _snap(self, engine, points: Sequence[Tuple[float, float]]):
+        nodes = [engine.nearest_node(lat, lon) if engine is not None else None for lat, lon in points]
+        access_s = np.zeros(len(points))
+        snapped = [i for i, node in enumerate(nodes) if node is not None]
+        if snapped:
+            pts = np.asarray(points, dtype=np.float64)[snapped]
+            idx = np.asarray([nodes[i] for i in snapped])
+            access_s[snapped] = haversine_m(pts[:, 0], pts[:, 1], engine.lat[idx], engine.lon[idx]) / ACCESS_SPEED_MPS
+        return nodes, access_s
+
+    def _tables(self, engine, sources: List[int], targets: List[int]) -> List[List[float]]:
+        if self.workers <= 1 or len(sources) < MATRIX_PARALLEL_MIN_SOURCES:
+            return engine.table(sources, targets)
+        try:
+            pool = self._get_pool()
+            size = -(-len(sources) // self.workers)
+            chunks = [sources[i:i + size] for i in range(0, len(sources), size)]
+            rows = []
+            for part in pool.map(_worker_table, chunks, [targets] * len(chunks)):
+                rows.extend(part)
+            return rows
+        except Exception as e:
+            print('Matrix pool failed, computing in-process', e)
+            return engine.table(sources, targets)
+
+    def compute(self, origins: Sequence[Tuple[float, float]], destinations: Sequence[Tuple[float, float]]):
+        """Return (seconds, estimated) arrays of shape (M, N).
+
+        ``estimated[i, j]`` is True where no road route was found and the value is a
+        straight-line estimate at ``MATRIX_FALLBACK_SPEED_KMH``.
+        """
+        t0 = time.perf_counter()
+        m, n = len(origins), len(destinations)
+        engine = router.graph if router.mode in ('auto', 'local') else None
+        src_nodes, src_access = self._snap(engine, origins)
+        dst_nodes, dst_access = self._snap(engine, destinations)
+
+        uniq_src = sorted({s for s in src_nodes if s is not None})
+        uniq_dst = sorted({t for t in dst_nodes if t is not None})
+        known: Dict[Tuple[int, int], float] = {}
+        missing_src = []
+        with self._lock:
+            for s in uniq_src:
+                row_missing = False
+                for t in uniq_dst:
+                    v = self._cache.get((s, t))
+                    if v is None:
+                        row_missing = True
+                    else:
+                        self._cache.move_to_end((s, t))
+                        known[(s, t)] = v
+                if row_missing:
+                    missing_src.append(s)
+            self.hits += len(known)
+        if missing_src and uniq_dst:
+            rows = self._tables(engine, missing_src, uniq_dst)
+            with self._lock:
+                for s, row in zip(missing_src, rows):
+                    for t, v in zip(uniq_dst, row):
+                        if (s, t) not in known:
+                            self.misses += 1
+                        known[(s, t)] = v
+                        self._cache[(s, t)] = v
+                        self._cache.move_to_end((s, t))
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        seconds = np.full((m, n), np.inf)
+        for i, s in enumerate(src_nodes):
+            if s is None:
+                continue
+            for j, t in enumerate(dst_nodes):
+                if t is not None:
+                    seconds[i, j] = known.get((s, t), np.inf)
+        seconds += src_access[:, None] + dst_access[None, :]
+
+        estimated = ~np.isfinite(seconds)
+        if estimated.any():
+            o = np.asarray(origins, dtype=np.float64).reshape(m, 2)
+            d = np.asarray(destinations, dtype=np.float64).reshape(n, 2)
+            straight = distance_matrix_m(o[:, 0], o[:, 1], d[:, 0], d[:, 1])
+            seconds = np.where(estimated, straight / (MATRIX_FALLBACK_SPEED_KMH / 3.6), seconds)
+            self.fallback_cells += int(estimated.sum())
+        self.latency.observe((time.perf_counter() - t0) * 1000.0)
+        return seconds, estimated
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'workers': self.workers,
+            'pool_started': self._pool is not None,
+            'cache_size': len(self._cache),
+            'cache_capacity': self.cache_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else None,
+            'fallback_cells': self.fallback_cells,
+            'latency': self.latency.snapshot(),
+        }
+
+
+matrix = TravelTimeMatrix()
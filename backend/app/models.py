@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer, DateTime, Text, ForeignKey
+from sqlalchemy import Column, String, Float, Integer, DateTime, Text, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -30,6 +30,14 @@ class Incident(Base):
     contact = Column(String, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # keyset pagination for /incidents walks (received_at, id) newest first, per filter (migration 0009)
+    __table_args__ = (
+        Index('ix_incidents_received_at_id', 'received_at', 'id'),
+        Index('ix_incidents_status_received_at_id', 'status', 'received_at', 'id'),
+        Index('ix_incidents_type_received_at_id', 'type', 'received_at', 'id'),
+        Index('ix_incidents_severity_received_at_id', 'severity', 'received_at', 'id'),
+    )
+
     def to_dict(self):
         """Convert model to dictionary for JSON serialization."""
         return {
@@ -104,6 +112,11 @@ class Closure(Base):
     recommendations = Column(Text, nullable=True)
     billing_ref = Column(String, nullable=True)
 
+    # /closure_reports pages on (created_at, id) newest first (migration 0011)
+    __table_args__ = (
+        Index('ix_closures_created_at_id', 'created_at', 'id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -116,3 +129,30 @@ class Closure(Base):
             'recommendations': self.recommendations,
             'billing_ref': self.billing_ref,
         }
+
+
+class IncidentLatest(Base):
+    __tablename__ = 'incident_latest'
+
+    # id -> received_at of the newest `incidents` row with that id; maintained by an
+    # insert/delete trigger on incidents (migration 0010)
+    id = Column(String, primary_key=True)
+    received_at = Column(DateTime, nullable=False)
+
+
+class AmbulancePosition(Base):
+    __tablename__ = 'ambulance_positions'
+
+    # hypertable on ts; one row per unit per fleet sample
+    ambulance_id = Column(String, primary_key=True)
+    ts = Column(DateTime, primary_key=True, nullable=False)
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+
+    def to_dict(self):
+        return {
+            'ambulance_id': self.ambulance_id,
+            'ts': self.ts.isoformat() if self.ts else None,
+            'lat': self.lat,
+            'lon': self.lon,
+        }
@@ -0,0 +1,71 @@
+import os
+import base64
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from .models import Incident as IncidentModel
+
+INCIDENTS_PAGE_SIZE = 500
+INCIDENTS_MAX_PAGE_SIZE = 2000
+# columns /incidents?fields= may select; keys match Incident.to_dict()
+INCIDENT_FIELDS = {c: getattr(IncidentModel, c) for c in (
+    'id', 'received_at', 'type', 'lat', 'lon', 'severity', 'status', 'notes',
+    'patient_name', 'patient_age', 'patient_contact', 'sensor_id', 'sensor_type',
+    'address', 'contact', 'updated_at')}
+# always selected: the cursor is built from them
+KEY_FIELDS = ('received_at', 'id')
+CLOSURE_REPORTS_MAX_PAGE_SIZE = 5000
+# rows per server-side cursor fetch when /closure_reports streams the whole archive
+CLOSURE_REPORTS_FETCH_SIZE = int(os.getenv("CLOSURE_REPORTS_FETCH_SIZE", 500))
+
+
+def encode_cursor(ts: Optional[datetime], key: str) -> str:
+    """Opaque cursor for the position just after (ts, key) in newest-first order."""
+    raw = f"{ts.isoformat() if ts is not None else ''}|{key}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], str]:
+    """Inverse of ``encode_cursor``; raises ValueError on anything else."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, key = raw.split('|', 1)
+        return (datetime.fromisoformat(ts) if ts else None), key
+    except Exception:
+        raise ValueError('invalid cursor')
+
+
+def parse_time(value: str) -> datetime:
+    """Parse an ISO time into naive UTC, the form ``received_at`` is stored in.
+
+    Times with an offset are converted to UTC; naive times are taken as UTC already.
+    Raises ValueError on malformed input.
+    """
+    ts = datetime.fromisoformat(value)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse ``fields=id,type,...`` into column names (None = all); raises ValueError on unknown names."""
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in names if f not in INCIDENT_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def row_to_dict(row, names: List[str]) -> Dict[str, Any]:
+    """Serialize a projected row like Incident.to_dict() does for the same keys."""
+    out = {}
+    for name in names:
+        value = getattr(row, name)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif name == 'status':
+            value = value or 'new'
+        out[name] = value
+    return out
@@ -0,0 +1,258 @@
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional
+
+import numpy as np
+
+from .geo import meters_per_degree
+from .ingest import LatencyStats
+
+# how often live positions are written back to `ambulances` and samples appended to history
+POSITION_FLUSH_INTERVAL_S = float(os.getenv("POSITION_FLUSH_INTERVAL_S", 5.0))
+# keep one history sample per unit at most this often (0 = every fleet tick)
+POSITION_SAMPLE_S = float(os.getenv("POSITION_SAMPLE_S", 0))
+# bound on buffered history samples; the oldest are dropped if the DB falls behind
+POSITION_BUFFER_SIZE = int(os.getenv("POSITION_BUFFER_SIZE", 200000))
+POSITION_INSERT_BATCH = int(os.getenv("POSITION_INSERT_BATCH", 5000))
+TRACK_MAX_POINTS = int(os.getenv("TRACK_MAX_POINTS", 500))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices of the kept points.
+
+    The first and last points are always kept. The points in between are split into
+    ``n_out - 2`` buckets. From each bucket the point kept is the one forming the
+    largest triangle with the previously kept point and the average of the next bucket.
+    Turns and stops survive while straight stretches collapse. For trajectories, pass
+    planar x/y so "largest" is measured in space.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    every = (n - 2) / (n_out - 2)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        # average of the next bucket (just the last point for the final bucket)
+        nlo, nhi = hi, min(int((i + 2) * every) + 1, n)
+        cx = x[nlo:nhi].mean()
+        cy = y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    keep[-1] = n - 1
+    return keep
+
+
+def downsample_track(points: List[Dict[str, Any]], max_points: int) -> List[Dict[str, Any]]:
+    """LTTB over a time-ordered list of {'ts', 'lat', 'lon', ...} points, measured in meters."""
+    if len(points) <= max_points:
+        return points
+    lat = np.asarray([p['lat'] for p in points], dtype=np.float64)
+    lon = np.asarray([p['lon'] for p in points], dtype=np.float64)
+    my, mx = meters_per_degree(float(lat.mean()))
+    keep = lttb(lon * mx, lat * my, max_points)
+    return [points[i] for i in keep]
+
+
+class PositionStore:
+    """In-memory live unit positions with write-behind to the DB and batched history.
+
+    The fleet engine calls ``record`` every tick. That only updates a dict and appends
+    history samples to a bounded deque. A flush thread then wakes every
+    ``POSITION_FLUSH_INTERVAL_S`` and does two things:
+
+    - writes the latest position/ETA of each unit that moved since the last flush back
+      to ``ambulances``, as one bulk UPDATE through ``persist``; ``persist`` must skip
+      units that are no longer en route
+    - appends the buffered samples to the ``ambulance_positions`` hypertable in
+      multi-row INSERTs through ``append_history``
+
+    The store is the source of truth for where a unit is right now. The ``ambulances``
+    row lags it by at most one flush interval. Rows and samples of a failed flush are
+    put back and retried on the next one.
+    """
+
+    def __init__(self,
+                 persist: Callable[[List[Dict[str, Any]]], None],
+                 append_history: Callable[[List[Dict[str, Any]]], None],
+                 flush_interval_s: float = POSITION_FLUSH_INTERVAL_S,
+                 sample_s: float = POSITION_SAMPLE_S,
+                 max_buffer: int = POSITION_BUFFER_SIZE,
+                 insert_batch: int = POSITION_INSERT_BATCH):
+        self.persist = persist
+        self.append_history = append_history
+        self.flush_interval_s = max(0.05, flush_interval_s)
+        self.sample_s = sample_s
+        self.insert_batch = max(1, insert_batch)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._live: Dict[str, Dict[str, Any]] = {}
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._last_sample: Dict[str, datetime] = {}
+        # bumped by arrived(): tick rows taken before an arrival must not reach the DB
+        self._gen: Dict[str, int] = {}
+        self._samples = deque(maxlen=max(1, max_buffer))
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.recorded = 0
+        self.dropped_samples = 0
+        self.flushes = 0
+        self.rows_updated = 0
+        self.samples_written = 0
+        self.failed_flushes = 0
+        self.flush_latency = LatencyStats()
+
+    # -- producers (fleet tick) -----------------------------------------------------
+    def record(self, rows: List[Dict[str, Any]], ts: Optional[datetime] = None):
+        """Take one tick of {'id', 'lat', 'lon', 'eta'} rows as the units' live positions."""
+        ts = ts or datetime.utcnow()
+        min_gap = timedelta(seconds=self.sample_s)
+        with self._lock:
+            for row in rows:
+                uid = row['id']
+                self._live[uid] = {'lat': row['lat'], 'lon': row['lon'], 'eta': row.get('eta'), 'ts': ts}
+                self._dirty[uid] = row
+                last = self._last_sample.get(uid)
+                if last is None or ts - last >= min_gap:
+                    self._append_sample(uid, row['lat'], row['lon'], ts)
+            self.recorded += len(rows)
+
+    def arrived(self, unit_id: str, lat: float, lon: float, ts: Optional[datetime] = None):
+        """Final sample for a unit that reached its target; its DB row is written by the arrival handler."""
+        ts = ts or datetime.utcnow()
+        with self._lock:
+            self._live[unit_id] = {'lat': lat, 'lon': lon, 'eta': None, 'ts': ts}
+            # a pending tick update would overwrite the arrival position written by the handler,
+            # and rows already taken by a running flush are made stale
+            self._dirty.pop(unit_id, None)
+            self._gen[unit_id] = self._gen.get(unit_id, 0) + 1
+            self._append_sample(unit_id, lat, lon, ts)
+
+    def _append_sample(self, uid, lat, lon, ts):
+        if len(self._samples) == self._samples.maxlen:
+            self.dropped_samples += 1
+        self._samples.append({'ambulance_id': uid, 'ts': ts, 'lat': lat, 'lon': lon})
+        self._last_sample[uid] = ts
+
+    # -- readers ------------------------------------------------------------------
+    def get(self, unit_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            live = self._live.get(unit_id)
+            return dict(live) if live is not None else None
+
+    def overlay(self, unit: Dict[str, Any]) -> Dict[str, Any]:
+        """Return an Ambulance.to_dict() payload with lat/lon/eta from the live store."""
+        live = self.get(unit.get('ambulance_id'))
+        if live is None:
+            return unit
+        eta = live['eta']
+        return {**unit, 'lat': live['lat'], 'lon': live['lon'],
+                'eta': eta.isoformat() if isinstance(eta, datetime) else unit.get('eta')}
+
+    def pending_samples(self, unit_id: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """Buffered (not yet written) samples for one unit in [start, end)."""
+        with self._lock:
+            return [dict(s) for s in self._samples if s['ambulance_id'] == unit_id and start <= s['ts'] < end]
+
+    # -- flushing -------------------------------------------------------------------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='position-store', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the flush thread after a final flush."""
+        if not self._running:
+            return
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while self._running:
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+    def _current(self, dirty):
+        # rows whose unit has not arrived since they were taken; caller holds the lock
+        return [row for row, gen in dirty if self._gen.get(row['id'], 0) == gen]
+
+    def _requeue(self, dirty, samples):
+        """Put back what a failed flush did not write; newer tick rows win over old ones."""
+        with self._lock:
+            for row in self._current(dirty):
+                self._dirty.setdefault(row['id'], row)
+            if samples:
+                merged = samples + list(self._samples)
+                overflow = len(merged) - self._samples.maxlen
+                if overflow > 0:
+                    self.dropped_samples += overflow
+                    merged = merged[overflow:]
+                self._samples.clear()
+                self._samples.extend(merged)
+
+    def flush(self):
+        with self._lock:
+            dirty = [(row, self._gen.get(uid, 0)) for uid, row in self._dirty.items()]
+            self._dirty = {}
+            samples = list(self._samples)
+            self._samples.clear()
+        if not dirty and not samples:
+            return
+        t0 = time.perf_counter()
+        written = 0
+        try:
+            if dirty:
+                # drop rows of units that arrived after the snapshot; an arrival landing
+                # after this check is left alone by persist's status = 'enroute' guard
+                with self._lock:
+                    rows = self._current(dirty)
+                if rows:
+                    self.persist(rows)
+                    self.rows_updated += len(rows)
+                dirty = []
+            for written in range(0, len(samples), self.insert_batch):
+                chunk = samples[written:written + self.insert_batch]
+                self.append_history(chunk)
+                self.samples_written += len(chunk)
+            written = len(samples)
+        except Exception as e:
+            # the DB keeps the previous flush's positions until a retry succeeds
+            self.failed_flushes += 1
+            print('Position flush failed', e)
+            self._requeue(dirty, samples[written:])
+        self.flushes += 1
+        self.flush_latency.observe((time.perf_counter() - t0) * 1000.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            live = len(self._live)
+            dirty = len(self._dirty)
+            buffered = len(self._samples)
+        return {
+            'live_units': live,
+            'dirty_units': dirty,
+            'buffered_samples': buffered,
+            'flush_interval_s': self.flush_interval_s,
+            'sample_s': self.sample_s,
+            'recorded': self.recorded,
+            'dropped_samples': self.dropped_samples,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'rows_updated': self.rows_updated,
+            'samples_written': self.samples_written,
+            'flush_latency': self.flush_latency.snapshot(),
+        }
@@ -0,0 +1,247 @@
+import os
+import math
+import heapq
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .geo import haversine_m, meters_per_degree
+
+# grid cell size used to snap coordinates to the nearest graph node (~550 m north-south)
+SNAP_CELL_DEG = 0.005
+# points farther than this from any road node are not routed on the graph
+ROAD_GRAPH_SNAP_MAX_M = float(os.getenv("ROAD_GRAPH_SNAP_MAX_M", 1000))
+# speed assumed on the off-graph legs between a coordinate and its snapped node
+ACCESS_SPEED_MPS = 30 / 3.6
+
+
+class NodeGrid:
+    """Uniform lat/lon grid over graph nodes for nearest-node snapping.
+
+    Stored as three flat arrays so it can be saved next to a graph and memory-mapped:
+    sorted cell keys, an index pointer per key and the node ids grouped by cell.
+    """
+
+    def __init__(self, keys, ptr, nodes, lat, lon):
+        self.keys = keys
+        self.ptr = ptr
+        self.nodes = nodes
+        self.lat = lat
+        self.lon = lon
+
+    @staticmethod
+    def cell_key(lat, lon):
+        ci = np.floor(np.asarray(lat) / SNAP_CELL_DEG).astype(np.int64)
+        cj = np.floor(np.asarray(lon) / SNAP_CELL_DEG).astype(np.int64)
+        return ci * (1 << 32) + (cj + (1 << 31))
+
+    @classmethod
+    def build(cls, lat, lon, nodes) -> 'NodeGrid':
+        nodes = np.asarray(nodes, dtype=np.int32)
+        keys = cls.cell_key(lat[nodes], lon[nodes])
+        order = np.argsort(keys, kind='stable')
+        keys, nodes = keys[order], nodes[order]
+        uniq, starts = np.unique(keys, return_index=True)
+        ptr = np.concatenate([starts, [keys.size]]).astype(np.int64)
+        return cls(uniq.astype(np.int64), ptr, nodes, lat, lon)
+
+    def __len__(self) -> int:
+        return int(self.keys.size)
+
+    def _cell_nodes(self, key: int):
+        i = int(np.searchsorted(self.keys, key))
+        if i < self.keys.size and int(self.keys[i]) == key:
+            return self.nodes[int(self.ptr[i]):int(self.ptr[i + 1])]
+        return None
+
+    def nearest(self, lat: float, lon: float, max_m: float = ROAD_GRAPH_SNAP_MAX_M) -> Optional[int]:
+        """Index of the node nearest to (lat, lon), or None if none within ``max_m``."""
+        center = int(self.cell_key(lat, lon))
+        m_lat, m_lon = meters_per_degree(lat)
+        cell_m = SNAP_CELL_DEG * max(0.2 * m_lat, m_lon)
+        max_ring = int(max_m / cell_m) + 1
+        best, best_d = None, float('inf')
+        for ring in range(max_ring + 1):
+            cands = []
+            for di in range(-ring, ring + 1):
+                for dj in range(-ring, ring + 1):
+                    if max(abs(di), abs(dj)) == ring:
+                        nodes = self._cell_nodes(center + di * (1 << 32) + dj)
+                        if nodes is not None:
+                            cands.append(nodes)
+            if cands:
+                nodes = np.concatenate(cands)
+                d = haversine_m(lat, lon, self.lat[nodes], self.lon[nodes])
+                i = int(np.argmin(d))
+                if d[i] < best_d:
+                    best, best_d = int(nodes[i]), float(d[i])
+            # anything in the next ring is at least ``ring`` full cells away
+            if best is not None and best_d <= ring * cell_m:
+                break
+        if best is None or best_d > max_m:
+            return None
+        return best
+
+
+class PathFinder(ABC):
+    """Shared coordinate-level routing on top of ``nearest_node`` and ``shortest_path``.
+
+    Subclasses provide ``lat``/``lon`` node arrays, a ``grid`` and ``shortest_path(src,
+    dst)`` returning (node path, travel seconds) or None.
+    """
+
+    lat: np.ndarray
+    lon: np.ndarray
+    grid: NodeGrid
+
+    def nearest_node(self, lat: float, lon: float, max_m: float = ROAD_GRAPH_SNAP_MAX_M) -> Optional[int]:
+        return self.grid.nearest(lat, lon, max_m)
+
+    @abstractmethod
+    def shortest_path(self, src: int, dst: int) -> Optional[Tuple[List[int], float]]:
+        """(node path, travel seconds) from node ``src`` to node ``dst``, or None if unreachable."""
+
+    def path_length_m(self, path: List[int]) -> float:
+        # edges are straight segments between OSM nodes, so a path's length is its geometry's
+        if len(path) < 2:
+            return 0.0
+        idx = np.asarray(path)
+        return float(haversine_m(self.lat[idx[:-1]], self.lon[idx[:-1]], self.lat[idx[1:]], self.lon[idx[1:]]).sum())
+
+    def route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float,
+              access_speed_mps: float = ACCESS_SPEED_MPS) -> Optional[Dict[str, Any]]:
+        """Shortest-time route between two coordinates.
+
+        Returns {'geometry': GeoJSON LineString, 'duration': s, 'distance': m}, or None
+        when either end cannot be snapped or the nodes are not connected. The geometry
+        starts and ends at the exact coordinates. The legs to and from the snapped nodes
+        are driven at ``access_speed_mps``.
+        """
+        src = self.nearest_node(start_lat, start_lon)
+        dst = self.nearest_node(end_lat, end_lon)
+        if src is None or dst is None:
+            return None
+        found = self.shortest_path(src, dst)
+        if found is None:
+            return None
+        path, seconds = found
+        lats = np.concatenate([[start_lat], self.lat[path], [end_lat]])
+        lons = np.concatenate([[start_lon], self.lon[path], [end_lon]])
+        access_m = float(haversine_m(start_lat, start_lon, lats[1], lons[1]) +
+                         haversine_m(end_lat, end_lon, lats[-2], lons[-2]))
+        return {
+            'geometry': {'type': 'LineString', 'coordinates': np.column_stack([lons, lats]).tolist()},
+            'duration': seconds + access_m / access_speed_mps,
+            'distance': self.path_length_m(path) + access_m,
+        }
+
+
+class RoadGraph(PathFinder):
+    """Road network in CSR form with A* shortest-time queries.
+
+    Built by ``scripts/build_road_graph.py`` from an OSM extract. The outgoing edges of
+    node ``u`` are ``indices[indptr[u]:indptr[u + 1]]``, with travel times in ``time_s``
+    and lengths in ``length_m``. The A* heuristic is the straight-line distance divided
+    by the fastest speed in the graph, so it never overestimates. Node coordinates are
+    also projected to a local plane so the heuristic costs one ``hypot`` per node.
+    Coordinates are snapped to nodes through a ``NodeGrid``.
+    """
+
+    def __init__(self, lat, lon, indptr, indices, time_s, length_m, max_speed_mps: float):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.time_s = np.asarray(time_s, dtype=np.float32)
+        self.length_m = np.asarray(length_m, dtype=np.float32)
+        self.max_speed_mps = float(max_speed_mps)
+
+        # plain Python adjacency lists are much faster than NumPy scalars inside the search loop
+        self._indptr = self.indptr.tolist()
+        self._indices = self.indices.tolist()
+        cost = self.time_s.tolist()
+        self._adj = [list(zip(self._indices[a:b], cost[a:b]))
+                     for a, b in zip(self._indptr[:-1], self._indptr[1:])]
+        lat0 = float(self.lat.mean()) if self.lat.size else 0.0
+        m_lat, m_lon = meters_per_degree(lat0)
+        self._x = (self.lon * m_lon).tolist()
+        self._y = (self.lat * m_lat).tolist()
+        # slightly shrink the planar distance so the heuristic stays admissible
+        self._inv_speed = 0.995 / max(self.max_speed_mps, 0.1)
+        # only nodes with outgoing edges are useful route endpoints
+        self.grid = NodeGrid.build(self.lat, self.lon, np.nonzero(np.diff(self.indptr) > 0)[0])
+
+    @classmethod
+    def load(cls, path: str) -> 'RoadGraph':
+        with np.load(path) as data:
+            return cls(data['lat'], data['lon'], data['indptr'], data['indices'],
+                       data['time_s'], data['length_m'], float(data['max_speed_mps']))
+
+    @property
+    def node_count(self) -> int:
+        return int(self.lat.size)
+
+    @property
+    def edge_count(self) -> int:
+        return int(self.indices.size)
+
+    # -- search -------------------------------------------------------------------
+    def shortest_path(self, src: int, dst: int) -> Optional[Tuple[List[int], float]]:
+        """A* from ``src`` to ``dst``; returns (node path, travel seconds) or None if unreachable."""
+        if src == dst:
+            return [src], 0.0
+        adj = self._adj
+        xs, ys, inv = self._x, self._y, self._inv_speed
+        tx, ty = xs[dst], ys[dst]
+        hypot = math.hypot
+        dist = {src: 0.0}
+        prev = {src: -1}
+        heap = [(hypot(xs[src] - tx, ys[src] - ty) * inv, 0.0, src)]
+        push, pop = heapq.heappush, heapq.heappop
+        while heap:
+            _, g, u = pop(heap)
+            if g > dist[u]:
+                continue  # stale entry
+            if u == dst:
+                path = [u]
+                while prev[u] != -1:
+                    u = prev[u]
+                    path.append(u)
+                path.reverse()
+                return path, g
+            for v, w in adj[u]:
+                ng = g + w
+                if ng < dist.get(v, 1e18):
+                    dist[v] = ng
+                    prev[v] = u
+                    push(heap, (ng + hypot(xs[v] - tx, ys[v] - ty) * inv, ng, v))
+        return None
+
+    def one_to_many(self, src: int, targets: Sequence[int]) -> List[float]:
+        """Travel seconds from ``src`` to each target (``inf`` if unreachable), one Dijkstra."""
+        adj = self._adj
+        remaining = set(targets)
+        dist = {src: 0.0}
+        settled = {}
+        heap = [(0.0, src)]
+        push, pop = heapq.heappush, heapq.heappop
+        while heap and remaining:
+            d, u = pop(heap)
+            if u in settled:
+                continue
+            settled[u] = d
+            remaining.discard(u)
+            for v, w in adj[u]:
+                nd = d + w
+                if nd < dist.get(v, 1e18):
+                    dist[v] = nd
+                    push(heap, (nd, v))
+        return [settled.get(t, float('inf')) for t in targets]
+
+    def table(self, sources: Sequence[int], targets: Sequence[int]) -> List[List[float]]:
+        return [self.one_to_many(s, targets) for s in sources]
+
+    def stats(self) -> Dict[str, Any]:
+        return {'nodes': self.node_count, 'edges': self.edge_count, 'grid_cells': len(self.grid),
+                'max_speed_kmh': round(self.max_speed_mps * 3.6, 1)}
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional
+
+from .geo import meters_per_degree
+
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", 5000))
+ROUTE_CACHE_TTL_S = float(os.getenv("ROUTE_CACHE_TTL_S", 6 * 3600))
+# grid: origin/destination rounded to ROUTE_CACHE_GRID_M cells; node: snapped road node (falls back to grid)
+ROUTE_CACHE_SNAP = os.getenv("ROUTE_CACHE_SNAP", "grid").lower()
+ROUTE_CACHE_GRID_M = float(os.getenv("ROUTE_CACHE_GRID_M", 50))
+# optional JSON file the cache is loaded from at startup and saved to at shutdown
+ROUTE_CACHE_PATH = os.getenv("ROUTE_CACHE_PATH", "")
+POLYLINE_PRECISION = 6
+
+
+def encode_polyline(coords: List[List[float]], precision: int = POLYLINE_PRECISION) -> str:
+    """Encode [[lon, lat], ...] with the Google polyline algorithm (lat/lon order on the wire)."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lon = 0
+    for lon, lat in coords:
+        ilat = int(round(lat * factor))
+        ilon = int(round(lon * factor))
+        for delta in (ilat - prev_lat, ilon - prev_lon):
+            v = ~(delta << 1) if delta < 0 else delta << 1
+            while v >= 0x20:
+                out.append(chr((0x20 | (v & 0x1f)) + 63))
+                v >>= 5
+            out.append(chr(v + 63))
+        prev_lat, prev_lon = ilat, ilon
+    return ''.join(out)
+
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> List[List[float]]:
+    """Inverse of ``encode_polyline``; returns [[lon, lat], ...]."""
+    factor = float(10 ** precision)
+    coords = []
+    index = lat = lon = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.append([lon / factor, lat / factor])
+    return coords
+
+
+class RouteCache:
+    """LRU + TTL cache of planned routes keyed by snapped origin and destination.
+
+    Entries store the geometry as an encoded polyline with duration, distance, router
+    source and the time the original computation took, which is what a hit saves. A hit
+    is returned with its first and last coordinates moved to the exact requested points,
+    so neighbouring requests that share a key still start and end where they asked.
+    Straight-line fallbacks are never cached. With ``ROUTE_CACHE_PATH`` set, the cache is
+    loaded at startup and saved at shutdown so a restarted backend starts warm.
+    """
+
+    def __init__(self, capacity: int = ROUTE_CACHE_SIZE, ttl_s: float = ROUTE_CACHE_TTL_S,
+                 snap: str = ROUTE_CACHE_SNAP, grid_m: float = ROUTE_CACHE_GRID_M,
+                 path: str = ROUTE_CACHE_PATH, node_snapper: Optional[Callable[[float, float], Optional[int]]] = None):
+        self.capacity = max(1, int(capacity))
+        self.ttl_s = ttl_s
+        self.snap = snap
+        self.grid_m = grid_m
+        self.path = path
+        self.node_snapper = node_snapper
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.saved_ms = 0.0
+        if self.path:
+            self.load()
+
+    # -- keys ---------------------------------------------------------------------
+    def _grid_point(self, lat: float, lon: float) -> str:
+        m_lat, m_lon = meters_per_degree(lat)
+        dlat = self.grid_m / m_lat
+        dlon = self.grid_m / max(0.2 * m_lat, m_lon)
+        return f"{int(round(lat / dlat))}:{int(round(lon / dlon))}"
+
+    def key(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> str:
+        if self.snap == 'node' and self.node_snapper is not None:
+            src = self.node_snapper(start_lat, start_lon)
+            dst = self.node_snapper(end_lat, end_lon)
+            if src is not None and dst is not None:
+                return f"n:{src}>{dst}"
+        return f"g{int(self.grid_m)}:{self._grid_point(start_lat, start_lon)}>{self._grid_point(end_lat, end_lon)}"
+
+    # -- access -------------------------------------------------------------------
+    def get(self, key: str, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry['stored_at'] > self.ttl_s:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_ms += entry.get('compute_ms') or 0.0
+        coords = decode_polyline(entry['polyline'])
+        if coords:
+            coords[0] = [start_lon, start_lat]
+            coords[-1] = [end_lon, end_lat]
+        return {
+            'geometry': {'type': 'LineString', 'coordinates': coords},
+            'duration': entry.get('duration'),
+            'distance': entry.get('distance'),
+            'source': entry.get('source'),
+            'cached': True,
+        }
+
+    def put(self, key: str, result: Dict[str, Any], compute_ms: float):
+        coords = (result.get('geometry') or {}).get('coordinates')
+        if not coords or result.get('source') == 'straight':
+            return
+        entry = {
+            'polyline': encode_polyline(coords),
+            'duration': result.get('duration'),
+            'distance': result.get('distance'),
+            'source': result.get('source'),
+            'compute_ms': round(compute_ms, 3),
+            'stored_at': time.time(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def get_or_compute(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float,
+                       compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        key = self.key(start_lat, start_lon, end_lat, end_lon)
+        hit = self.get(key, start_lat, start_lon, end_lat, end_lon)
+        if hit is not None:
+            return hit
+        t0 = time.perf_counter()
+        result = compute()
+        self.put(key, result, (time.perf_counter() - t0) * 1000.0)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # -- persistence ----------------------------------------------------------------
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print('Route cache file unreadable, starting cold', e)
+            return
+        now = time.time()
+        loaded = 0
+        with self._lock:
+            # file is written oldest first, so replaying keeps the LRU order
+            for key, entry in data.get('entries', []):
+                if now - entry.get('stored_at', 0) <= self.ttl_s:
+                    self._entries[key] = entry
+                    loaded += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        print(f"Loaded {loaded} cached routes from {self.path}")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'version': 1, 'entries': entries}, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print('Failed to save route cache', e)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'capacity': self.capacity,
+            'ttl_s': self.ttl_s,
+            'snap': self.snap,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else None,
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'saved_ms': round(self.saved_ms, 1),
+            'persist_path': self.path or None,
+        }
@@ -0,0 +1,135 @@
+import json
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .geo import haversine_m
+
+
+def parse_route_coords(route) -> Optional[List[List[float]]]:
+    """Return [[lon, lat], ...] from a GeoJSON LineString / Feature / FeatureCollection (str or dict)."""
+    if not route:
+        return None
+    try:
+        route_obj = json.loads(route) if isinstance(route, str) else route
+    except Exception:
+        return None
+    if not isinstance(route_obj, dict):
+        return None
+    if 'coordinates' in route_obj:
+        return route_obj.get('coordinates') or None
+    if route_obj.get('geometry'):
+        return (route_obj['geometry'] or {}).get('coordinates') or None
+    features = route_obj.get('features')
+    if features and isinstance(features, list) and isinstance(features[0], dict):
+        geom = features[0].get('geometry')
+        if geom and 'coordinates' in geom:
+            return geom.get('coordinates') or None
+    return None
+
+
+def cumulative_m(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Distance from the first vertex to every vertex of a polyline (cum[0] == 0)."""
+    if len(lat) < 2:
+        return np.zeros(len(lat))
+    seg = haversine_m(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    return np.concatenate([[0.0], np.cumsum(seg)])
+
+
+def positions_along(cum, vlat, vlon, x, first, last, return_index=False):
+    """Interpolate positions at cumulative distance(s) ``x`` with a binary search.
+
+    ``cum``/``vlat``/``vlon`` may hold several polylines back to back as long as ``cum``
+    is non-decreasing over the whole buffer. ``first``/``last`` are the vertex index
+    range of the polyline each query belongs to, so a search can never leave it.
+    With ``return_index`` the buffer index of each segment's start vertex is returned too.
+    """
+    j = np.searchsorted(cum, x, side='right') - 1
+    j = np.clip(j, first, np.maximum(first, last - 1))
+    k = np.minimum(j + 1, last)
+    seg = cum[k] - cum[j]
+    frac = np.clip(np.where(seg > 0, (x - cum[j]) / np.where(seg > 0, seg, 1.0), 0.0), 0.0, 1.0)
+    lat = vlat[j] + (vlat[k] - vlat[j]) * frac
+    lon = vlon[j] + (vlon[k] - vlon[j]) * frac
+    if return_index:
+        return lat, lon, j
+    return lat, lon
+
+
+class Route:
+    """Route geometry prepared once so movement and ETA queries are cheap.
+
+    Vertices are packed into float64 arrays and ``cum_m`` holds the distance from the
+    start to every vertex. The position ``s`` meters along the route is a binary search
+    over ``cum_m`` plus one interpolation, O(log n) in the number of vertices. Remaining
+    distance and ETA from ``s`` are a single subtraction.
+    """
+
+    __slots__ = ('lat', 'lon', 'cum_m')
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if lat.size == 1:
+            lat = np.repeat(lat, 2)
+            lon = np.repeat(lon, 2)
+        self.lat = lat
+        self.lon = lon
+        self.cum_m = cumulative_m(lat, lon)
+
+    @classmethod
+    def from_coords(cls, coords, start: Optional[Tuple[float, float]] = None) -> Optional['Route']:
+        """Build from [[lon, lat], ...]; ``start`` (lat, lon) is prepended when given."""
+        pts = [[float(c[0]), float(c[1])] for c in (coords or [])]
+        if start is not None:
+            pts.insert(0, [float(start[1]), float(start[0])])
+        if not pts:
+            return None
+        arr = np.asarray(pts, dtype=np.float64)
+        return cls(arr[:, 1], arr[:, 0])
+
+    @classmethod
+    def from_geojson(cls, route, start: Optional[Tuple[float, float]] = None) -> Optional['Route']:
+        coords = parse_route_coords(route)
+        if not coords:
+            return None
+        return cls.from_coords(coords, start=start)
+
+    @classmethod
+    def straight(cls, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> 'Route':
+        return cls(np.array([start_lat, end_lat], dtype=np.float64), np.array([start_lon, end_lon], dtype=np.float64))
+
+    def __len__(self) -> int:
+        return int(self.lat.size)
+
+    @property
+    def length_m(self) -> float:
+        return float(self.cum_m[-1])
+
+    @property
+    def end(self) -> Tuple[float, float]:
+        return float(self.lat[-1]), float(self.lon[-1])
+
+    def position_at(self, s: float) -> Tuple[float, float]:
+        """(lat, lon) of the point ``s`` meters from the start (clamped to the route)."""
+        s = min(max(float(s), 0.0), self.length_m)
+        lat, lon = positions_along(self.cum_m, self.lat, self.lon, s, 0, self.lat.size - 1)
+        return float(lat), float(lon)
+
+    def position_after(self, t: float, speed_mps: float, s0: float = 0.0) -> Tuple[float, float]:
+        """(lat, lon) after driving ``t`` seconds at ``speed_mps`` from ``s0`` meters along."""
+        return self.position_at(s0 + max(0.0, speed_mps) * max(0.0, t))
+
+    def remaining_m(self, s: float) -> float:
+        return max(0.0, self.length_m - float(s))
+
+    def eta_seconds(self, s: float, speed_mps: float) -> float:
+        return self.remaining_m(s) / max(0.1, speed_mps)
+
+    def project(self, lat: float, lon: float) -> float:
+        """Distance along the route of the vertex nearest to (lat, lon)."""
+        d = haversine_m(lat, lon, self.lat, self.lon)
+        return float(self.cum_m[int(np.argmin(d))])
+
+    def to_geojson(self) -> dict:
+        return {'type': 'LineString', 'coordinates': np.column_stack([self.lon, self.lat]).tolist()}
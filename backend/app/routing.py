@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from .ch import ContractionHierarchy
+from .ingest import LatencyStats
+from .roadgraph import RoadGraph
+from .route_cache import RouteCache, ROUTE_CACHE_SIZE
+from .routes import Route
+
+# auto: local road graph, then Mapbox (if a token is set), then a straight line
+# local / mapbox / straight: use only that router (straight line is always the last resort)
+ROUTER = os.getenv("ROUTER", "auto").lower()
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH", "data/cluj_roads.npz")
+# contraction hierarchy built from the same graph; used instead of A* when the file exists
+ROAD_CH_PATH = os.getenv("ROAD_CH_PATH", "data/cluj_roads.ch")
+MAPBOX_TIMEOUT_S = float(os.getenv("MAPBOX_TIMEOUT_S", 6))
+
+
+class Router:
+    """Route planning for dispatch with a local-first fallback chain.
+
+    The local engine is loaded lazily on first use and kept for the process lifetime: the
+    memory-mapped contraction hierarchy when ``ROAD_CH_PATH`` exists, otherwise A* on
+    the road graph at ``ROAD_GRAPH_PATH``. Every result has the same shape:
+    {'geometry': GeoJSON LineString, 'duration': seconds or None, 'distance': meters,
+    'source': 'local' | 'mapbox' | 'straight'}. Results are served through a
+    ``RouteCache`` when ``ROUTE_CACHE_SIZE`` > 0 (hits carry ``'cached': True``).
+    """
+
+    def __init__(self, mode: str = ROUTER, graph_path: str = ROAD_GRAPH_PATH, ch_path: str = ROAD_CH_PATH):
+        self.mode = mode
+        self.graph_path = graph_path
+        self.ch_path = ch_path
+        self._graph = None
+        self._graph_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self.counts = {'local': 0, 'mapbox': 0, 'straight': 0}
+        self.latency = {'local': LatencyStats(), 'mapbox': LatencyStats()}
+        self.cache = RouteCache(node_snapper=self._snap_node) if ROUTE_CACHE_SIZE > 0 else None
+
+    def _snap_node(self, lat: float, lon: float) -> Optional[int]:
+        graph = self.graph if self.mode in ('auto', 'local') else None
+        return graph.nearest_node(lat, lon) if graph is not None else None
+
+    @property
+    def graph(self):
+        """The local routing engine (ContractionHierarchy or RoadGraph), or None."""
+        if self._graph is None and self._graph_error is None:
+            with self._lock:
+                if self._graph is None and self._graph_error is None:
+                    try:
+                        t0 = time.perf_counter()
+                        if self.ch_path and os.path.exists(self.ch_path):
+                            self._graph = ContractionHierarchy.load(self.ch_path)
+                        else:
+                            self._graph = RoadGraph.load(self.graph_path)
+                        print(f"Loaded {type(self._graph).__name__} with {self._graph.node_count} nodes in "
+                              f"{(time.perf_counter() - t0) * 1000:.0f} ms")
+                    except Exception as e:
+                        self._graph_error = str(e)
+                        print('Road graph not available, local routing disabled:', e)
+        return self._graph
+
+    def route_local(self, start_lat, start_lon, end_lat, end_lon) -> Optional[Dict[str, Any]]:
+        graph = self.graph
+        if graph is None:
+            return None
+        t0 = time.perf_counter()
+        try:
+            result = graph.route(start_lat, start_lon, end_lat, end_lon)
+        except Exception as e:
+            print('Local routing failed', e)
+            result = None
+        self.latency['local'].observe((time.perf_counter() - t0) * 1000.0)
+        return result
+
+    def route_mapbox(self, start_lat, start_lon, end_lat, end_lon) -> Optional[Dict[str, Any]]:
+        mapbox_token = os.getenv('MAPBOX_TOKEN') or os.getenv('REACT_APP_MAPBOX_TOKEN')
+        if not mapbox_token:
+            return None
+        t0 = time.perf_counter()
+        try:
+            # Mapbox expects lon,lat pairs
+            coords = f"{start_lon},{start_lat};{end_lon},{end_lat}"
+            url = f"https://api.mapbox.com/directions/v5/mapbox/driving/{coords}?geometries=geojson&overview=full&access_token={mapbox_token}"
+            import requests
+            resp = requests.get(url, timeout=MAPBOX_TIMEOUT_S)
+            if resp.status_code == 200:
+                j = resp.json()
+                if j.get('routes'):
+                    r = j['routes'][0]
+                    if r.get('geometry'):
+                        return {'geometry': r['geometry'], 'duration': r.get('duration'), 'distance': r.get('distance')}
+        except Exception as e:
+            print('Mapbox directions failed', e)
+        finally:
+            self.latency['mapbox'].observe((time.perf_counter() - t0) * 1000.0)
+        return None
+
+    def route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Dict[str, Any]:
+        if self.cache is None:
+            return self._route(start_lat, start_lon, end_lat, end_lon)
+        return self.cache.get_or_compute(start_lat, start_lon, end_lat, end_lon,
+                                         lambda: self._route(start_lat, start_lon, end_lat, end_lon))
+
+    def _route(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float) -> Dict[str, Any]:
+        chain = {'local': ('local',), 'mapbox': ('mapbox',), 'straight': ()}.get(self.mode, ('local', 'mapbox'))
+        for source in chain:
+            fn = self.route_local if source == 'local' else self.route_mapbox
+            result = fn(start_lat, start_lon, end_lat, end_lon)
+            if result is not None:
+                result['source'] = source
+                self.counts[source] += 1
+                return result
+        self.counts['straight'] += 1
+        line = Route.straight(start_lat, start_lon, end_lat, end_lon)
+        return {'geometry': line.to_geojson(), 'duration': None, 'distance': line.length_m, 'source': 'straight'}
+
+    def stats(self) -> Dict[str, Any]:
+        graph = self._graph
+        return {
+            'mode': self.mode,
+            'graph_path': self.graph_path,
+            'ch_path': self.ch_path,
+            'engine': type(graph).__name__ if graph is not None else None,
+            'graph': graph.stats() if graph is not None else None,
+            'graph_error': self._graph_error,
+            'routes': dict(self.counts),
+            'latency': {k: v.snapshot() for k, v in self.latency.items()},
+            'cache': self.cache.stats() if self.cache is not None else None,
+        }
+
+
+router = Router()
@@ -0,0 +1,213 @@
+import os
+import math
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .geo import distances_from_m, meters_per_degree
+
+UNIT_INDEX_CELL_M = float(os.getenv("UNIT_INDEX_CELL_M", 500))
+# grid cells are sized for this latitude so the index is uniform across the city
+UNIT_INDEX_REF_LAT = float(os.getenv("CITY_CENTER_LAT", 46.7712))
+
+
+class UnitIndex:
+    """In-memory uniform grid over live unit positions, partitioned by (unit_type, status).
+
+    Each (unit_type, status) pair has its own sparse grid of ``cell_m`` cells holding unit
+    ids, so a k-nearest query for idle ambulances only looks at idle ambulances. Queries
+    walk rings of cells outward from the query point. They stop when the k-th best
+    distance is closer than anything an unvisited ring could hold, so the work depends on
+    local density, not on fleet size. Position and status updates move one id between
+    cells. The fleet engine pushes every tick's positions through ``move_many``.
+
+    Records returned are the stored unit dicts (Ambulance.to_dict() payloads) kept
+    current for lat/lon/status. All methods are safe to call from any thread.
+    """
+
+    def __init__(self, cell_m: float = UNIT_INDEX_CELL_M, ref_lat: float = UNIT_INDEX_REF_LAT):
+        self.cell_m = cell_m
+        m_lat, m_lon = meters_per_degree(ref_lat)
+        self._dlat = cell_m / m_lat
+        self._dlon = cell_m / max(0.2 * m_lat, m_lon)
+        self._lock = threading.RLock()
+        # id -> [lat, lon, unit_type, status, cell, record]
+        self._units: Dict[str, list] = {}
+        self._grids: Dict[Tuple[str, str], Dict[Tuple[int, int], set]] = {}
+
+    @staticmethod
+    def _type(unit: Dict[str, Any]) -> str:
+        return (unit.get('unit_type') or 'ambulance').lower()
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self._dlat)), int(math.floor(lon / self._dlon))
+
+    def _insert(self, key, cell, unit_id):
+        grid = self._grids.setdefault(key, {})
+        grid.setdefault(cell, set()).add(unit_id)
+
+    def _discard(self, key, cell, unit_id):
+        grid = self._grids.get(key)
+        if grid is None:
+            return
+        bucket = grid.get(cell)
+        if bucket is not None:
+            bucket.discard(unit_id)
+            if not bucket:
+                del grid[cell]
+
+    # -- updates ------------------------------------------------------------------
+    def upsert(self, unit: Dict[str, Any]):
+        """Insert or refresh a unit from its Ambulance.to_dict() payload."""
+        unit_id = unit.get('ambulance_id') or unit.get('id')
+        if unit_id is None or unit.get('lat') is None or unit.get('lon') is None:
+            return
+        lat, lon = float(unit['lat']), float(unit['lon'])
+        key = (self._type(unit), (unit.get('status') or 'idle').lower())
+        cell = self._cell(lat, lon)
+        with self._lock:
+            old = self._units.get(unit_id)
+            if old is not None:
+                self._discard((old[2], old[3]), old[4], unit_id)
+            self._insert(key, cell, unit_id)
+            self._units[unit_id] = [lat, lon, key[0], key[1], cell, dict(unit)]
+
+    def move(self, unit_id: str, lat: float, lon: float):
+        with self._lock:
+            entry = self._units.get(unit_id)
+            if entry is None:
+                return
+            cell = self._cell(lat, lon)
+            if cell != entry[4]:
+                key = (entry[2], entry[3])
+                self._discard(key, entry[4], unit_id)
+                self._insert(key, cell, unit_id)
+                entry[4] = cell
+            entry[0], entry[1] = lat, lon
+            entry[5]['lat'] = lat
+            entry[5]['lon'] = lon
+
+    def move_many(self, unit_ids: Iterable[str], lats: Iterable[float], lons: Iterable[float]):
+        """Batch ``move`` for a fleet tick; only units that changed cell touch the grids."""
+        floor, dlat, dlon = math.floor, self._dlat, self._dlon
+        with self._lock:
+            units = self._units
+            for unit_id, lat, lon in zip(unit_ids, lats, lons):
+                entry = units.get(unit_id)
+                if entry is None:
+                    continue
+                cell = (int(floor(lat / dlat)), int(floor(lon / dlon)))
+                if cell != entry[4]:
+                    key = (entry[2], entry[3])
+                    self._discard(key, entry[4], unit_id)
+                    self._insert(key, cell, unit_id)
+                    entry[4] = cell
+                entry[0] = lat
+                entry[1] = lon
+                record = entry[5]
+                record['lat'] = lat
+                record['lon'] = lon
+
+    def set_status(self, unit_id: str, status: str):
+        with self._lock:
+            entry = self._units.get(unit_id)
+            if entry is None:
+                return
+            status = (status or 'idle').lower()
+            if status != entry[3]:
+                self._discard((entry[2], entry[3]), entry[4], unit_id)
+                entry[3] = status
+                self._insert((entry[2], status), entry[4], unit_id)
+            entry[5]['status'] = status
+
+    def remove(self, unit_id: str):
+        with self._lock:
+            entry = self._units.pop(unit_id, None)
+            if entry is not None:
+                self._discard((entry[2], entry[3]), entry[4], unit_id)
+
+    def get(self, unit_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._units.get(unit_id)
+            return entry[5] if entry is not None else None
+
+    def __len__(self) -> int:
+        return len(self._units)
+
+    # -- queries ------------------------------------------------------------------
+    def _matching_grids(self, unit_type: Optional[str], status: Optional[str]):
+        ut = unit_type.lower() if unit_type else None
+        st = status.lower() if status else None
+        return [g for (t, s), g in self._grids.items() if (ut is None or t == ut) and (st is None or s == st)]
+
+    def _score(self, lat, lon, ids) -> List[Tuple[float, str]]:
+        if not ids:
+            return []
+        units = self._units
+        lats = np.fromiter((units[i][0] for i in ids), dtype=np.float64, count=len(ids))
+        lons = np.fromiter((units[i][1] for i in ids), dtype=np.float64, count=len(ids))
+        d = distances_from_m(lat, lon, lats, lons)
+        return list(zip(d.tolist(), ids))
+
+    def _rings(self, lat: float, lon: float, grids, max_ring: int):
+        """Yield (ring, ids in that ring) outward; one final full scan when rings get sparse."""
+        ci, cj = self._cell(lat, lon)
+        occupied = sum(len(g) for g in grids)
+        for ring in range(max_ring + 1):
+            if 8 * ring > occupied:
+                # ring walks would visit more empty cells than there are occupied ones
+                ids = [u for g in grids for (a, b), bucket in g.items()
+                       if max(abs(a - ci), abs(b - cj)) >= ring for u in bucket]
+                yield None, ids
+                return
+            ids = []
+            for di in range(-ring, ring + 1):
+                step = 1 if abs(di) == ring else 2 * ring
+                for dj in range(-ring, ring + 1, max(1, step)):
+                    for g in grids:
+                        bucket = g.get((ci + di, cj + dj))
+                        if bucket:
+                            ids.extend(bucket)
+            yield ring, ids
+
+    def nearest(self, lat: float, lon: float, k: int = 1, unit_type: Optional[str] = None,
+                status: Optional[str] = 'idle', max_m: Optional[float] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Up to ``k`` (unit record, distance_m) pairs, closest first."""
+        with self._lock:
+            grids = self._matching_grids(unit_type, status)
+            if not grids or k <= 0:
+                return []
+            max_ring = int(max_m / self.cell_m) + 1 if max_m is not None else 1 << 30
+            best: List[Tuple[float, str]] = []
+            for ring, ids in self._rings(lat, lon, grids, max_ring):
+                best.extend(self._score(lat, lon, ids))
+                best.sort()
+                del best[k:]
+                # everything beyond this ring is at least ``ring`` full cells away
+                if ring is not None and len(best) >= k and best[-1][0] <= ring * self.cell_m:
+                    break
+            return [(self._units[i][5], d) for d, i in best if max_m is None or d <= max_m]
+
+    def within(self, lat: float, lon: float, radius_m: float, unit_type: Optional[str] = None,
+               status: Optional[str] = 'idle') -> List[Tuple[Dict[str, Any], float]]:
+        """All (unit record, distance_m) pairs within ``radius_m``, closest first."""
+        with self._lock:
+            grids = self._matching_grids(unit_type, status)
+            found = []
+            for _, ids in self._rings(lat, lon, grids, int(radius_m / self.cell_m) + 1):
+                found.extend((d, i) for d, i in self._score(lat, lon, ids) if d <= radius_m)
+            found.sort()
+            return [(self._units[i][5], d) for d, i in found]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'units': len(self._units),
+                'cell_m': self.cell_m,
+                'partitions': {f"{t}/{s}": sum(len(b) for b in g.values()) for (t, s), g in self._grids.items()},
+                'occupied_cells': sum(len(g) for g in self._grids.values()),
+            }
+
+
+unit_index = UnitIndex()
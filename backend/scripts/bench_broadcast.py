@@ -0,0 +1,126 @@
+"""
+Benchmark SSE fan-out: the original per-subscriber json.dumps Broadcaster vs app.broadcast.
+
+Both variants get N subscribers (1000 by default) that drain their stream like the
+/stream/incidents generator does. Events are published from a separate thread, as the
+MQTT and simulator threads do in the backend. The script reports wall time until every
+subscriber has seen every event, events/s and the serialization count.
+
+Run from the backend directory:
+    python scripts/bench_broadcast.py --subscribers 1000 --events 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.broadcast import Broadcaster  # noqa: E402
+
+
+class LegacyBroadcaster:
+    """Copy of the original implementation: unbounded queues, put_nowait from any thread."""
+
+    def __init__(self):
+        self.subscribers = set()
+
+    async def subscribe(self):
+        q = asyncio.Queue()
+        self.subscribers.add(q)
+        try:
+            while True:
+                item = await q.get()
+                yield item
+        finally:
+            self.subscribers.discard(q)
+
+    def publish(self, item):
+        for q in list(self.subscribers):
+            try:
+                q.put_nowait(item)
+            except Exception:
+                pass
+
+
+def sample_event(i):
+    return {
+        'resource': 'ambulance', 'ambulance_id': f"amb_AMB-{i % 100:02d}", 'unit_name': f"AMB-{i % 100:02d}",
+        'status': 'enroute', 'lat': 46.77 + i * 1e-5, 'lon': 23.62 + i * 1e-5, 'target_lat': 46.78,
+        'target_lon': 23.63, 'speed_kmh': 80.0, 'eta': '2026-01-07T12:00:00', 'route': None,
+        'unit_type': 'ambulance', 'incident_id': f"inc-{i}", 'started_at': '2026-01-07T11:50:00',
+    }
+
+
+async def run(kind, n_subs, n_events):
+    loop = asyncio.get_running_loop()
+    if kind == 'legacy':
+        b = LegacyBroadcaster()
+    else:
+        b = Broadcaster()
+        b.bind(loop)
+    done = asyncio.Event()
+    remaining = [n_subs]
+    serializations = [0]
+
+    async def consumer():
+        seen = 0
+        async for item in (b.subscribe() if kind == 'legacy' else b.subscribe(maxsize=n_events, overflow='drop_oldest')):
+            if kind == 'legacy':
+                # what the old SSE generator did for every subscriber
+                _ = f"data: {json.dumps(item)}\n\n"
+                serializations[0] += 1
+            seen += 1
+            if seen >= n_events:
+                break
+        remaining[0] -= 1
+        if remaining[0] == 0:
+            done.set()
+
+    tasks = [asyncio.create_task(consumer()) for _ in range(n_subs)]
+    await asyncio.sleep(0)
+
+    events = [sample_event(i) for i in range(n_events)]
+
+    def producer():
+        for ev in events:
+            b.publish(ev)
+            if kind == 'legacy':
+                # the legacy queues never wake a waiting getter from another thread,
+                # so nudge the loop like incoming I/O would
+                loop.call_soon_threadsafe(lambda: None)
+
+    t0 = time.perf_counter()
+    th = threading.Thread(target=producer)
+    th.start()
+    await asyncio.wait_for(done.wait(), timeout=300)
+    elapsed = time.perf_counter() - t0
+    th.join()
+    for t in tasks:
+        t.cancel()
+    if kind != 'legacy':
+        serializations[0] = b.published
+    return elapsed, serializations[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=1000)
+    parser.add_argument('--events', type=int, default=200)
+    args = parser.parse_args()
+
+    for kind in ('legacy', 'new'):
+        try:
+            elapsed, ser = asyncio.run(run(kind, args.subscribers, args.events))
+        except asyncio.TimeoutError:
+            print(f"{kind:>6}: timed out (subscribers were never woken)")
+            continue
+        deliveries = args.subscribers * args.events
+        print(f"{kind:>6}: {elapsed * 1000:8.1f} ms for {deliveries} deliveries "
+              f"({deliveries / elapsed:,.0f} deliveries/s, {ser} json serializations)")
+
+
+if __name__ == '__main__':
+    main()
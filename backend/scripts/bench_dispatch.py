@@ -0,0 +1,100 @@
+"""
+Benchmark batch dispatch (app.dispatch.solve_dispatch) against greedy nearest-unit.
+
+Builds random units and incidents around Cluj-Napoca with severities 1-5 and
+straight-line travel times at 40 km/h. For each size it reports the solver used
+(OR-Tools when installed, otherwise the NumPy Hungarian fallback), the solve time, and
+the severity-weighted objective of the optimal matching vs. assigning incidents one at
+a time (most severe first) to the nearest free unit. Small cases are checked against
+brute force.
+
+Run from the backend directory:
+    python scripts/bench_dispatch.py --sizes 10 50 200
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.dispatch import DISPATCH_MAX_TRAVEL_S, severity_weights, solve_dispatch  # noqa: E402
+from app.geo import distance_matrix_m  # noqa: E402
+
+CENTER_LAT = 46.7712
+CENTER_LON = 23.6236
+SPEED_MPS = 40 / 3.6
+
+
+def make_problem(n_units, n_inc, rnd):
+    u = [(CENTER_LAT + rnd.gauss(0, 0.03), CENTER_LON + rnd.gauss(0, 0.04)) for _ in range(n_units)]
+    i = [(CENTER_LAT + rnd.gauss(0, 0.03), CENTER_LON + rnd.gauss(0, 0.04)) for _ in range(n_inc)]
+    seconds = distance_matrix_m([p[0] for p in u], [p[1] for p in u], [p[0] for p in i], [p[1] for p in i]) / SPEED_MPS
+    severities = [rnd.randint(1, 5) for _ in range(n_inc)]
+    return seconds, severities
+
+
+def objective(seconds, severities, pairs):
+    w = severity_weights(severities)
+    served = {i for i, _ in pairs}
+    total = sum(w[i] * seconds[j, i] for i, j in pairs)
+    total += sum(w[i] * (DISPATCH_MAX_TRAVEL_S + 1.0) for i in range(len(severities)) if i not in served)
+    return float(total)
+
+
+def greedy(seconds, severities):
+    free = set(range(seconds.shape[0]))
+    pairs = []
+    for i in sorted(range(len(severities)), key=lambda k: -severities[k]):
+        options = [j for j in free if seconds[j, i] <= DISPATCH_MAX_TRAVEL_S]
+        if options:
+            j = min(options, key=lambda k: seconds[k, i])
+            free.discard(j)
+            pairs.append((i, j))
+    return pairs
+
+
+def brute_force(seconds, severities):
+    n_units, n_inc = seconds.shape
+    best = None
+    slots = list(range(n_units)) + [None] * n_inc
+    for perm in set(itertools.permutations(slots, n_inc)):
+        pairs = [(i, j) for i, j in enumerate(perm) if j is not None and seconds[j, i] <= DISPATCH_MAX_TRAVEL_S]
+        value = objective(seconds, severities, pairs)
+        best = value if best is None else min(best, value)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rnd = random.Random(11)
+    for n_units, n_inc in [(3, 4), (4, 3), (5, 5)]:
+        for _ in range(20):
+            seconds, severities = make_problem(n_units, n_inc, rnd)
+            got = objective(seconds, severities, solve_dispatch(seconds, severities)['pairs'])
+            want = brute_force(seconds, severities)
+            assert abs(got - want) < 1e-3 * max(1.0, want), (got, want)
+    print('brute-force check passed')
+
+    print(f"{'units x incidents':>18} {'solver':>10} {'solve ms':>9} {'optimal':>12} {'greedy':>12} {'served':>7}")
+    for n in args.sizes:
+        for n_units, n_inc in [(n, n), (n // 2 or 1, n)]:
+            seconds, severities = make_problem(n_units, n_inc, rnd)
+            times = []
+            for _ in range(args.repeat):
+                result = solve_dispatch(seconds, severities)
+                times.append(result['solve_ms'])
+            opt = objective(seconds, severities, result['pairs'])
+            gr = objective(seconds, severities, greedy(seconds, severities))
+            label = f"{n_units} x {n_inc}"
+            print(f"{label:>18} {result['solver']:>10} {np.median(times):>9.2f} {opt:>12.0f} {gr:>12.0f} {len(result['pairs']):>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark the app.geo distance kernels against the old scalar math loops.
+
+Times a units x incidents distance matrix with a pure-Python haversine loop and with
+geo.distance_matrix_m, then the one-to-many nearest-unit scan used by the assigner. It
+also checks the kernels agree with the scalar formula and that destination_point and
+bearing_deg round-trip.
+
+Run from the backend directory:
+    python scripts/bench_geo.py --units 1000 --incidents 1000
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.geo import (EARTH_RADIUS_M, bearing_deg, destination_point, distance_matrix_m,  # noqa: E402
+                     distances_from_m, haversine_m)
+
+CENTER_LAT = 46.7712
+CENTER_LON = 23.6236
+
+
+def scalar_haversine_m(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def timed_ms(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, (time.perf_counter() - t0) * 1000.0)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=1000)
+    parser.add_argument('--incidents', type=int, default=1000)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    u_lat = [CENTER_LAT + rnd.gauss(0, 0.03) for _ in range(args.units)]
+    u_lon = [CENTER_LON + rnd.gauss(0, 0.04) for _ in range(args.units)]
+    i_lat = [CENTER_LAT + rnd.gauss(0, 0.03) for _ in range(args.incidents)]
+    i_lon = [CENTER_LON + rnd.gauss(0, 0.04) for _ in range(args.incidents)]
+
+    loop_ms, loop = timed_ms(lambda: [[scalar_haversine_m(a, b, c, d) for c, d in zip(i_lat, i_lon)]
+                                      for a, b in zip(u_lat, u_lon)], repeat=1)
+    mat_ms, mat = timed_ms(lambda: distance_matrix_m(u_lat, u_lon, i_lat, i_lon))
+    bcast_ms, bcast = timed_ms(lambda: haversine_m(np.asarray(u_lat)[:, None], np.asarray(u_lon)[:, None],
+                                                   np.asarray(i_lat)[None, :], np.asarray(i_lon)[None, :]))
+    print(f"{args.units} x {args.incidents} distance matrix")
+    print(f"  python loop        {loop_ms:10.2f} ms")
+    print(f"  haversine_m bcast  {bcast_ms:10.2f} ms")
+    print(f"  distance_matrix_m  {mat_ms:10.2f} ms")
+    print(f"  max abs diff vs loop: {np.abs(mat - np.asarray(loop)).max():.2e} m, vs bcast: {np.abs(mat - bcast).max():.2e} m")
+
+    lats, lons = np.asarray(u_lat), np.asarray(u_lon)
+    one_ms, _ = timed_ms(lambda: [int(np.argmin(distances_from_m(a, b, lats, lons))) for a, b in zip(i_lat, i_lon)], 1)
+    print(f"  nearest of {args.units} units for {args.incidents} incidents: {one_ms:.2f} ms")
+
+    brg = bearing_deg(u_lat, u_lon, i_lat[:args.units], i_lon[:args.units]) if args.units <= args.incidents else None
+    if brg is not None:
+        dist = haversine_m(np.asarray(u_lat), np.asarray(u_lon), np.asarray(i_lat[:args.units]), np.asarray(i_lon[:args.units]))
+        lat2, lon2 = destination_point(np.asarray(u_lat), np.asarray(u_lon), brg, dist)
+        err = haversine_m(lat2, lon2, np.asarray(i_lat[:args.units]), np.asarray(i_lon[:args.units])).max()
+        print(f"  bearing/destination round trip max error: {err:.2e} m")
+
+
+if __name__ == '__main__':
+    main()
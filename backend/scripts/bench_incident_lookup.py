@@ -0,0 +1,136 @@
+"""
+Benchmark "latest version of incident X" lookups on a hypertable with a year of chunks.
+
+Creates scratch tables next to the real ones:
+
+- bench_incidents: a hypertable with the incidents key and one-day chunks
+- bench_incident_latest: with the same trigger as migration 0010
+
+It fills them with --incidents ids spread over --days days, --versions rows each. It then
+times the two ways of finding an incident's newest row for random ids:
+
+- scan: WHERE id = :id ORDER BY received_at DESC LIMIT 1 (probes every chunk)
+- lookup: incident_latest by id, then the row by its full key (one chunk)
+
+For each it also prints the number of chunks in the plan. The scratch tables are dropped
+afterwards unless --keep is given.
+
+Run from the backend directory (needs TimescaleDB at DATABASE_URL):
+    python scripts/bench_incident_lookup.py --days 365 --incidents 50000 --lookups 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from sqlalchemy import text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db import engine  # noqa: E402
+
+SCAN = "SELECT * FROM bench_incidents WHERE id = :id ORDER BY received_at DESC LIMIT 1"
+LATEST = "SELECT received_at FROM bench_incident_latest WHERE id = :id"
+BY_KEY = "SELECT * FROM bench_incidents WHERE id = :id AND received_at = :ts"
+
+
+def setup(conn, days, incidents, versions):
+    conn.execute(text("DROP TABLE IF EXISTS bench_incidents, bench_incident_latest CASCADE"))
+    conn.execute(text("""
+        CREATE TABLE bench_incidents (
+            id varchar NOT NULL, received_at timestamp NOT NULL, type varchar, severity int,
+            status varchar, PRIMARY KEY (id, received_at))"""))
+    conn.execute(text("SELECT create_hypertable('bench_incidents', 'received_at', "
+                      "chunk_time_interval => INTERVAL '1 day')"))
+    conn.execute(text("CREATE TABLE bench_incident_latest (id varchar PRIMARY KEY, received_at timestamp NOT NULL)"))
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION bench_incident_latest_sync() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO bench_incident_latest (id, received_at) VALUES (NEW.id, NEW.received_at)
+            ON CONFLICT (id) DO UPDATE SET received_at = EXCLUDED.received_at
+            WHERE bench_incident_latest.received_at < EXCLUDED.received_at;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql"""))
+    conn.execute(text("CREATE TRIGGER bench_incident_latest_sync AFTER INSERT ON bench_incidents "
+                      "FOR EACH ROW EXECUTE FUNCTION bench_incident_latest_sync()"))
+    # each incident's versions land within a few hours of its first report
+    t0 = time.perf_counter()
+    conn.execute(text("""
+        INSERT INTO bench_incidents (id, received_at, type, severity, status)
+        SELECT 'bench-' || i,
+               now()::timestamp - (i::float / :n) * (:days * INTERVAL '1 day') + v * INTERVAL '20 minutes',
+               CASE WHEN i % 5 = 0 THEN 'fire' ELSE 'medical' END, 1 + i % 5,
+               CASE WHEN v = :versions - 1 THEN 'resolved' ELSE 'new' END
+        FROM generate_series(0, :n - 1) AS i, generate_series(0, :versions - 1) AS v"""),
+        {'n': incidents, 'days': days, 'versions': versions})
+    conn.execute(text("ANALYZE bench_incidents"))
+    conn.execute(text("ANALYZE bench_incident_latest"))
+    chunks = conn.execute(text("SELECT count(*) FROM show_chunks('bench_incidents')")).scalar()
+    print(f"loaded {incidents * versions} rows in {chunks} chunks in {time.perf_counter() - t0:.1f} s")
+
+
+def chunks_in_plan(conn, sql, params):
+    plan = conn.execute(text("EXPLAIN (ANALYZE, FORMAT JSON) " + sql), params).scalar()
+    found = set()
+
+    def walk(node):
+        rel = node.get('Relation Name') or ''
+        if rel.startswith('_hyper_') and node.get('Actual Loops', 1):
+            found.add(rel)
+        for child in node.get('Plans', []):
+            walk(child)
+    walk(plan[0]['Plan'])
+    return len(found)
+
+
+def timed(fn, ids):
+    times = []
+    for incident_id in ids:
+        t0 = time.perf_counter()
+        fn(incident_id)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    times.sort()
+    return times[len(times) // 2], times[int(len(times) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--incidents', type=int, default=50000)
+    parser.add_argument('--versions', type=int, default=3)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch tables')
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        setup(conn, args.days, args.incidents, args.versions)
+
+    rnd = random.Random(3)
+    ids = [f"bench-{rnd.randrange(args.incidents)}" for _ in range(args.lookups)]
+    with engine.connect() as conn:
+        def scan(incident_id):
+            return conn.execute(text(SCAN), {'id': incident_id}).first()
+
+        def lookup(incident_id):
+            ts = conn.execute(text(LATEST), {'id': incident_id}).scalar()
+            return conn.execute(text(BY_KEY), {'id': incident_id, 'ts': ts}).first()
+
+        for incident_id in ids[:50]:
+            assert scan(incident_id) == lookup(incident_id), incident_id
+        sample = ids[0]
+        ts = conn.execute(text(LATEST), {'id': sample}).scalar()
+        print(f"chunks touched: scan {chunks_in_plan(conn, SCAN, {'id': sample})}, "
+              f"lookup {chunks_in_plan(conn, BY_KEY, {'id': sample, 'ts': ts})}")
+        for name, fn in (('scan', scan), ('lookup', lookup)):
+            median, p99 = timed(fn, ids)
+            print(f"{name:>7}: median {median:.3f} ms, p99 {p99:.3f} ms over {len(ids)} lookups")
+
+    if not args.keep:
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS bench_incidents, bench_incident_latest CASCADE"))
+            conn.execute(text("DROP FUNCTION IF EXISTS bench_incident_latest_sync()"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Compare SSE bandwidth of dead-reckoning motion updates vs. per-tick position frames.
+
+Builds N units on street-like routes around Cluj-Napoca. Legs are 40-400 m long and
+mostly go straight or turn at right angles. It runs the fleet engine for a simulated
+period at 1 s ticks and reports the JSON bytes the stream would carry with each
+format:
+
+- positions: every moving unit's full payload each tick (FLEET_STREAM=positions)
+- positions, no route: the same frames with the route geometry left out
+- motion: position/heading/speed only for units whose extrapolation would drift
+
+It also replays the client-side extrapolation to report the position error a viewer
+sees between updates.
+
+Run from the backend directory:
+    python scripts/bench_motion.py --units 500 --seconds 120
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.fleet import FleetEngine, FLEET_BATCH_RESOURCE, MOTION_RESOURCE, MOTION_HORIZON_S  # noqa: E402
+from app.geo import destination_point, haversine_m  # noqa: E402
+
+CENTER_LAT = 46.7712
+CENTER_LON = 23.6236
+
+
+def street_route(n_legs, rnd):
+    lat = CENTER_LAT + rnd.uniform(-0.04, 0.04)
+    lon = CENTER_LON + rnd.uniform(-0.05, 0.05)
+    heading = rnd.uniform(0, 360)
+    coords = [[lon, lat]]
+    for _ in range(n_legs):
+        heading += rnd.choice([0, 0, 5, -5, 90, -90, 30, -30])
+        lat, lon = destination_point(lat, lon, heading, rnd.uniform(40, 400))
+        lat, lon = float(lat), float(lon)
+        coords.append([lon, lat])
+    return coords
+
+
+def frame_bytes(frame):
+    return len(json.dumps(frame, separators=(',', ':')))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--units', type=int, default=500)
+    parser.add_argument('--legs', type=int, default=30)
+    parser.add_argument('--seconds', type=int, default=120)
+    args = parser.parse_args()
+
+    rnd = random.Random(5)
+    engine = FleetEngine(persist=lambda rows: None, publish=lambda frame: None,
+                         on_arrival=lambda unit: None, on_release=lambda unit: None)
+    for i in range(args.units):
+        coords = street_route(args.legs, rnd)
+        engine.add_unit({
+            'resource': 'ambulance', 'ambulance_id': f"bench-{i}", 'unit_name': f"B-{i}",
+            'status': 'enroute', 'lat': coords[0][1], 'lon': coords[0][0],
+            'target_lat': coords[-1][1], 'target_lon': coords[-1][0],
+            'speed_kmh': rnd.choice([40.0, 50.0, 60.0, 80.0]),
+            'route': json.dumps({'type': 'LineString', 'coordinates': coords}),
+            'unit_type': 'ambulance', 'incident_id': f"inc-{i}", 'eta': None, 'started_at': None,
+        })
+    engine._apply_pending()
+
+    legacy = legacy_no_route = motion = 0
+    # the client's view: last update per unit and when it arrived (simulated seconds)
+    client = {}
+    errors = []
+    for t in range(1, args.seconds + 1):
+        remaining, arrived = engine.advance(1.0)
+        moving = ~arrived
+        eta_s = remaining / np.maximum(engine.speed, 0.1)
+        infos = []
+        for i, unit in enumerate(engine._units):
+            if moving[i]:
+                unit.info.update(lat=float(engine.lat[i]), lon=float(engine.lon[i]), eta='2026-01-01T00:00:00')
+                infos.append(unit.info)
+        legacy += frame_bytes({'resource': FLEET_BATCH_RESOURCE, 'unit_type': 'ambulance', 'ambulances': infos})
+        legacy_no_route += frame_bytes({'resource': FLEET_BATCH_RESOURCE, 'unit_type': 'ambulance',
+                                        'ambulances': [{k: v for k, v in u.items() if k != 'route'} for u in infos]})
+
+        frames = engine._motion_frames(float(t), moving, eta_s)
+        for unit_type, units in frames.items():
+            motion += frame_bytes({'resource': MOTION_RESOURCE, 'unit_type': unit_type, 'ts': 0,
+                                   'horizon_s': MOTION_HORIZON_S, 'units': units})
+            for u in units:
+                client[u['ambulance_id']] = (u, t)
+        for i, unit in enumerate(engine._units):
+            if not moving[i] or unit.id not in client:
+                continue
+            u, at = client[unit.id]
+            dt = min(t - at, u['eta_s'], MOTION_HORIZON_S)
+            lat, lon = destination_point(u['lat'], u['lon'], u['heading'], u['speed'] * dt)
+            errors.append(float(haversine_m(lat, lon, engine.lat[i], engine.lon[i])))
+
+    stats = engine.stats()
+    errors.sort()
+    kb = 1024.0 * args.seconds
+    print(f"{args.units} units, {args.seconds} s simulated, {stats['motion_updates']} motion updates "
+          f"(update ratio {stats['motion_update_ratio']})")
+    print(f"positions          : {legacy / kb:10.1f} KiB/s")
+    print(f"positions, no route: {legacy_no_route / kb:10.1f} KiB/s")
+    print(f"motion             : {motion / kb:10.1f} KiB/s "
+          f"({legacy_no_route / max(1, motion):.1f}x less than no-route positions)")
+    if errors:
+        print(f"client error       : median {errors[len(errors) // 2]:.1f} m, "
+              f"p99 {errors[int(len(errors) * 0.99)]:.1f} m, max {errors[-1]:.1f} m")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark contraction-hierarchy queries against plain Dijkstra on the road graph.
+
+Draws random origin/destination node pairs (10k by default) from the city graph.
+Each pair is answered by:
+  - plain Dijkstra on the CSR road graph (the baseline),
+  - A* on the road graph (what app/roadgraph.py answers without a hierarchy),
+  - the bidirectional CH query from app/ch.py, travel time only and with the path unpacked.
+The script checks that the CH travel times match Dijkstra and reports median/p99
+latency for each method. It also times one-to-many CH tables: one origin against
+--targets destinations, the "every idle unit vs a new incident" case.
+
+Run from the backend directory (after build_road_graph.py and build_contraction_hierarchy.py):
+    python scripts/bench_routing.py --graph data/cluj_roads.npz --ch data/cluj_roads.ch --pairs 10000
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.ch import ContractionHierarchy  # noqa: E402
+from app.roadgraph import RoadGraph  # noqa: E402
+
+INF = float('inf')
+
+
+def dijkstra(graph, src, dst):
+    """Textbook Dijkstra over the graph's adjacency lists, stopping at ``dst``."""
+    adj = graph._adj
+    dist = {src: 0.0}
+    heap = [(0.0, src)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u == dst:
+            return d
+        if d > dist[u]:
+            continue
+        for v, w in adj[u]:
+            nd = d + w
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return None
+
+
+def timed(fn, pairs):
+    out = []
+    lat = []
+    for s, t in pairs:
+        t0 = time.perf_counter()
+        out.append(fn(s, t))
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    return out, lat
+
+
+def summary(name, lat):
+    lat = sorted(lat)
+    print(f"{name:>10}: median {lat[len(lat) // 2]:8.3f} ms  p99 {lat[int(len(lat) * 0.99)]:8.3f} ms  "
+          f"total {sum(lat) / 1000:7.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--graph', default='data/cluj_roads.npz')
+    parser.add_argument('--ch', default='data/cluj_roads.ch')
+    parser.add_argument('--pairs', type=int, default=10000)
+    parser.add_argument('--targets', type=int, default=100, help='destinations per one-to-many table')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    graph = RoadGraph.load(args.graph)
+    print(f"road graph: {graph.node_count} nodes / {graph.edge_count} edges, loaded in {time.perf_counter() - t0:.2f}s")
+    t0 = time.perf_counter()
+    ch = ContractionHierarchy.load(args.ch)
+    print(f"hierarchy : {ch.edge_count} up+down edges, mapped in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    rnd = random.Random(args.seed)
+    nodes = graph.grid.nodes.tolist()
+    pairs = [(rnd.choice(nodes), rnd.choice(nodes)) for _ in range(args.pairs)]
+
+    ch_res, ch_lat = timed(lambda s, t: ch.travel_time(s, t), pairs)
+    summary('ch', ch_lat)
+    _, path_lat = timed(lambda s, t: ch.shortest_path(s, t), pairs)
+    summary('ch + path', path_lat)
+    astar_res, astar_lat = timed(lambda s, t: graph.shortest_path(s, t), pairs)
+    summary('a*', astar_lat)
+    dij_res, dij_lat = timed(lambda s, t: dijkstra(graph, s, t), pairs)
+    summary('dijkstra', dij_lat)
+
+    mismatches = 0
+    for c, d in zip(ch_res, dij_res):
+        if (c is None) != (d is None) or (d is not None and abs(c - d) > 1e-3 * max(1.0, d)):
+            mismatches += 1
+    print(f"speedup vs dijkstra: {sum(dij_lat) / max(sum(ch_lat), 1e-9):.0f}x, "
+          f"mismatching travel times: {mismatches}/{len(pairs)}")
+
+    tables = max(1, min(100, args.pairs // 100))
+    table_lat = []
+    for _ in range(tables):
+        src = rnd.choice(nodes)
+        targets = [rnd.choice(nodes) for _ in range(args.targets)]
+        t0 = time.perf_counter()
+        ch.one_to_many(src, targets)
+        table_lat.append((time.perf_counter() - t0) * 1000.0)
+    summary(f"1x{args.targets}", table_lat)
+
+
+if __name__ == '__main__':
+    main()
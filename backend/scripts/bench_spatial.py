@@ -0,0 +1,85 @@
+"""
+Benchmark nearest-unit lookups: assigner.assign_nearest linear scan vs app.spatial.UnitIndex.
+
+For 100, 10k and 100k units spread around Cluj-Napoca (half idle, ambulances and fire
+units), the script times:
+  - assign_nearest over the idle ambulances (the current full haversine scan),
+  - UnitIndex.nearest k=1 and k=10 for idle ambulances,
+  - UnitIndex.within a 1 km radius,
+  - one fleet tick of index updates (move_many for every en-route unit).
+It also checks that the index returns the same nearest unit as the scan.
+
+Run from the backend directory:
+    python scripts/bench_spatial.py --sizes 100 10000 100000 --queries 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.assigner import assign_nearest  # noqa: E402
+from app.spatial import UnitIndex  # noqa: E402
+
+CENTER_LAT = 46.7712
+CENTER_LON = 23.6236
+
+
+def make_units(n, rnd):
+    units = []
+    for i in range(n):
+        units.append({
+            'ambulance_id': f"u{i}", 'id': f"u{i}",
+            'lat': CENTER_LAT + rnd.gauss(0, 0.03), 'lon': CENTER_LON + rnd.gauss(0, 0.04),
+            'unit_type': 'fire' if i % 2 else 'ambulance',
+            'status': 'idle' if i % 4 < 2 else 'enroute',
+        })
+    return units
+
+
+def per_query_ms(fn, queries):
+    t0 = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - t0) * 1000.0 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'units':>7} {'scan':>10} {'knn k=1':>10} {'knn k=10':>10} {'1km radius':>11} {'tick update':>12}  match")
+    for n in args.sizes:
+        rnd = random.Random(n)
+        units = make_units(n, rnd)
+        idle_amb = [u for u in units if u['status'] == 'idle' and u['unit_type'] == 'ambulance']
+        index = UnitIndex()
+        for u in units:
+            index.upsert(u)
+        queries = [{'lat': CENTER_LAT + rnd.gauss(0, 0.03), 'lon': CENTER_LON + rnd.gauss(0, 0.04)}
+                   for _ in range(args.queries)]
+
+        scan = per_query_ms(lambda q: assign_nearest(q, idle_amb), queries)
+        knn1 = per_query_ms(lambda q: index.nearest(q['lat'], q['lon'], 1, 'ambulance', 'idle'), queries)
+        knn10 = per_query_ms(lambda q: index.nearest(q['lat'], q['lon'], 10, 'ambulance', 'idle'), queries)
+        radius = per_query_ms(lambda q: index.within(q['lat'], q['lon'], 1000, 'ambulance', 'idle'), queries)
+
+        moving = [u for u in units if u['status'] == 'enroute']
+        ids = [u['ambulance_id'] for u in moving]
+        lats = [u['lat'] + 0.0002 for u in moving]
+        lons = [u['lon'] + 0.0002 for u in moving]
+        t0 = time.perf_counter()
+        index.move_many(ids, lats, lons)
+        tick = (time.perf_counter() - t0) * 1000.0
+
+        match = all(assign_nearest(q, idle_amb)[0]['ambulance_id'] ==
+                    index.nearest(q['lat'], q['lon'], 1, 'ambulance', 'idle')[0][0]['ambulance_id']
+                    for q in queries[:50])
+        print(f"{n:>7} {scan:>8.3f}ms {knn1:>8.3f}ms {knn10:>8.3f}ms {radius:>9.3f}ms {tick:>10.2f}ms  {match}")
+
+
+if __name__ == '__main__':
+    main()
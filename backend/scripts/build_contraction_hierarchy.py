@@ -0,0 +1,183 @@
+"""
+Build a contraction hierarchy from the road graph produced by build_road_graph.py.
+
+Nodes are contracted one at a time in order of importance. Importance is the edge
+difference (shortcuts added minus edges removed) plus the number of already contracted
+neighbours, and it is updated lazily. A node's in/out neighbours get a shortcut unless
+a bounded witness search finds a path that is at least as fast without it. The edges
+each node has to higher-ranked nodes at contraction time become its "up"
+(outgoing) and "down" (incoming) lists. Those lists are written with the snapping grid
+into the memory-mappable format read by app/ch.py.
+
+Run from the backend directory (after building data/cluj_roads.npz):
+    python scripts/build_contraction_hierarchy.py data/cluj_roads.npz data/cluj_roads.ch
+"""
+import argparse
+import heapq
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.ch import write_ch  # noqa: E402
+from app.roadgraph import NodeGrid  # noqa: E402
+
+INF = float('inf')
+
+
+class Contractor:
+    def __init__(self, n, src, dst, weight, witness_settle_limit=60):
+        self.n = n
+        self.limit = witness_settle_limit
+        # out[u][v] / inn[v][u] = (weight, middle node or -1) over not-yet-contracted nodes
+        self.out = [dict() for _ in range(n)]
+        self.inn = [dict() for _ in range(n)]
+        for u, v, w in zip(src, dst, weight):
+            if u != v and w < self.out[u].get(v, (INF,))[0]:
+                self.out[u][v] = (w, -1)
+                self.inn[v][u] = (w, -1)
+        self.contracted = bytearray(n)
+        self.deleted = [0] * n
+        self.up = [None] * n
+        self.down = [None] * n
+        self.rank = [0] * n
+        self.shortcuts = 0
+
+    def witness(self, source, skip, max_w, targets):
+        """Bounded Dijkstra from ``source`` that never passes through ``skip``."""
+        out = self.out
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        remaining = len(targets)
+        while heap and settled < self.limit and remaining:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if d > max_w:
+                break
+            settled += 1
+            if u in targets:
+                remaining -= 1
+            for v, (w, _) in out[u].items():
+                if v == skip:
+                    continue
+                nd = d + w
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return dist
+
+    def needed_shortcuts(self, v):
+        shortcuts = []
+        outs = self.out[v]
+        for u, (wu, _) in self.inn[v].items():
+            targets = [(x, wu + wx) for x, (wx, _) in outs.items() if x != u]
+            if not targets:
+                continue
+            dist = self.witness(u, v, max(c for _, c in targets), {x for x, _ in targets})
+            for x, c in targets:
+                if dist.get(x, INF) > c:
+                    shortcuts.append((u, x, c))
+        return shortcuts
+
+    def priority(self, v):
+        # edge difference weighted over contracted neighbours keeps the hierarchy shallow and sparse
+        return 2 * (len(self.needed_shortcuts(v)) - len(self.inn[v]) - len(self.out[v])) + self.deleted[v]
+
+    def contract_node(self, v, order):
+        out, inn = self.out, self.inn
+        shortcuts = self.needed_shortcuts(v)
+        self.up[v] = list(out[v].items())
+        self.down[v] = list(inn[v].items())
+        self.rank[v] = order
+        self.contracted[v] = 1
+        neighbours = set(out[v]) | set(inn[v])
+        for x in out[v]:
+            inn[x].pop(v, None)
+        for u in inn[v]:
+            out[u].pop(v, None)
+        out[v] = {}
+        inn[v] = {}
+        for u, x, c in shortcuts:
+            if c < out[u].get(x, (INF,))[0]:
+                out[u][x] = (c, v)
+                inn[x][u] = (c, v)
+                self.shortcuts += 1
+        for nb in neighbours:
+            self.deleted[nb] += 1
+        return neighbours
+
+    def run(self, progress_every=5000):
+        heap = [(self.priority(v), v) for v in range(self.n)]
+        heapq.heapify(heap)
+        current = {v: p for p, v in heap}
+        order = 0
+        t0 = time.time()
+        while heap:
+            p, v = heapq.heappop(heap)
+            if self.contracted[v] or p != current[v]:
+                continue
+            # lazy update: re-evaluate and requeue if the node is no longer the cheapest
+            p_new = self.priority(v)
+            if heap and p_new > heap[0][0]:
+                current[v] = p_new
+                heapq.heappush(heap, (p_new, v))
+                continue
+            for nb in self.contract_node(v, order):
+                if not self.contracted[nb]:
+                    current[nb] = self.priority(nb)
+                    heapq.heappush(heap, (current[nb], nb))
+            order += 1
+            if progress_every and order % progress_every == 0:
+                print(f"  contracted {order}/{self.n} nodes, {self.shortcuts} shortcuts, {time.time() - t0:.0f}s")
+
+
+def to_csr(lists, n):
+    counts = np.asarray([len(x) for x in lists], dtype=np.int64)
+    indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    flat = [item for x in lists for item in x]
+    indices = np.asarray([v for v, _ in flat], dtype=np.int32)
+    weight = np.asarray([w for _, (w, _) in flat], dtype=np.float32)
+    middle = np.asarray([m for _, (_, m) in flat], dtype=np.int32)
+    return indptr, indices, weight, middle
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('graph', nargs='?', default='data/cluj_roads.npz')
+    parser.add_argument('out', nargs='?', default='data/cluj_roads.ch')
+    parser.add_argument('--witness-limit', type=int, default=60, help='max nodes settled per witness search')
+    args = parser.parse_args()
+
+    with np.load(args.graph) as g:
+        lat, lon = g['lat'], g['lon']
+        indptr, indices, time_s = g['indptr'], g['indices'], g['time_s']
+    n = int(lat.size)
+    src = np.repeat(np.arange(n), np.diff(indptr)).tolist()
+    # float32 on disk: round the weights first so stored shortcut sums stay consistent
+    weight = time_s.astype(np.float32).astype(np.float64).tolist()
+
+    t0 = time.time()
+    c = Contractor(n, src, indices.tolist(), weight, args.witness_limit)
+    c.run()
+    print(f"contracted {n} nodes with {c.shortcuts} shortcuts in {time.time() - t0:.1f}s")
+
+    up_indptr, up_indices, up_weight, up_middle = to_csr(c.up, n)
+    down_indptr, down_indices, down_weight, down_middle = to_csr(c.down, n)
+    grid = NodeGrid.build(lat, lon, np.nonzero(np.diff(indptr) > 0)[0])
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    write_ch(args.out, {
+        'lat': lat, 'lon': lon, 'rank': np.asarray(c.rank, dtype=np.int32),
+        'up_indptr': up_indptr, 'up_indices': up_indices, 'up_weight': up_weight, 'up_middle': up_middle,
+        'down_indptr': down_indptr, 'down_indices': down_indices, 'down_weight': down_weight,
+        'down_middle': down_middle,
+        'grid_keys': grid.keys, 'grid_ptr': grid.ptr, 'grid_nodes': grid.nodes,
+    }, meta={'nodes': n, 'edges': int(indices.size), 'shortcuts': c.shortcuts, 'source': os.path.basename(args.graph)})
+    print(f"wrote {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
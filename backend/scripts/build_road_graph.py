@@ -0,0 +1,145 @@
+"""
+Build the routing graph used by app/roadgraph.py from an OpenStreetMap XML extract.
+
+Streams the .osm file with iterparse, so a city extract does not have to fit in memory as
+a tree. It keeps the drivable `highway=*` ways and gives every edge a travel time from
+its length and its `maxspeed` tag, or a per-highway-class default. One-way streets and
+roundabouts only get a forward edge. The result is a compressed .npz with node
+coordinates and the adjacency in CSR form (indptr / indices / time_s / length_m).
+
+Getting a Cluj-Napoca extract (any .osm XML works, e.g. from the Overpass API):
+    curl -o cluj.osm 'https://overpass-api.de/api/map?bbox=23.50,46.72,23.72,46.82'
+
+Run from the backend directory:
+    python scripts/build_road_graph.py cluj.osm data/cluj_roads.npz
+"""
+import argparse
+import os
+import re
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.geo import haversine_m  # noqa: E402
+
+# default speeds (km/h) per highway class when a way has no usable maxspeed tag
+HIGHWAY_SPEED_KMH = {
+    'motorway': 110, 'motorway_link': 60,
+    'trunk': 90, 'trunk_link': 50,
+    'primary': 70, 'primary_link': 50,
+    'secondary': 60, 'secondary_link': 40,
+    'tertiary': 50, 'tertiary_link': 30,
+    'unclassified': 40, 'residential': 30, 'road': 40,
+    'living_street': 10, 'service': 20,
+}
+# implicit limits used by the RO:* maxspeed values
+ZONE_SPEED_KMH = {'urban': 50, 'rural': 90, 'trunk': 100, 'motorway': 130, 'living_street': 20}
+ONEWAY_CLASSES = {'motorway', 'motorway_link'}
+
+
+def parse_maxspeed(value):
+    """Return km/h from a maxspeed tag ("50", "30 mph", "RO:urban") or None."""
+    if not value:
+        return None
+    value = value.strip().lower()
+    if ':' in value:
+        return ZONE_SPEED_KMH.get(value.split(':', 1)[1])
+    m = re.match(r'^(\d+(?:\.\d+)?)\s*(mph|km/h|kmh)?$', value)
+    if not m:
+        return None
+    speed = float(m.group(1))
+    return speed * 1.609344 if m.group(2) == 'mph' else speed
+
+
+def read_osm(path):
+    """Return ({node_id: (lat, lon)}, [(node_refs, speed_kmh, oneway)]) for drivable ways."""
+    coords = {}
+    ways = []
+    for _, elem in ET.iterparse(path, events=('end',)):
+        if elem.tag == 'node':
+            coords[int(elem.get('id'))] = (float(elem.get('lat')), float(elem.get('lon')))
+            elem.clear()
+        elif elem.tag == 'way':
+            tags = {t.get('k'): t.get('v') for t in elem.iter('tag')}
+            highway = tags.get('highway')
+            if highway in HIGHWAY_SPEED_KMH and tags.get('access') not in ('no', 'private'):
+                refs = [int(nd.get('ref')) for nd in elem.iter('nd')]
+                speed = parse_maxspeed(tags.get('maxspeed')) or HIGHWAY_SPEED_KMH[highway]
+                oneway = tags.get('oneway', '').lower()
+                if oneway == '-1':
+                    refs.reverse()
+                    is_oneway = True
+                else:
+                    is_oneway = (oneway in ('yes', 'true', '1') or tags.get('junction') == 'roundabout'
+                                 or (highway in ONEWAY_CLASSES and oneway != 'no'))
+                if len(refs) > 1:
+                    ways.append((refs, float(speed), is_oneway))
+            elem.clear()
+        elif elem.tag == 'relation':
+            elem.clear()
+    return coords, ways
+
+
+def build(coords, ways):
+    index = {}
+    src, dst, speed = [], [], []
+    for refs, speed_kmh, oneway in ways:
+        refs = [r for r in refs if r in coords]
+        for a, b in zip(refs[:-1], refs[1:]):
+            if a == b:
+                continue
+            ia = index.setdefault(a, len(index))
+            ib = index.setdefault(b, len(index))
+            src.append(ia)
+            dst.append(ib)
+            speed.append(speed_kmh)
+            if not oneway:
+                src.append(ib)
+                dst.append(ia)
+                speed.append(speed_kmh)
+
+    n = len(index)
+    lat = np.zeros(n)
+    lon = np.zeros(n)
+    for osm_id, i in index.items():
+        lat[i], lon[i] = coords[osm_id]
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    speed_mps = np.asarray(speed) * 1000.0 / 3600.0
+    length_m = haversine_m(lat[src], lon[src], lat[dst], lon[dst])
+    time_s = length_m / speed_mps
+
+    order = np.argsort(src, kind='stable')
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(src, minlength=n))])
+    return {
+        'lat': lat,
+        'lon': lon,
+        'indptr': indptr.astype(np.int64),
+        'indices': dst[order].astype(np.int32),
+        'time_s': time_s[order].astype(np.float32),
+        'length_m': length_m[order].astype(np.float32),
+        'max_speed_mps': np.float64(speed_mps.max() if speed_mps.size else 1.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('osm', help='OpenStreetMap XML extract (.osm)')
+    parser.add_argument('out', nargs='?', default='data/cluj_roads.npz')
+    args = parser.parse_args()
+
+    t0 = time.time()
+    coords, ways = read_osm(args.osm)
+    print(f"read {len(coords)} nodes / {len(ways)} drivable ways in {time.time() - t0:.1f}s")
+    graph = build(coords, ways)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    np.savez_compressed(args.out, **graph)
+    print(f"wrote {args.out}: {graph['lat'].size} nodes, {graph['indices'].size} edges, "
+          f"{os.path.getsize(args.out) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Check that an MQTT shared subscription delivers every incident exactly once.
+
+Starts N subscriber clients in the same `$share/<group>/<topic>` group (standing in for
+N backend replicas), publishes M incidents and reports how many each replica received,
+how many incidents were delivered more than once and how many were lost.
+
+Run against the bundled mosquitto container:
+    docker compose up -d mosquitto
+    MQTT_BROKER=localhost python scripts/check_shared_subscription.py --replicas 3 --messages 1000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+
+from paho.mqtt import client as mqtt_client
+
+MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
+MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--replicas', type=int, default=3)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--group', default='dern-backend-check')
+    parser.add_argument('--topic', default=f"dern/check/{uuid.uuid4().hex[:8]}")
+    args = parser.parse_args()
+
+    shared = f"$share/{args.group}/{args.topic}"
+    received = [Counter() for _ in range(args.replicas)]
+    clients = []
+
+    def make_handler(idx):
+        def on_message(client, userdata, msg):
+            data = json.loads(msg.payload.decode())
+            received[idx][data['id']] += 1
+        return on_message
+
+    for i in range(args.replicas):
+        c = mqtt_client.Client(client_id=f"check-replica-{i}-{uuid.uuid4().hex[:6]}")
+        c.on_message = make_handler(i)
+        c.connect(MQTT_BROKER, MQTT_PORT)
+        c.subscribe(shared, qos=1)
+        c.loop_start()
+        clients.append(c)
+    time.sleep(1.0)
+
+    pub = mqtt_client.Client(client_id=f"check-publisher-{uuid.uuid4().hex[:6]}")
+    pub.connect(MQTT_BROKER, MQTT_PORT)
+    pub.loop_start()
+    ids = [f"check-{i}" for i in range(args.messages)]
+    for inc_id in ids:
+        pub.publish(args.topic, json.dumps({'id': inc_id, 'type': 'medical', 'lat': 46.77, 'lon': 23.62, 'severity': 2}), qos=1)
+
+    deadline = time.time() + 10
+    while time.time() < deadline and sum(sum(r.values()) for r in received) < args.messages:
+        time.sleep(0.1)
+
+    for c in clients + [pub]:
+        c.loop_stop()
+        c.disconnect()
+
+    total = Counter()
+    for r in received:
+        total.update(r)
+    duplicates = sum(1 for n in total.values() if n > 1)
+    missing = sum(1 for inc_id in ids if inc_id not in total)
+    for i, r in enumerate(received):
+        print(f"replica {i}: {sum(r.values())} messages")
+    print(f"published={args.messages} delivered={sum(total.values())} duplicates={duplicates} missing={missing}")
+    sys.exit(0 if duplicates == 0 and missing == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Concurrent HTTP load test for the read and status endpoints.
+
+Opens --concurrency keep-alive connections (500 by default) to a running backend. Each
+connection issues GET requests back to back for --seconds, picking paths at random
+from --paths. The script reports throughput, errors and p50/p95/p99/max latency per
+path. Use it to compare the async endpoints against the sync threadpool handlers:
+under thread starvation p99 grows with concurrency, while the async handlers are only
+bounded by the DB pool (ASYNC_DB_POOL_SIZE + ASYNC_DB_MAX_OVERFLOW).
+
+Plain asyncio streams, no extra dependencies. Run from the backend directory:
+    python scripts/load_test.py --url http://localhost:8000 --concurrency 500 --seconds 30
+"""
+import argparse
+import asyncio
+import random
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = [
+    '/incidents?limit=50',
+    '/incidents/count',
+    '/ambulances',
+    '/stats/daily',
+    '/cases/closures',
+]
+
+
+async def request(reader, writer, host, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+    length = None
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value.strip())
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip() or b'0', 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status
+
+
+async def worker(host, port, paths, deadline, results, rnd):
+    reader = writer = None
+    while time.monotonic() < deadline:
+        path = rnd.choice(paths)
+        t0 = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            status = await request(reader, writer, host, path)
+            ok = status < 500
+        except Exception:
+            ok = False
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+        results.setdefault(path, []).append(((time.perf_counter() - t0) * 1000.0, ok))
+    if writer is not None:
+        writer.close()
+
+
+def pct(sorted_ms, q):
+    return sorted_ms[min(len(sorted_ms) - 1, int(len(sorted_ms) * q))]
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    deadline = time.monotonic() + args.seconds
+    results = {}
+    rnd = random.Random(1)
+    started = time.monotonic()
+    await asyncio.gather(*[worker(host, port, args.paths, deadline, results, random.Random(rnd.random()))
+                           for _ in range(args.concurrency)])
+    elapsed = time.monotonic() - started
+
+    total = sum(len(v) for v in results.values())
+    print(f"{args.concurrency} connections, {elapsed:.1f} s, {total} requests, {total / elapsed:.0f} req/s")
+    print(f"{'path':<28} {'count':>7} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for path in args.paths:
+        samples = results.get(path, [])
+        if not samples:
+            continue
+        ms = sorted(t for t, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        print(f"{path:<28} {len(samples):>7} {errors:>7} {pct(ms, 0.5):>8.1f} {pct(ms, 0.95):>8.1f} "
+              f"{pct(ms, 0.99):>8.1f} {ms[-1]:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
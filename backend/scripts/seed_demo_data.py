@@ -10,6 +10,7 @@ import random
 import uuid
 import json
 from app.db import SessionLocal
+from app.geo import haversine_m
 from app.models import Incident, Ambulance
 
 FIRST_NAMES = ['Maria','Ioan','Elena','Andrei','Ana','Mihai','Gabriela','Cristian','Oana','Radu']
@@ -35,17 +36,6 @@ def seed(num_medical=20, num_fire=10, num_units=20):
         center_lat = 46.7712
         center_lon = 23.6236
 
-        def haversine_meters(lat1, lon1, lat2, lon2):
-            R = 6371000.0
-            import math
-            phi1 = math.radians(lat1)
-            phi2 = math.radians(lat2)
-            dphi = math.radians(lat2 - lat1)
-            dlambda = math.radians(lon2 - lon1)
-            a = math.sin(dphi/2.0)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2.0)**2
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-            return R * c
-
         # Create medical incidents (rich details)
         for i in range(num_medical):
             lat = center_lat + (random.random() - 0.5) * 0.08
@@ -92,7 +82,7 @@ def seed(num_medical=20, num_fire=10, num_units=20):
                 start_lon = lon + (random.random() * 0.02 + 0.005)
                 speed_kmh = random.choice([60.0, 80.0])
                 # compute simple ETA based on straight-line distance
-                dist_m = haversine_meters(start_lat, start_lon, lat, lon)
+                dist_m = float(haversine_m(start_lat, start_lon, lat, lon))
                 eta_seconds = dist_m / max(0.1, (speed_kmh * 1000.0 / 3600.0))
                 eta = datetime.utcnow() + timedelta(seconds=eta_seconds)
 
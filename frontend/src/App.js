@@ -13,6 +13,7 @@ import FireClosure from './components/Fire/FireClosure';
 import AdminIncidents from './components/CityAdministrator/AdminIncidents';
 import Dashboard from './components/Dashboard/Dashboard';
 import './styles/theme.css';
+import { expandStreamMessages } from './stream';
 
 mapboxgl.accessToken = process.env.REACT_APP_MAPBOX_TOKEN || '';
 
@@ -39,7 +40,7 @@ function App() {
     try {
       if (typeof window !== 'undefined' && typeof window.EventSource !== 'undefined') {
         es = new EventSource('/stream/incidents');
-        es.onmessage = (e) => {
+        es.onmessage = expandStreamMessages((e) => {
           try {
             const data = JSON.parse(e.data);
             // ambulance events use resource:'ambulance'
@@ -57,7 +58,7 @@ function App() {
           } catch (err) {
             console.warn('Failed to parse SSE message', err);
           }
-        };
+        });
         es.onerror = (err) => {
           console.warn('SSE error', err);
           try { es.close(); } catch(e){}
@@ -1,5 +1,6 @@
 import React, { useEffect, useState, useRef } from "react";
 import axios from 'axios';
+import { expandStreamMessages } from '../../stream';
 import "../Doctor/style.css";
 
 function haversineMeters(lat1, lon1, lat2, lon2) {
@@ -58,8 +59,8 @@ export default function DoctorAssignDynamic() {
 
         // SSE: listen to all incidents and ambulance updates and keep pending list updated
         try {
-            const es = new EventSource('/stream/incidents');
-            es.onmessage = (e) => {
+            const es = new EventSource('/stream/incidents?type=medical&unit_type=ambulance');
+            es.onmessage = expandStreamMessages((e) => {
                 try {
                     const inc = JSON.parse(e.data);
                     if (!inc || !inc.id) return;
@@ -94,7 +95,7 @@ export default function DoctorAssignDynamic() {
                 } catch (err) {
                     console.warn('Malformed SSE', err);
                 }
-            };
+            });
             es.onerror = () => {
                 // keep existing pending list; we will retry on next mount
                 console.warn('SSE error');
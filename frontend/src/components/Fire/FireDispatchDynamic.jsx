@@ -1,5 +1,6 @@
 import React, { useEffect, useState, useRef } from "react";
 import axios from 'axios';
+import { expandStreamMessages } from '../../stream';
 import mapboxgl from 'mapbox-gl'
 import 'mapbox-gl/dist/mapbox-gl.css'
 import "./style.css";
@@ -61,8 +62,8 @@ export default function FireDispatchDynamic() {
         load();
 
         try {
-            const es = new EventSource('/stream/incidents');
-            es.onmessage = (e) => {
+            const es = new EventSource('/stream/incidents?type=fire&unit_type=fire');
+            es.onmessage = expandStreamMessages((e) => {
                 try {
                     const inc = JSON.parse(e.data);
                     if (!inc || !inc.id) return;
@@ -104,7 +105,7 @@ export default function FireDispatchDynamic() {
                 } catch (err) {
                     console.warn('Malformed SSE', err);
                 }
-            };
+            });
             es.onerror = () => { console.warn('SSE error (fire dispatch)'); };
             esRef.current = es;
         } catch (err) { console.warn('EventSource not available', err); }
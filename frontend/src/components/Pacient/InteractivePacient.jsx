@@ -4,6 +4,7 @@ import 'mapbox-gl/dist/mapbox-gl.css';
 import './pacient-style.css';
 import ambulanceSvg from './Ambulance15.svg';
 import { useNavigate } from 'react-router-dom';
+import { expandStreamMessages } from '../../stream';
 
 // Simple haversine distance (meters)
 function haversine([lon1, lat1], [lon2, lat2]) {
@@ -114,7 +115,7 @@ export default function InteractivePacient() {
     let es;
     try {
       es = new EventSource('/stream/incidents');
-      es.onmessage = (e) => {
+      es.onmessage = expandStreamMessages((e) => {
         try {
           const it = JSON.parse(e.data);
           if (it && it.resource === 'ambulance') {
@@ -161,7 +162,7 @@ export default function InteractivePacient() {
             }
           }
         } catch (err) { console.warn('Malformed SSE', err); }
-      };
+      });
       es.onerror = () => { console.warn('SSE error (pacient)'); };
     } catch (e) { console.warn('EventSource not available', e); }
 
@@ -0,0 +1,86 @@
+// Helpers for the /stream/incidents SSE feed.
+//
+// The backend moves every unit from one fleet engine. By default it publishes motion
+// updates for dead reckoning: { resource: 'motion', unit_type, ts, horizon_s, units: [
+// { ambulance_id, lat, lon, heading, speed, seg, eta_s }] }, sent for a unit only when
+// its extrapolated position would drift (or as a keepalive every few seconds). With
+// FLEET_STREAM=positions it publishes every moving unit each tick instead:
+// { resource: 'ambulances', unit_type, ambulances: [...] }.
+// expandStreamMessages wraps an EventSource onmessage handler so handlers written for
+// one item per message keep receiving one ambulance payload at a time.
+
+const R = 6371000;
+const EXTRAPOLATE_MS = 1000;
+
+// Position of a unit `nowMs` after its motion update was received: straight along
+// `heading` at `speed` m/s, stopped after `eta_s` or `horizon_s`, whichever comes
+// first. The server runs the same model and corrects it before it drifts too far.
+export function extrapolate(motion, nowMs) {
+  const dt = Math.max(0, Math.min((nowMs - motion.receivedAt) / 1000, motion.eta_s, motion.horizon_s));
+  const d = motion.speed * dt;
+  const th = (motion.heading * Math.PI) / 180;
+  const lat = motion.lat + ((d * Math.cos(th)) / R) * (180 / Math.PI);
+  const lon = motion.lon + ((d * Math.sin(th)) / (R * Math.cos((motion.lat * Math.PI) / 180))) * (180 / Math.PI);
+  return { lat, lon };
+}
+
+export function expandStreamMessages(handler) {
+  const moving = new Map();
+  let timer = null;
+
+  const emit = (m, now, lastEventId) => {
+    const { lat, lon } = extrapolate(m, now);
+    const payload = {
+      resource: 'ambulance',
+      ambulance_id: m.ambulance_id,
+      unit_type: m.unit_type,
+      status: 'enroute',
+      lat,
+      lon,
+      heading: m.heading,
+      eta: new Date(m.receivedAt + m.eta_s * 1000).toISOString(),
+    };
+    handler({ data: JSON.stringify(payload), lastEventId });
+  };
+
+  const step = () => {
+    const now = Date.now();
+    moving.forEach((m, id) => {
+      if (now - m.receivedAt > m.horizon_s * 1000) moving.delete(id);
+      else emit(m, now);
+    });
+    if (moving.size === 0) {
+      clearInterval(timer);
+      timer = null;
+    }
+  };
+
+  return (e) => {
+    let data;
+    try {
+      data = JSON.parse(e.data);
+    } catch (err) {
+      handler(e);
+      return;
+    }
+    if (data && data.resource === 'motion' && Array.isArray(data.units)) {
+      const now = Date.now();
+      data.units.forEach((u) => {
+        const m = { ...u, unit_type: data.unit_type, horizon_s: data.horizon_s, receivedAt: now };
+        moving.set(u.ambulance_id, m);
+        emit(m, now, e.lastEventId);
+      });
+      if (timer === null && moving.size) timer = setInterval(step, EXTRAPOLATE_MS);
+      return;
+    }
+    if (data && data.resource === 'ambulances' && Array.isArray(data.ambulances)) {
+      data.ambulances.forEach((unit) => handler({ data: JSON.stringify(unit), lastEventId: e.lastEventId }));
+      return;
+    }
+    // an arrival, release or reassignment replaces whatever we were extrapolating
+    if (data && data.resource === 'ambulance' && data.status !== 'enroute') {
+      moving.delete(data.ambulance_id);
+    }
+    handler(e);
+  };
+}